@@ -1,81 +1,207 @@
 import logging
-import pickle
 import os
+import threading
+from typing import Dict, Tuple
+
 import numpy as np
-from sklearn.linear_model import SGDClassifier
+
+from feature_normalizer import OnlineNormalizer
+from policy_grid import surviving_arms
+from tenant_state import TenantStateStore
 
 logger = logging.getLogger(__name__)
 
 
+N_FEATURES = 4  # qps, miss_rate, latency_p99_ms, cpu_utilization
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
 class ContextualBanditEngine:
-    def __init__(self, model_path="models/bandit.pkl", epsilon=0.1):
+    """Epsilon-greedy bandit with one logistic model per arm per tenant.
+
+    Arm i's model estimates P(reward > 0 | features, arm i); all arms are scored with a single
+    (n_arms, d) matrix-vector product. Each tenant owns a weight row in a TenantStateStore. Rows
+    start as a copy of the shared prior, which itself learns from every tenant's feedback, so a
+    new tenant begins from the population policy and then drifts toward its own workload. The
+    store also keeps each tenant's last action, context and update count.
+
+    Features are standardized by a shared OnlineNormalizer before scoring, so one learning rate
+    fits qps in the thousands and miss rates below one. The normalizer keeps learning from every
+    update and is saved next to the weights.
+    """
+
+    def __init__(
+        self,
+        model_path="models/bandit_state.npz",
+        epsilon=0.1,
+        learning_rate=0.1,
+        l2=1e-4,
+        n_arms=2,
+        eliminate=False,
+        elimination_delta=0.05,
+        min_pulls=20,
+    ):
         self.model_path = model_path
         self.epsilon = epsilon
-        self.learner = SGDClassifier(loss="log_loss", penalty="l2", random_state=42)
-        self.classes = [0, 1]  # 0 = Normal, 1 = Aggressive
-        self.initialized = False
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.n_arms = n_arms
+        self.classes = list(range(n_arms))  # with the default arms: 0 = Normal, 1 = Aggressive
+        self.eliminate = eliminate
+        self.elimination_delta = elimination_delta
+        self.min_pulls = min_pulls
+        self.state = TenantStateStore(
+            {
+                "weights": ((n_arms, N_FEATURES + 1), np.float64),  # last column is the bias
+                "updates": ((), np.int64),
+                "pulls": ((n_arms,), np.int64),
+                "reward_sum": ((n_arms,), np.float64),
+                "last_action": ((), np.int8),
+                "last_context": ((N_FEATURES,), np.float32),
+                # admission_threshold, ttl_seconds, eviction_priority of the policy last handed out
+                "last_policy": ((3,), np.float32),
+            }
+        )
+        self.normalizer = OnlineNormalizer(N_FEATURES)
+        self.normalizer_path = f"{os.path.splitext(model_path)[0]}.normalizer.json"
+        self._lock = threading.Lock()
         self._load()
 
+    @property
+    def initialized(self) -> bool:
+        return bool(self.state.array("updates")[0] > 0)
+
     def _load(self):
         if os.path.exists(self.model_path):
-            try:
-                with open(self.model_path, "rb") as f:
-                    self.learner = pickle.load(f)
-                    self.initialized = True
-                logger.info("Loaded bandit model")
-            except Exception as e:
-                logger.error(f"Failed to load bandit model: {e}")
+            if self.state.load(self.model_path):
+                logger.info(f"Loaded bandit state for {len(self.state)} tenants")
+        try:
+            self.normalizer = OnlineNormalizer.load(self.normalizer_path) or self.normalizer
+        except Exception as e:
+            logger.error(f"Failed to load bandit feature normalizer: {e}")
 
     def save(self):
         try:
-            with open(self.model_path, "wb") as f:
-                pickle.dump(self.learner, f)
+            # Snapshot the weights and the normalizer between learner batches, so they match on reload.
+            with self._lock:
+                self.state.save(self.model_path)
+                normalizer = OnlineNormalizer.from_dict(self.normalizer.to_dict())
+            normalizer.save(self.normalizer_path)
         except Exception as e:
             logger.error(f"Failed to save bandit model: {e}")
 
-    def select_action(self, features: np.ndarray) -> int:
+    def _scores(self, weights: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """Logits of every arm for one context, in one pass."""
+        x = np.append(self.normalizer.transform(features).astype(np.float64).reshape(-1), 1.0)
+        return weights @ x
+
+    def _alive(self, pulls: np.ndarray, reward_sum: np.ndarray) -> np.ndarray:
+        if not self.eliminate:
+            return np.ones(pulls.shape, dtype=bool)
+        return surviving_arms(pulls, reward_sum, delta=self.elimination_delta, min_pulls=self.min_pulls)
+
+    def exploration(self) -> Dict[str, float]:
+        """The exploration parameter, keyed by engine kind (reported by GetEvaluations)."""
+        return {"epsilon_greedy_epsilon": float(self.epsilon)}
+
+    def alive_arms(self, tenant_id: str = None) -> np.ndarray:
+        """Arms still in play for a tenant (all of them unless elimination is enabled)."""
+        return self._alive(*self.state.read_rows(self.state.tenant_row(tenant_id), "pulls", "reward_sum"))
+
+    def select_action(self, features: np.ndarray, tenant_id: str = None) -> int:
         """
-        Selects action (0 or 1).
+        Selects an arm for a tenant.
         features: shape (1, n_features)
         """
-        # Exploration
-        if np.random.rand() < self.epsilon or not self.initialized:
-            return np.random.choice(self.classes)
+        return self.select_with_propensity(features, tenant_id)[0]
 
-        # Exploitation
-        try:
-            return self.learner.predict(features)[0]
-        except Exception as e:
-            logger.warning(f"Prediction failed, falling back to random: {e}")
-            return np.random.choice(self.classes)
+    def select_with_propensity(self, features: np.ndarray, tenant_id: str = None) -> Tuple[int, float]:
+        """Selects an arm and returns it with the probability this policy had of choosing it."""
+        weights, updates, pulls, reward_sum = self.state.read_rows(
+            self.state.tenant_row(tenant_id), "weights", "updates", "pulls", "reward_sum"
+        )
+        alive = self._alive(pulls, reward_sum)
+        candidates = np.flatnonzero(alive)
+        if updates == 0:
+            # Untrained: uniform over the arms still in play.
+            action = int(np.random.choice(candidates))
+            propensity = 1.0 / len(candidates)
+        else:
+            # Exploitation picks the arm most likely to earn a positive reward.
+            greedy = int(np.argmax(np.where(alive, self._scores(weights, features), -np.inf)))
+            action = int(np.random.choice(candidates)) if np.random.rand() < self.epsilon else greedy
+            propensity = self.epsilon / len(candidates) + (1.0 - self.epsilon) * (action == greedy)
+
+        if tenant_id:
+            self.state.set(tenant_id, "last_action", action)
+            self.state.set(tenant_id, "last_context", np.asarray(features, dtype=np.float32).reshape(-1))
+        return action, float(propensity)
+
+    def action_probabilities(self, features: np.ndarray, tenant_ids=None) -> np.ndarray:
+        """(n, n_arms) probability that select_action picks each arm for each row; no side effects."""
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        tenant_ids = tenant_ids if tenant_ids is not None else [None] * len(features)
+        rows = np.array([self.state.tenant_row(t) for t in tenant_ids], dtype=np.int64)
+        weights, updates, pulls, reward_sum = self.state.read_rows(rows, "weights", "updates", "pulls", "reward_sum")
+        alive = self._alive(pulls, reward_sum)
+        uniform = alive / alive.sum(axis=1, keepdims=True)
 
-    def update(self, features: np.ndarray, action: int, reward: float):
+        X = np.hstack([self.normalizer.transform(features).astype(np.float64), np.ones((len(features), 1))])
+        greedy = np.argmax(np.where(alive, np.einsum("nkd,nd->nk", weights, X), -np.inf), axis=1)
+        probabilities = self.epsilon * uniform
+        probabilities[np.arange(len(features)), greedy] += 1.0 - self.epsilon
+        return np.where((updates == 0)[:, None], uniform, probabilities)
+
+    def update(self, features: np.ndarray, action: int, reward: float, tenant_id: str = None):
+        self.update_batch(features, [action], [reward], [tenant_id])
+
+    def update_batch(self, features: np.ndarray, actions, rewards, tenant_ids):
         """
-        Updates the model.
-        reward: >0 if good, <0 if bad.
-        SGDClassifier expects labels. We treat this as:
-        If reward is positive -> verify action (train with label=action).
-        If reward is negative -> penalize action (train with label!=action)?
-
-        Better approach for reduction to classification:
-        Only train if we differ from the counterfactual?
-        Actually, standard reduction:
-        If Reward=1 (Success), train (X, action).
-        If Reward=0 (Fail), train (X, other_action)? Or just ignore?
-
-        Simple heuristic for MVP:
-        We assume we receive a binary "Was this good?" signal.
-        If Good: train (X, action).
-        If Bad: train (X, 1-action).
+        Updates each sample's tenant model for the pulled arm, and the shared prior.
+
+        The pulled arm's model learns the label reward > 0 for the sample's context: one
+        mini-batch SGD step on the L2-regularized log loss over the standardized features, with
+        every gradient taken at the pre-batch weights and averaged over the samples that reached
+        the same (row, arm) pair, so the step size does not grow with the batch. Each sample's step
+        is normalized by |x|^2 as a guard against outliers the normalizer has not seen yet. The touched rows are
+        published together, so select_action never sees a half-applied batch.
         """
-        label = action if reward > 0 else (1 - action)
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        labels = (rewards > 0).astype(np.float64)
 
-        # Incremental learning
-        try:
-            self.learner.partial_fit(features, [label], classes=self.classes)
-            self.initialized = True
-        except Exception as e:
-            logger.error(f"Partial fit failed: {e}")
+        with self._lock:
+            self.normalizer.update(features)
+            X = np.hstack([self.normalizer.transform(features).astype(np.float64), np.ones((len(features), 1))])
+            steps = self.learning_rate / (1.0 + np.einsum("ij,ij->i", X, X))
+            samples, rows = self.state.feedback_rows(tenant_ids)
+            unique_rows, local = np.unique(rows, return_inverse=True)
+            weights, updates, pulls, reward_sum = self.state.read_rows(
+                unique_rows, "weights", "updates", "pulls", "reward_sum"
+            )
+            arms = actions[samples]
+            x = X[samples]
+            w = weights[local, arms]
+            p = _sigmoid(np.einsum("ij,ij->i", w, x))
+            grad = steps[samples, None] * ((p - labels[samples])[:, None] * x + self.l2 * w)
+            counts = np.zeros(weights.shape[:2], dtype=np.float64)
+            np.add.at(counts, (local, arms), 1.0)
+            np.subtract.at(weights, (local, arms), grad / counts[local, arms][:, None])
+            np.add.at(updates, local, 1)
+            np.add.at(pulls, (local, arms), 1)
+            np.add.at(reward_sum, (local, arms), rewards[samples])
+            self.state.write_rows(
+                unique_rows, {"weights": weights, "updates": updates, "pulls": pulls, "reward_sum": reward_sum}
+            )
+
+    def remember_policy(self, tenant_id: str, policy) -> None:
+        self.state.set(
+            tenant_id, "last_policy", (policy.admission_threshold, policy.ttl_seconds, policy.eviction_priority)
+        )
 
     def get_features(self, system_metrics) -> np.ndarray:
         # Match features in train_model.py
@@ -85,3 +211,17 @@ class ContextualBanditEngine:
         latency = float(system_metrics.latency_p99_ms)
         cpu = float(system_metrics.cpu_utilization)
         return np.array([[qps, miss_rate, latency, cpu]])
+
+
+BANDIT_ENGINES = ("epsilon_greedy", "linucb", "thompson")
+
+
+def create_bandit_engine(kind: str = "epsilon_greedy", **kwargs):
+    """Builds the bandit selected by name (PYROPE_BANDIT_ENGINE in the server)."""
+    if kind == "epsilon_greedy":
+        return ContextualBanditEngine(**kwargs)
+    if kind in ("linucb", "thompson"):
+        from linear_bandit import LinearBanditEngine
+
+        return LinearBanditEngine(algorithm=kind, **kwargs)
+    raise ValueError(f"Unknown bandit engine '{kind}'. Choose from {BANDIT_ENGINES}.")
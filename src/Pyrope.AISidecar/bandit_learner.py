@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Feedback(NamedTuple):
+    features: np.ndarray
+    action: int
+    reward: float
+    tenant_id: Optional[str]
+
+
+class BackgroundBanditLearner:
+    """Applies bandit feedback off the RPC path, in mini-batches.
+
+    ReportSystemMetrics only appends (features, action, reward, tenant) to a bounded ring
+    buffer. A deque's append and popleft are atomic, so producers never take a lock, and when
+    the learner falls behind the oldest feedback is overwritten rather than blocking the RPC.
+    A learner thread wakes every interval_ms (or as soon as a full batch is queued), drains up
+    to max_batch_size entries and hands them to the engine's update_batch, which publishes the
+    new parameters for all touched tenants in one step.
+    """
+
+    def __init__(self, engine, capacity: int = 4096, max_batch_size: int = 256, interval_ms: float = 20.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.engine = engine
+        self.max_batch_size = int(max_batch_size)
+        self.interval_s = max(0.0, float(interval_ms)) / 1000.0
+
+        self._buffer: "deque[_Feedback]" = deque(maxlen=capacity)
+        self._apply_lock = threading.Lock()
+        self._submitted = 0
+        self._applied = 0
+        self._batches = 0
+        self._dropped = 0
+        self._apply_seconds = 0.0
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bandit-learner", daemon=True)
+        self._thread.start()
+
+    def submit(self, features: np.ndarray, action: int, reward: float, tenant_id: Optional[str] = None):
+        """Queues one reward for the engine; returns immediately."""
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped += 1
+        self._buffer.append(_Feedback(np.asarray(features, dtype=np.float64).reshape(-1), action, reward, tenant_id))
+        self._submitted += 1
+        if len(self._buffer) >= self.max_batch_size:
+            self._wakeup.set()
+
+    def _drain(self) -> List[_Feedback]:
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def _apply(self, batch: List[_Feedback]):
+        started = time.perf_counter()
+        try:
+            self.engine.update_batch(
+                np.vstack([f.features for f in batch]),
+                [f.action for f in batch],
+                [f.reward for f in batch],
+                [f.tenant_id for f in batch],
+            )
+        except Exception as e:
+            logger.error(f"Bandit update of {len(batch)} rewards failed: {e}")
+            return
+        self._apply_seconds += time.perf_counter() - started
+        self._applied += len(batch)
+        self._batches += 1
+
+    def flush(self):
+        """Applies everything queued so far before returning."""
+        with self._apply_lock:
+            batch = self._drain()
+            while batch:
+                self._apply(batch)
+                batch = self._drain()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.interval_s or None)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self, timeout: float = 1.0):
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "submitted": float(self._submitted),
+            "applied": float(self._applied),
+            "pending": float(len(self._buffer)),
+            "dropped": float(self._dropped),
+            "batches": float(self._batches),
+            "batch_size_mean": self._applied / self._batches if self._batches else 0.0,
+            "apply_ms_per_update": 1000.0 * self._apply_seconds / self._applied if self._applied else 0.0,
+        }
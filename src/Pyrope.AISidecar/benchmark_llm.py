@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from llm_backends import OpenAICompatibleBackend
+from llm_policy_engine import LLMPolicyEngine, SystemMetrics
+from llm_standin import StandInLLMServer
+from llm_worker import LLMWorker
+from policy_engine import HeuristicPolicyEngine
+
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Engine settings compared side by side: (name, coalesce_window_ms, neighbor_radius).
+SCENARIOS = [
+    ("per-miss prompts", 0.0, 0.0),
+    ("coalesced", 50.0, 0.0),
+    ("coalesced + neighbors", 50.0, 1.0),
+]
+
+
+def _tenant_walks(tenants: int, steps: int, jitter: float, seed: int) -> np.ndarray:
+    """(steps, tenants, 5) metrics: each tenant jitters around its own steady state."""
+    rng = np.random.default_rng(seed)
+    base = np.column_stack(
+        [
+            rng.lognormal(5.0, 1.0, tenants),
+            rng.beta(2.0, 5.0, tenants),
+            rng.gamma(2.0, 15.0, tenants),
+            rng.uniform(10.0, 90.0, tenants),
+            np.zeros(tenants),
+        ]
+    )
+    noise = rng.normal(0.0, jitter, (steps, tenants, 5))
+    scale = np.array([1.0, 0.2, 1.0, 50.0, 0.0])  # qps and p99 relative, miss rate and CPU absolute
+    walks = np.where([True, False, True, False, False], base * (1.0 + noise), base + noise * scale)
+    return np.clip(walks, 0.0, [np.inf, 1.0, np.inf, 100.0, 100.0])
+
+
+async def run_scenario(
+    url: str,
+    walks: np.ndarray,
+    coalesce_window_ms: float,
+    neighbor_radius: float,
+    interval_ms: float,
+    cache_ttl_seconds: float,
+    max_requests_per_minute: int,
+) -> Dict[str, Any]:
+    worker = LLMWorker(
+        backend=OpenAICompatibleBackend(url, "stand-in", timeout_seconds=10.0),
+        max_requests_per_minute=max_requests_per_minute,
+    )
+    engine = LLMPolicyEngine(
+        llm_worker=worker,
+        fallback=HeuristicPolicyEngine(),
+        cache_ttl_seconds=cache_ttl_seconds,
+        coalesce_window_ms=coalesce_window_ms,
+        neighbor_radius=neighbor_radius,
+    )
+    await worker.start()
+
+    decide_us: List[float] = []
+    started = time.perf_counter()
+    for step in walks:
+        for qps, miss_rate, latency, cpu, gpu in step:
+            metrics = SystemMetrics(
+                qps=float(qps),
+                miss_rate=float(miss_rate),
+                latency_p99_ms=float(latency),
+                cpu_utilization=float(cpu),
+                gpu_utilization=float(gpu),
+            )
+            t0 = time.perf_counter()
+            await engine.compute_policy(metrics)
+            decide_us.append((time.perf_counter() - t0) * 1e6)
+        await asyncio.sleep(interval_ms / 1000.0)
+    elapsed = time.perf_counter() - started
+
+    await engine.flush()
+    await worker.queue.join()
+    await worker.stop()
+
+    llm, cache = worker.get_stats(), engine.cache_stats()
+    reports = len(decide_us)
+    return {
+        "reports": reports,
+        "seconds": elapsed,
+        "reports_per_s": reports / elapsed,
+        "decide_p50_us": float(np.percentile(decide_us, 50)),
+        "decide_p99_us": float(np.percentile(decide_us, 99)),
+        "llm_requests": llm["requests_total"],
+        "llm_failed": llm["requests_failed"],
+        "llm_rate_limited": llm["requests_rate_limited"],
+        "llm_avg_latency_ms": 1000.0 * llm["avg_latency"],
+        "prompt_tokens": llm["tokens_input"],
+        "fallback_rate": cache["fallbacks"] / reports,
+        "cache_hit_rate": cache["hit_rate"],
+        "stale_hits": cache["stale_hits"],
+        "neighbor_hits": cache["neighbor_hits"],
+    }
+
+
+def print_report(results: Dict[str, Dict[str, Any]]):
+    print("\n" + "=" * 108)
+    print(
+        f"{'scenario':<24}{'reports/s':>10}{'p99 us':>9}{'LLM reqs':>10}{'failed':>8}{'LLM ms':>8}"
+        f"{'tokens in':>11}{'fallback':>10}{'hit rate':>10}{'neighbor':>9}"
+    )
+    print("-" * 108)
+    for name, r in results.items():
+        print(
+            f"{name:<24}{r['reports_per_s']:>10.0f}{r['decide_p99_us']:>9.0f}{r['llm_requests']:>10}"
+            f"{r['llm_failed']:>8}{r['llm_avg_latency_ms']:>8.1f}{r['prompt_tokens']:>11}"
+            f"{r['fallback_rate']:>10.1%}{r['cache_hit_rate']:>10.1%}{r['neighbor_hits']:>9.0f}"
+        )
+    print("=" * 108 + "\n")
+
+
+async def run_benchmark(args, url: str) -> Dict[str, Dict[str, Any]]:
+    walks = _tenant_walks(args.tenants, args.steps, args.jitter, args.seed)
+    results = {}
+    for name, window_ms, radius in SCENARIOS:
+        results[name] = await run_scenario(
+            url, walks, window_ms, radius, args.interval_ms, args.cache_ttl, args.max_requests_per_minute
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load-test LLMPolicyEngine through an OpenAI-compatible backend")
+    parser.add_argument("--url", type=str, default=None, help="Backend base URL (default: start a local stand-in)")
+    parser.add_argument("--latency", type=str, default="lognormal:200,0.5", help="Stand-in latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stand-in error rate")
+    parser.add_argument("--tenants", type=int, default=20, help="Simulated tenants reporting metrics")
+    parser.add_argument("--steps", type=int, default=100, help="Reports per tenant")
+    parser.add_argument("--interval-ms", type=float, default=20.0, help="Pause between report rounds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Relative metric noise per report")
+    parser.add_argument("--cache-ttl", type=float, default=1.0, help="LLM decision freshness in seconds")
+    parser.add_argument("--max-requests-per-minute", type=int, default=600, help="LLMWorker request budget")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", type=str, default=None, help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        results = asyncio.run(run_benchmark(args, args.url))
+    else:
+        with StandInLLMServer(latency=args.latency, error_rate=args.error_rate, seed=args.seed) as standin:
+            results = asyncio.run(run_benchmark(args, standin.url))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import onnxruntime as ort
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from train_model import (
+    DEFAULT_TRAINER,
+    FEATURE_COLUMNS,
+    TRAINERS,
+    export_onnx,
+    extract_features_and_labels,
+    fit_classifier,
+    load_logs,
+)
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def synthetic_logs(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Generates decision-log shaped entries when no recorded log is available."""
+    rng = np.random.default_rng(seed)
+    qps = rng.lognormal(mean=5.0, sigma=1.0, size=n)
+    miss_rate = rng.beta(2.0, 5.0, size=n)
+    latency = rng.gamma(shape=2.0, scale=15.0, size=n)
+    cpu = rng.uniform(0.0, 100.0, size=n)
+    return [
+        {
+            "system_metrics": {
+                "qps": float(qps[i]),
+                "miss_rate": float(miss_rate[i]),
+                "latency_p99_ms": float(latency[i]),
+                "cpu_utilization": float(cpu[i]),
+            }
+        }
+        for i in range(n)
+    ]
+
+
+def measure_onnx_latency(model_path: str, X: np.ndarray, repeat: int = 200, batch_size: int = 1024) -> Dict[str, float]:
+    """Measures single-row latency percentiles and batched per-row cost for an ONNX model."""
+    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    input_name = sess.get_inputs()[0].name
+
+    rows = [X[[i % len(X)]] for i in range(repeat)]
+    for row in rows[:10]:
+        sess.run(None, {input_name: row})
+
+    samples = np.empty(repeat, dtype=np.float64)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        sess.run(None, {input_name: row})
+        samples[i] = time.perf_counter() - start
+
+    batch = X[np.arange(batch_size) % len(X)]
+    start = time.perf_counter()
+    sess.run(None, {input_name: batch})
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "single_p50_us": float(np.percentile(samples, 50) * 1e6),
+        "single_p99_us": float(np.percentile(samples, 99) * 1e6),
+        "batch_per_row_us": float(batch_seconds / batch_size * 1e6),
+    }
+
+
+def benchmark(data: pd.DataFrame, trainers: List[str], n_jobs: int = -1, repeat: int = 200) -> List[Dict[str, Any]]:
+    """Fits, exports and scores each trainer on the same train/test split."""
+    X = data[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    y = data["label"].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for trainer in trainers:
+            logger.info(f"Benchmarking {trainer}...")
+            clf, fit_seconds = fit_classifier(trainer, X_train, y_train, n_jobs=n_jobs)
+
+            model_path = os.path.join(tmp_dir, f"{trainer}.onnx")
+            export_onnx(clf, model_path, X_train[:1])
+
+            sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+            onnx_pred = sess.run(None, {sess.get_inputs()[0].name: X_test})[0]
+
+            result = {
+                "trainer": trainer,
+                "n_train": int(len(X_train)),
+                "fit_seconds": float(fit_seconds),
+                "accuracy": float(np.mean(onnx_pred == y_test)),
+                "model_bytes": os.path.getsize(model_path),
+            }
+            result.update(measure_onnx_latency(model_path, X_test, repeat=repeat))
+            results.append(result)
+    return results
+
+
+def print_report(results: List[Dict[str, Any]]):
+    print("\n" + "=" * 92)
+    print(
+        f"{'trainer':<10} {'n_train':>9} {'fit_s':>9} {'accuracy':>9} {'bytes':>9} "
+        f"{'p50_us':>9} {'p99_us':>9} {'batch_us/row':>13}"
+    )
+    print("-" * 92)
+    for r in results:
+        print(
+            f"{r['trainer']:<10} {r['n_train']:>9} {r['fit_seconds']:>9.3f} {r['accuracy']:>9.4f} "
+            f"{r['model_bytes']:>9} {r['single_p50_us']:>9.1f} {r['single_p99_us']:>9.1f} "
+            f"{r['batch_per_row_us']:>13.3f}"
+        )
+    print("=" * 92 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark policy model trainers (fit time, ONNX latency, accuracy)")
+    parser.add_argument("--log-path", type=str, default="logs/query_log.jsonl", help="Path to query log JSONL")
+    parser.add_argument("--sample-size", type=int, default=0, help="Subsample N log rows (0 = all)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic rows instead of the log")
+    parser.add_argument("--trainers", type=str, default=",".join(TRAINERS), help="Comma-separated trainers")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Training threads (-1 = all cores)")
+    parser.add_argument("--repeat", type=int, default=200, help="Single-row inference repetitions")
+    parser.add_argument("--json", type=str, default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    trainers = [t.strip() for t in args.trainers.split(",") if t.strip()] or [DEFAULT_TRAINER]
+    unknown = [t for t in trainers if t not in TRAINERS]
+    if unknown:
+        logger.error(f"Unknown trainers: {unknown}. Expected one of {TRAINERS}")
+        sys.exit(1)
+
+    logs = synthetic_logs(args.synthetic) if args.synthetic > 0 else load_logs(args.log_path)
+    if not logs:
+        logger.error("No logs found. Use --synthetic N to benchmark on generated data.")
+        sys.exit(1)
+
+    df = extract_features_and_labels(logs)
+    if args.sample_size and len(df) > args.sample_size:
+        df = df.sample(n=args.sample_size, random_state=42)
+    if df["label"].nunique() < 2:
+        logger.error("Log sample contains only one class; cannot benchmark.")
+        sys.exit(1)
+
+    results = benchmark(df, trainers, n_jobs=args.n_jobs, repeat=args.repeat)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
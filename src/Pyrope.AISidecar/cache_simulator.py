@@ -0,0 +1,486 @@
+"""
+Trace-driven result cache simulator for offline policy evaluation.
+
+Replays recorded query traces through a vectorized model of Garnet's result cache
+(MemoryCacheStorage + ResultCache):
+
+- A miss runs the vector search and, if admitted, inserts the result with an absolute
+  expiry of ``ttl_seconds`` (hits do not refresh the expiry, matching MemoryCacheStorage).
+- Admission: an entry is inserted when the event's admission score is at least
+  ``admission_threshold``. Traces may carry an ``admission_score`` column (e.g. the output of
+  an admission model); otherwise the score is the key's prior reuse ``c / (c + 1)`` where ``c``
+  is the number of earlier occurrences.
+- Capacity: modeled with Che's characteristic-time approximation. LRU eviction under a
+  capacity of C entries behaves like an idle timeout T_C chosen so the mean number of live
+  entries equals C. ``eviction_priority`` p stretches that idle timeout to T_C * 2**p, so
+  higher-priority entries survive longer under memory pressure.
+
+Keys are sorted once per trace, so each policy evaluation is a handful of O(n) NumPy passes
+and a sweep over hundreds of policies reuses the same prepared trace.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from policy_engine import HeuristicPolicyEngine, PolicyConfig
+
+logger = logging.getLogger(__name__)
+
+# Trace columns used as model features, in train_model.FEATURE_COLUMNS order.
+FEATURE_TRACE_COLUMNS = ["qps", "miss_rate", "latency_p99_ms", "cpu_utilization"]
+
+PRIORITY_RETENTION_FACTOR = 2.0
+DEFAULT_HIT_LATENCY_MS = 0.2
+
+
+@dataclass
+class Trace:
+    """Columnar query trace. All arrays share the same length (one row per query)."""
+
+    timestamp_ms: np.ndarray
+    query_hash: np.ndarray
+    latency_ms: np.ndarray
+    search_cost_ms: np.ndarray
+    admission_score: Optional[np.ndarray] = None
+    features: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamp_ms)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Trace":
+        for column in ("timestamp_ms", "query_hash"):
+            if column not in df.columns:
+                raise ValueError(f"Trace is missing required column '{column}'")
+
+        latency = df["latency_ms"].to_numpy(np.float64) if "latency_ms" in df.columns else np.ones(len(df))
+        cost = df["search_cost_ms"].to_numpy(np.float64) if "search_cost_ms" in df.columns else latency
+        score = df["admission_score"].to_numpy(np.float64) if "admission_score" in df.columns else None
+        features = None
+        if all(c in df.columns for c in FEATURE_TRACE_COLUMNS):
+            features = df[FEATURE_TRACE_COLUMNS].to_numpy(np.float32)
+
+        if pd.api.types.is_integer_dtype(df["query_hash"]):
+            query_hash = df["query_hash"].to_numpy(np.int64)
+        else:
+            query_hash = pd.util.hash_pandas_object(df["query_hash"].astype(str), index=False).to_numpy().view(np.int64)
+
+        return cls(
+            timestamp_ms=df["timestamp_ms"].to_numpy(np.float64),
+            query_hash=query_hash,
+            latency_ms=latency,
+            search_cost_ms=cost,
+            admission_score=score,
+            features=features,
+        )
+
+
+def load_trace(path: str) -> Trace:
+    """Loads a trace from CSV, JSONL or Parquet."""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+    elif path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_json(path, lines=True)
+    return Trace.from_frame(df)
+
+
+def synthetic_trace(
+    n_events: int = 1_000_000,
+    n_keys: int = 100_000,
+    zipf_a: float = 1.1,
+    duration_s: float = 3600.0,
+    seed: int = 42,
+) -> Trace:
+    """Generates a Zipf-popularity trace with log-normal search latencies."""
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, n_keys + 1, dtype=np.float64)
+    popularity = ranks**-zipf_a
+    popularity /= popularity.sum()
+    keys = rng.choice(n_keys, size=n_events, p=popularity).astype(np.int64)
+    timestamps = np.sort(rng.uniform(0.0, duration_s * 1000.0, size=n_events))
+    latency = rng.lognormal(mean=np.log(20.0), sigma=0.5, size=n_events)
+    features = np.column_stack(
+        [
+            rng.lognormal(5.0, 1.0, n_events),
+            rng.beta(2.0, 5.0, n_events),
+            latency,
+            rng.uniform(0.0, 100.0, n_events),
+        ]
+    ).astype(np.float32)
+    return Trace(
+        timestamp_ms=timestamps,
+        query_hash=keys,
+        latency_ms=latency,
+        search_cost_ms=latency,
+        features=features,
+    )
+
+
+@dataclass
+class SimulationResult:
+    label: str
+    events: int
+    hits: int
+    admitted_inserts: int
+    hit_rate: float
+    search_cost_total_ms: float
+    search_cost_saved_ms: float
+    latency_mean_ms: float
+    latency_p50_ms: float
+    latency_p95_ms: float
+    latency_p99_ms: float
+    mean_occupancy: float
+    characteristic_time_ms: float
+    hit_rate_by_action: Optional[Dict[int, float]] = None
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+def policy_grid(
+    ttl_seconds: Sequence[int],
+    admission_thresholds: Sequence[float],
+    eviction_priorities: Sequence[int] = (0,),
+) -> List[PolicyConfig]:
+    """Cartesian product of policy parameters, for sweeps."""
+    return [
+        PolicyConfig(admission_threshold=float(a), ttl_seconds=int(t), eviction_priority=int(p))
+        for t, a, p in itertools.product(ttl_seconds, admission_thresholds, eviction_priorities)
+    ]
+
+
+def _describe(policy: PolicyConfig) -> str:
+    return f"ttl={policy.ttl_seconds}s adm={policy.admission_threshold:.2f} evp={policy.eviction_priority}"
+
+
+def _next_true_at_or_after(mask: np.ndarray) -> np.ndarray:
+    """For each position i, the first j >= i where mask[j] is True (len(mask) if none)."""
+    n = len(mask)
+    candidates = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(candidates[::-1])[::-1]
+
+
+class CacheSimulator:
+    """Replays one prepared trace against any number of policies."""
+
+    def __init__(
+        self,
+        trace: Trace,
+        capacity: Optional[int] = None,
+        hit_latency_ms: float = DEFAULT_HIT_LATENCY_MS,
+        occupancy_tolerance: float = 0.01,
+    ):
+        if len(trace) == 0:
+            raise ValueError("Trace is empty")
+        self.trace = trace
+        self.capacity = capacity
+        self.hit_latency_ms = float(hit_latency_ms)
+        self.occupancy_tolerance = float(occupancy_tolerance)
+
+        # Sort by (key, time) once; every per-policy pass works in this order.
+        order = np.lexsort((trace.timestamp_ms, trace.query_hash))
+        self._order = order
+        t = trace.timestamp_ms[order].astype(np.float64)
+        keys = trace.query_hash[order]
+        n = len(t)
+        self._n = n
+        self._t = t
+        self._latency = trace.latency_ms[order]
+        self._cost = trace.search_cost_ms[order]
+
+        new_segment = np.ones(n, dtype=bool)
+        new_segment[1:] = keys[1:] != keys[:-1]
+        segment_id = np.cumsum(new_segment) - 1
+        self._segment_starts = np.flatnonzero(new_segment)
+        self._segment_end = np.append(self._segment_starts[1:], n)[segment_id]
+        rank = np.arange(n) - self._segment_starts[segment_id]
+
+        self._gap = np.empty(n, dtype=np.float64)
+        self._gap[0] = np.inf
+        self._gap[1:] = t[1:] - t[:-1]
+        self._gap[new_segment] = np.inf
+
+        # Per-key offsets make the concatenated timeline strictly increasing across keys, so
+        # one searchsorted finds TTL expiry positions for every key at once.
+        self._t_min = float(t.min())
+        self._t_max = float(t.max())
+        stride = self._t_max - self._t_min + 1.0
+        self._timeline = (t - self._t_min) + segment_id * stride
+
+        if trace.admission_score is not None:
+            self._admission_score = trace.admission_score[order].astype(np.float64)
+        else:
+            self._admission_score = rank / (rank + 1.0)
+
+        self._features = trace.features[order] if trace.features is not None else None
+        self._duration_ms = max(1.0, self._t_max - self._t_min)
+        self._break_cache: Dict[float, np.ndarray] = {}
+        self._expiry_cache: Dict[float, np.ndarray] = {}
+
+    # --- policy inputs -------------------------------------------------
+
+    def _policy_arrays(self, policies: Sequence[PolicyConfig], actions: Optional[np.ndarray]):
+        ttl_ms = np.array([p.ttl_seconds * 1000.0 for p in policies])
+        threshold = np.array([p.admission_threshold for p in policies])
+        priority = np.array([p.eviction_priority for p in policies], dtype=np.int64)
+        if actions is None:
+            return ttl_ms[0], threshold[0], priority[0]
+        sorted_actions = np.asarray(actions, dtype=np.int64)[self._order]
+        return ttl_ms[sorted_actions], threshold[sorted_actions], priority[sorted_actions]
+
+    def _next_break(self, idle_timeout_ms: float) -> np.ndarray:
+        """First position j > i whose gap since the previous access exceeds the idle timeout."""
+        cached = self._break_cache.get(idle_timeout_ms)
+        if cached is not None:
+            return cached
+        at_or_after = _next_true_at_or_after(self._gap > idle_timeout_ms)
+        result = np.empty(self._n, dtype=np.int64)
+        result[:-1] = at_or_after[1:]
+        result[-1] = self._n
+        if len(self._break_cache) > 64:
+            self._break_cache.clear()
+        self._break_cache[idle_timeout_ms] = result
+        return result
+
+    # --- core replay ---------------------------------------------------
+
+    def _expiry(self, ttl_ms) -> np.ndarray:
+        """First position j > i (any key) past the absolute expiry of an entry inserted at i."""
+        if np.ndim(ttl_ms) == 0:
+            cached = self._expiry_cache.get(float(ttl_ms))
+            if cached is not None:
+                return cached
+        expiry = np.searchsorted(self._timeline, self._timeline + ttl_ms, side="right")
+        if np.ndim(ttl_ms) == 0:
+            if len(self._expiry_cache) > 16:
+                self._expiry_cache.clear()
+            self._expiry_cache[float(ttl_ms)] = expiry
+        return expiry
+
+    def _replay(self, ttl_ms, expiry, next_admitted, priority, characteristic_time_ms: float):
+        """Returns (is_miss, insert positions, occupancy integral in entry-ms)."""
+        n = self._n
+        seg_end = self._segment_end
+
+        if np.isinf(characteristic_time_ms):
+            idle = np.full(n, np.inf)
+            next_miss = np.minimum(expiry, seg_end)
+        else:
+            idle = characteristic_time_ms * PRIORITY_RETENTION_FACTOR ** np.asarray(priority, dtype=np.float64)
+            if np.ndim(idle) == 0:
+                breaks = self._next_break(float(idle))
+                idle = np.full(n, float(idle))
+            else:
+                breaks = np.empty(n, dtype=np.int64)
+                for value in np.unique(idle):
+                    mask = idle == value
+                    breaks[mask] = self._next_break(float(value))[mask]
+            next_miss = np.minimum(np.minimum(expiry, breaks), seg_end)
+
+        # Non-admitted misses form ranges [start, next admitted); admitted misses are chain
+        # nodes that insert an entry and absorb hits until next_miss.
+        starts = self._segment_starts
+        first_insert = next_admitted[starts]
+        range_starts = [starts]
+        range_ends = [first_insert]
+        nodes = []
+        frontier = first_insert[first_insert < seg_end[starts]]
+        while frontier.size:
+            nodes.append(frontier)
+            following = next_miss[frontier]
+            following = following[following < seg_end[frontier]]
+            inserts = next_admitted[following]
+            range_starts.append(following)
+            range_ends.append(inserts)
+            frontier = inserts[inserts < seg_end[following]]
+
+        boundaries = np.bincount(np.concatenate(range_starts), minlength=n + 1) - np.bincount(
+            np.concatenate(range_ends), minlength=n + 1
+        )
+        is_miss = np.cumsum(boundaries[:n]) > 0
+        inserts = np.concatenate(nodes) if nodes else np.empty(0, dtype=np.int64)
+        is_miss[inserts] = True
+
+        occupancy = 0.0
+        if inserts.size:
+            t = self._t
+            ttl_at = ttl_ms[inserts] if np.ndim(ttl_ms) else ttl_ms
+            last_hit = next_miss[inserts] - 1
+            end = np.minimum(t[inserts] + ttl_at, t[last_hit] + idle[inserts])
+            end = np.minimum(end, self._t_max)
+            occupancy = float(np.sum(end - t[inserts]))
+        return is_miss, inserts, occupancy
+
+    def _solve_characteristic_time(self, ttl_ms, threshold, priority):
+        """Finds the idle timeout T_C whose mean occupancy fits the capacity (inf when it always fits)."""
+        expiry = self._expiry(ttl_ms)
+        admitted = self._admission_score >= threshold
+        next_admitted = np.minimum(_next_true_at_or_after(admitted), self._segment_end)
+
+        def replay(characteristic_time_ms):
+            return self._replay(ttl_ms, expiry, next_admitted, priority, characteristic_time_ms)
+
+        unconstrained = replay(np.inf)
+        if self.capacity is None or unconstrained[2] / self._duration_ms <= self.capacity:
+            return np.inf, unconstrained
+
+        low, high = 1.0, float(np.max(ttl_ms))
+        best = None
+        for _ in range(40):
+            mid = np.sqrt(low * high)
+            result = replay(mid)
+            if result[2] / self._duration_ms > self.capacity:
+                high = mid
+            else:
+                low, best = mid, (mid, result)
+            if high / low - 1.0 < self.occupancy_tolerance:
+                break
+        if best is None:
+            best = (low, replay(low))
+        return best
+
+    def run(
+        self,
+        policies: Union[PolicyConfig, Sequence[PolicyConfig]],
+        actions: Optional[np.ndarray] = None,
+        label: Optional[str] = None,
+    ) -> SimulationResult:
+        """Simulates one policy, or per-event policies selected by ``actions`` (indices into policies)."""
+        if isinstance(policies, PolicyConfig):
+            policies = [policies]
+        if actions is None and len(policies) != 1:
+            raise ValueError("actions are required when simulating more than one policy")
+
+        ttl_ms, threshold, priority = self._policy_arrays(policies, actions)
+        characteristic_time, (is_miss, inserts, occupancy) = self._solve_characteristic_time(
+            ttl_ms, threshold, priority
+        )
+
+        hit = ~is_miss
+        latency = np.where(hit, self.hit_latency_ms, self._latency)
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        hits = int(hit.sum())
+        hit_rate_by_action = None
+        if actions is not None:
+            sorted_actions = np.asarray(actions, dtype=np.int64)[self._order]
+            hit_rate_by_action = {int(a): float(hit[sorted_actions == a].mean()) for a in np.unique(sorted_actions)}
+        return SimulationResult(
+            label=label or (_describe(policies[0]) if len(policies) == 1 else "per-event"),
+            events=self._n,
+            hits=hits,
+            admitted_inserts=int(inserts.size),
+            hit_rate=hits / self._n,
+            search_cost_total_ms=float(self._cost.sum()),
+            search_cost_saved_ms=float(self._cost[hit].sum()),
+            latency_mean_ms=float(latency.mean()),
+            latency_p50_ms=float(p50),
+            latency_p95_ms=float(p95),
+            latency_p99_ms=float(p99),
+            mean_occupancy=occupancy / self._duration_ms,
+            characteristic_time_ms=float(characteristic_time),
+            hit_rate_by_action=hit_rate_by_action,
+        )
+
+    def sweep(self, policies: Iterable[PolicyConfig]) -> List[SimulationResult]:
+        return [self.run(policy) for policy in policies]
+
+    def run_model(
+        self,
+        model,
+        policies: Optional[Sequence[PolicyConfig]] = None,
+        label: str = "model",
+    ) -> SimulationResult:
+        """Simulates a policy model that maps trace features to an action per event.
+
+        ``model`` is an ONNX file path, an onnxruntime session or any object with ``predict``.
+        Action 0/1 select the heuristic default/aggressive policies unless ``policies`` is given.
+        """
+        if self.trace.features is None:
+            raise ValueError(f"Trace has no feature columns {FEATURE_TRACE_COLUMNS}; cannot score a model")
+        if policies is None:
+            heuristic = HeuristicPolicyEngine()
+            policies = [heuristic.policy_for_action(0), heuristic.policy_for_action(1)]
+        actions = predict_actions(model, self.trace.features)
+        return self.run(policies, actions=np.clip(actions, 0, len(policies) - 1), label=label)
+
+
+def predict_actions(model, features: np.ndarray) -> np.ndarray:
+    """Scores all events in one batched call."""
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    if isinstance(model, str):
+        import onnxruntime as ort
+
+        model = ort.InferenceSession(model, providers=["CPUExecutionProvider"])
+    if hasattr(model, "get_inputs"):
+        labels = model.run(None, {model.get_inputs()[0].name: features})[0]
+    else:
+        labels = model.predict(features)
+    return np.asarray(labels, dtype=np.int64).reshape(-1)
+
+
+def print_report(results: List[SimulationResult]):
+    print("\n" + "=" * 110)
+    print(
+        f"{'policy':<32} {'hit_rate':>9} {'saved_ms':>14} {'saved%':>7} {'p50_ms':>8} "
+        f"{'p99_ms':>8} {'occupancy':>10} {'T_c_ms':>12}"
+    )
+    print("-" * 110)
+    for r in results:
+        saved_pct = r.search_cost_saved_ms / r.search_cost_total_ms * 100 if r.search_cost_total_ms else 0.0
+        print(
+            f"{r.label:<32} {r.hit_rate:>9.4f} {r.search_cost_saved_ms:>14.1f} {saved_pct:>6.1f}% "
+            f"{r.latency_p50_ms:>8.2f} {r.latency_p99_ms:>8.2f} {r.mean_occupancy:>10.1f} "
+            f"{r.characteristic_time_ms:>12.0f}"
+        )
+    print("=" * 110 + "\n")
+
+
+def _parse_list(raw: str, cast):
+    return [cast(v) for v in raw.split(",") if v.strip()]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Replay query traces through a simulated result cache")
+    parser.add_argument("--trace", type=str, default=None, help="Trace file (CSV, JSONL or Parquet)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use a synthetic Zipf trace with N events")
+    parser.add_argument("--capacity", type=int, default=None, help="Cache capacity in entries (default: unbounded)")
+    parser.add_argument("--ttl", type=str, default="30,60,300,900", help="Comma-separated TTLs (seconds)")
+    parser.add_argument("--admission", type=str, default="0,0.1,0.5", help="Comma-separated admission thresholds")
+    parser.add_argument("--priority", type=str, default="0", help="Comma-separated eviction priorities")
+    parser.add_argument("--model", type=str, default=None, help="Also simulate this ONNX policy model")
+    parser.add_argument("--top", type=int, default=20, help="Show the N best policies by search cost saved")
+    args = parser.parse_args()
+
+    if args.synthetic > 0:
+        trace = synthetic_trace(args.synthetic)
+    elif args.trace:
+        trace = load_trace(args.trace)
+    else:
+        logger.error("Either --trace or --synthetic is required.")
+        sys.exit(1)
+
+    simulator = CacheSimulator(trace, capacity=args.capacity)
+    grid = policy_grid(_parse_list(args.ttl, int), _parse_list(args.admission, float), _parse_list(args.priority, int))
+    logger.info(f"Sweeping {len(grid)} policies over {len(trace)} events...")
+    results = simulator.sweep(grid)
+    if args.model:
+        results.append(simulator.run_model(args.model, label=f"model:{args.model}"))
+
+    results.sort(key=lambda r: r.search_cost_saved_ms, reverse=True)
+    print_report(results[: args.top])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from policy_engine import PolicyConfig
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionCache:
+    """Size-bounded LRU cache of policy decisions with stale-while-revalidate.
+
+    An entry is fresh for ttl_seconds and may then be served stale for up to max_stale_seconds
+    more while the caller refreshes it; after that it is dropped. The least recently used
+    entry is evicted once max_entries is exceeded. With a path, entries survive restarts:
+    load() on startup, and put() rewrites the file at most every save_interval_seconds.
+
+    Entries may carry a context vector (e.g. scaled metrics); nearest() then finds fresh entries
+    close to a query vector, for reuse when the exact key misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 60.0,
+        max_stale_seconds: float = 600.0,
+        path: Optional[str] = None,
+        save_interval_seconds: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_stale_seconds = max(0.0, float(max_stale_seconds))
+        self.path = path
+        self.save_interval_seconds = float(save_interval_seconds)
+        # Wall-clock timestamps, so ages stay meaningful across restarts.
+        self._clock = clock
+
+        self._entries: "OrderedDict[str, Tuple[PolicyConfig, float]]" = OrderedDict()
+        self._vectors: Dict[str, np.ndarray] = {}
+        # Stacked (keys, vectors, stored_at) for nearest(); rebuilt lazily after entries change.
+        self._index: Optional[Tuple[List[str], np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = clock()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "neighbor_hits": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: str) -> Tuple[Optional[PolicyConfig], bool]:
+        """(config, fresh) for key; (None, False) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None, False
+            config, stored_at = entry
+            age = self._clock() - stored_at
+            if age > self.ttl_seconds + self.max_stale_seconds:
+                self._remove(key)
+                self._dirty = True
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = age < self.ttl_seconds
+            self._counters["hits" if fresh else "stale_hits"] += 1
+            return config, fresh
+
+    def _remove(self, key: str):
+        del self._entries[key]
+        if self._vectors.pop(key, None) is not None:
+            self._index = None
+
+    def _evict_overflow(self) -> int:
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            evicted += 1
+        return evicted
+
+    def put(self, key: str, config: PolicyConfig, vector: Optional[np.ndarray] = None):
+        with self._lock:
+            self._entries[key] = (config, self._clock())
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = np.asarray(vector, dtype=np.float64).reshape(-1)
+            self._index = None
+            self._counters["evictions"] += self._evict_overflow()
+            self._dirty = True
+            due = self.path and self._clock() - self._last_save >= self.save_interval_seconds
+        if due:
+            self.save()
+
+    def vector(self, key: str) -> Optional[np.ndarray]:
+        """The context vector stored with key, if any, without counting a lookup."""
+        with self._lock:
+            return self._vectors.get(key)
+
+    def nearest(self, vector: np.ndarray, radius: float, k: int = 1) -> List[Tuple[PolicyConfig, float]]:
+        """Up to k fresh (config, distance) pairs within radius of vector, nearest first.
+
+        A brute-force scan over at most max_entries vectors; at this size one vectorized
+        distance computation beats maintaining a tree under constant inserts and evictions.
+        """
+        with self._lock:
+            if self._index is None:
+                keys = list(self._vectors)
+                if not keys:
+                    return []
+                vectors = np.vstack([self._vectors[key] for key in keys])
+                stored_at = np.array([self._entries[key][1] for key in keys])
+                self._index = (keys, vectors, stored_at)
+            keys, vectors, stored_at = self._index
+            diff = vectors - np.asarray(vector, dtype=np.float64).reshape(1, -1)
+            squared = np.einsum("ij,ij->i", diff, diff)
+            candidates = np.flatnonzero((squared <= radius * radius) & (self._clock() - stored_at < self.ttl_seconds))
+            if candidates.size == 0:
+                return []
+            self._counters["neighbor_hits"] += 1
+            nearest = candidates[np.argsort(squared[candidates], kind="stable")][:k]
+            return [(self._entries[keys[i]][0], float(np.sqrt(squared[i]))) for i in nearest]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = {name: float(count) for name, count in self._counters.items()}
+            stats["entries"] = float(len(self._entries))
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def save(self, path: Optional[str] = None):
+        """Writes entries still within their stale window, oldest first, atomically."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            horizon = self._clock() - self.ttl_seconds - self.max_stale_seconds
+            entries = [
+                {"key": key, "stored_at": stored_at, "config": dataclasses.asdict(config)}
+                for key, (config, stored_at) in self._entries.items()
+                if stored_at >= horizon
+            ]
+            for entry in entries:
+                if entry["key"] in self._vectors:
+                    entry["vector"] = self._vectors[entry["key"]].tolist()
+            self._dirty = False
+            self._last_save = self._clock()
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to save decision cache to {path}: {e}")
+
+    def flush(self):
+        """Saves if anything changed since the last save."""
+        if self._dirty:
+            self.save()
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Restores saved entries that are still within their stale window; returns how many."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)["entries"]
+            restored = [
+                (e["key"], PolicyConfig(**e["config"]), float(e["stored_at"]), e.get("vector")) for e in entries
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to load decision cache from {path}: {e}")
+            return 0
+
+        horizon = self._clock() - self.ttl_seconds - self.max_stale_seconds
+        restored = sorted((r for r in restored if r[2] >= horizon), key=lambda r: r[2])
+        with self._lock:
+            for key, config, stored_at, vector in restored:
+                self._entries[key] = (config, stored_at)
+                self._entries.move_to_end(key)
+                if vector is not None:
+                    self._vectors[key] = np.asarray(vector, dtype=np.float64)
+            self._index = None
+            self._evict_overflow()
+        return min(len(restored), self.max_entries)
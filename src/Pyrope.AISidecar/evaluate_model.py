@@ -1,6 +1,7 @@
 import argparse
 import logging
 import sys
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import GradientBoostingClassifier
@@ -59,12 +60,8 @@ def evaluate_simulation(data: pd.DataFrame, model):
     # If High Load AND AI Misses, latency stays high
     # If Normal Load AND AI Intervenes, latency stays same (maybe slight overhead ignored)
 
-    def simulate_latency(row):
-        if row["label"] == 1 and row["ai_decision"] == 1:
-            return row["latency"] * 0.5  # Benefit
-        return row["latency"]
-
-    ai_p99_cum = data.apply(simulate_latency, axis=1).sum()
+    benefit = (data["label"].to_numpy() == 1) & (data["ai_decision"].to_numpy() == 1)
+    ai_p99_cum = np.where(benefit, data["latency"].to_numpy() * 0.5, data["latency"].to_numpy()).sum()
     p99_improvement = ((baseline_p99_sum - ai_p99_cum) / baseline_p99_sum) * 100 if baseline_p99_sum > 0 else 0
 
     print(f"Baseline Cumulative P99:     {baseline_p99_sum:.2f} ms")
@@ -73,9 +70,23 @@ def evaluate_simulation(data: pd.DataFrame, model):
     print("=" * 40 + "\n")
 
 
+def evaluate_trace(trace_path: str, model, capacity=None):
+    """Replays a recorded query trace through the cache simulator: heuristic baseline vs model."""
+    from cache_simulator import CacheSimulator, load_trace, print_report
+    from policy_engine import HeuristicPolicyEngine
+
+    simulator = CacheSimulator(load_trace(trace_path), capacity=capacity)
+    baseline = simulator.run(HeuristicPolicyEngine().compute_policy(0.0), label="baseline (default policy)")
+    results = [baseline, simulator.run_model(model, label="ai model")]
+    print_report(results)
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description="Evaluate AI Sidecar Policy Model")
     parser.add_argument("--log-path", type=str, default="logs/query_log.jsonl", help="Path to query log JSONL")
+    parser.add_argument("--trace", type=str, default=None, help="Query trace to replay through the cache simulator")
+    parser.add_argument("--capacity", type=int, default=None, help="Simulated cache capacity in entries")
     args = parser.parse_args()
 
     logger.info(f"Loading logs from {args.log_path}...")
@@ -103,6 +114,10 @@ def main():
     test_df = df.iloc[y_test.index].copy()
     evaluate_simulation(test_df, clf)
 
+    if args.trace:
+        logger.info(f"Replaying trace {args.trace} through the cache simulator...")
+        evaluate_trace(args.trace, clf, capacity=args.capacity)
+
 
 if __name__ == "__main__":
     main()
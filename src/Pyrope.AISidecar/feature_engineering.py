@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from collections import OrderedDict
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from math import sqrt
-from typing import Mapping, Optional, Sequence
+from typing import Dict, List, Mapping, Optional, Sequence
+import threading
 import time
 
+import numpy as np
+
 FILTER_TYPE_ENCODING = {
     "none": 0.0,
     "tag": 1.0,
@@ -14,6 +17,8 @@ FILTER_TYPE_ENCODING = {
     "unknown": -1.0,
 }
 
+_VALID_FILTER_CODES = frozenset(FILTER_TYPE_ENCODING.values())
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -61,19 +66,62 @@ class QueryHistory:
     def __init__(self, max_entries: int = 10000) -> None:
         self._entries: "OrderedDict[str, QueryHistoryEntry]" = OrderedDict()
         self._max_entries = max_entries
+        self._lock = threading.Lock()
 
     def record(self, query_id: str, hit: bool, timestamp_ms: Optional[int] = None) -> None:
         now_ms = _now_ms() if timestamp_ms is None else timestamp_ms
+        with self._lock:
+            self._apply(query_id, 1 if hit else 0, 1, now_ms)
+            self._evict()
+
+    def record_batch(
+        self,
+        query_ids: Sequence,
+        hits: Sequence[bool],
+        timestamps_ms: Optional[Sequence[int]] = None,
+    ) -> None:
+        """Records many observations at once.
+
+        Observations are aggregated per distinct query with NumPy first, so the dict is touched
+        once per distinct query instead of once per observation. Queries are applied in order
+        of their last timestamp, which keeps LRU order identical to sequential record() calls.
+        """
+        ids = np.asarray(query_ids)
+        if ids.size == 0:
+            return
+        hit_arr = np.asarray(hits, dtype=np.int64)
+        if timestamps_ms is None or len(timestamps_ms) == 0:
+            ts = np.full(ids.size, _now_ms(), dtype=np.int64)
+        else:
+            ts = np.asarray(timestamps_ms, dtype=np.int64)
+
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, minlength=unique_ids.size)
+        hit_counts = np.bincount(inverse, weights=hit_arr, minlength=unique_ids.size).astype(np.int64)
+        last_seen = np.full(unique_ids.size, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(last_seen, inverse, ts)
+        order = np.argsort(last_seen, kind="stable")
+
+        keys = unique_ids[order].tolist()
+        with self._lock:
+            for key, h, t, last in zip(
+                keys, hit_counts[order].tolist(), totals[order].tolist(), last_seen[order].tolist()
+            ):
+                self._apply(key, h, t, last)
+            self._evict()
+
+    def _apply(self, query_id, hits: int, total: int, timestamp_ms: int) -> None:
         entry = self._entries.get(query_id)
         if entry is None:
-            entry = QueryHistoryEntry(hits=0, total=0, last_seen_ms=now_ms)
+            entry = QueryHistoryEntry(hits=0, total=0, last_seen_ms=timestamp_ms)
             self._entries[query_id] = entry
-        entry.total += 1
-        if hit:
-            entry.hits += 1
-        entry.last_seen_ms = now_ms
+        entry.total += total
+        entry.hits += hits
+        entry.last_seen_ms = timestamp_ms
         self._entries.move_to_end(query_id)
-        if len(self._entries) > self._max_entries:
+
+    def _evict(self) -> None:
+        while len(self._entries) > self._max_entries:
             self._entries.popitem(last=False)
 
     def features(self, query_id: str, timestamp_ms: Optional[int] = None) -> HistoryFeatures:
@@ -87,8 +135,28 @@ class QueryHistory:
 
 
 class FeatureEngineer:
-    def __init__(self, history: Optional[QueryHistory] = None) -> None:
+    """Query, system and history features.
+
+    Query history is kept per tenant, so one busy tenant's queries neither evict nor skew another
+    tenant's hit rates and revisit intervals. history serves calls that name no tenant; each
+    tenant gets its own QueryHistory of max_entries_per_tenant queries.
+    """
+
+    def __init__(self, history: Optional[QueryHistory] = None, max_entries_per_tenant: int = 10000) -> None:
         self._history = history or QueryHistory()
+        self._max_entries_per_tenant = max_entries_per_tenant
+        self._tenant_histories: Dict[str, QueryHistory] = {}
+        self._lock = threading.Lock()
+
+    def _history_for(self, tenant_id: Optional[str]) -> QueryHistory:
+        if not tenant_id:
+            return self._history
+        with self._lock:
+            history = self._tenant_histories.get(tenant_id)
+            if history is None:
+                history = QueryHistory(max_entries=self._max_entries_per_tenant)
+                self._tenant_histories[tenant_id] = history
+            return history
 
     def extract_query_features(
         self,
@@ -107,8 +175,52 @@ class FeatureEngineer:
             queue_depth = 0.0
         return SystemFeatures(qps=float(qps), queue_depth=float(queue_depth))
 
-    def extract_history_features(self, query_id: str, timestamp_ms: Optional[int] = None) -> HistoryFeatures:
-        return self._history.features(query_id, timestamp_ms=timestamp_ms)
+    def extract_history_features(
+        self, query_id: str, timestamp_ms: Optional[int] = None, tenant_id: Optional[str] = None
+    ) -> HistoryFeatures:
+        return self._history_for(tenant_id).features(query_id, timestamp_ms=timestamp_ms)
 
-    def record_query(self, query_id: str, hit: bool, timestamp_ms: Optional[int] = None) -> None:
-        self._history.record(query_id, hit, timestamp_ms=timestamp_ms)
+    def record_query(
+        self, query_id: str, hit: bool, timestamp_ms: Optional[int] = None, tenant_id: Optional[str] = None
+    ) -> None:
+        self._history_for(tenant_id).record(query_id, hit, timestamp_ms=timestamp_ms)
+
+    def ingest_query_batch(
+        self,
+        query_ids: Sequence,
+        top_k: Sequence[int],
+        filter_types: Sequence[int],
+        norms: Sequence[float],
+        hits: Sequence[bool],
+        timestamps_ms: Optional[Sequence[int]] = None,
+        sample_rate: float = 0.0,
+        rng: Optional[np.random.Generator] = None,
+        tenant_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """Applies a packed batch of query observations to the tenant's history.
+
+        filter_types carries FILTER_TYPE_ENCODING codes. Returns a Bernoulli(sample_rate) sample
+        of rows with their query and history features, computed as seen before this batch.
+        """
+        history = self._history_for(tenant_id)
+        n = len(query_ids)
+        sampled: List[Dict] = []
+        if n and sample_rate > 0.0:
+            rng = rng or np.random.default_rng()
+            has_ts = timestamps_ms is not None and len(timestamps_ms) == n
+            for i in np.flatnonzero(rng.random(n) < sample_rate).tolist():
+                query_id = int(query_ids[i])
+                timestamp_ms = int(timestamps_ms[i]) if has_ts else None
+                code = float(filter_types[i])
+                query = QueryFeatures(
+                    norm=float(norms[i]),
+                    top_k=float(top_k[i]),
+                    filter_type=code if code in _VALID_FILTER_CODES else FILTER_TYPE_ENCODING["unknown"],
+                )
+                row = {"query_hash": query_id, "hit": bool(hits[i])}
+                row.update(asdict(query))
+                row.update(asdict(history.features(query_id, timestamp_ms=timestamp_ms)))
+                sampled.append(row)
+
+        history.record_batch(np.asarray(query_ids, dtype=np.uint64), hits, timestamps_ms)
+        return sampled
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+# Columns of the shared feature vector (train_model.FEATURE_COLUMNS order) that are heavy-tailed
+# and enter as log1p: qps and latency_p99_ms.
+DEFAULT_LOG_COLUMNS = (0, 2)
+
+
+class OnlineNormalizer:
+    """Streaming standardization shared by training, ONNX export and the online learners.
+
+    Each column is optionally mapped through log1p(max(x, 0)), then standardized with a running
+    mean and variance (Welford / Chan's parallel update, so batches and single rows cost the
+    same). The transform is computed in float32 with the same operations the exported ONNX
+    graph uses, so training-time and serving-time features match.
+    """
+
+    def __init__(self, n_features: int = 4, log_columns: Sequence[int] = DEFAULT_LOG_COLUMNS, min_std: float = 1e-3):
+        self.n_features = n_features
+        self.log_columns = tuple(sorted(log_columns))
+        self.min_std = min_std
+        self.count = 0
+        self.mean = np.zeros(n_features, dtype=np.float64)
+        self.m2 = np.zeros(n_features, dtype=np.float64)
+        self._log_mask = np.zeros(n_features, dtype=bool)
+        self._log_mask[list(self.log_columns)] = True
+        self._lock = threading.Lock()
+
+    def _pre(self, X: np.ndarray) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        logged = np.log(np.maximum(X, np.float32(0.0)) + np.float32(1.0))
+        return np.where(self._log_mask, logged, X)
+
+    def update(self, X: np.ndarray) -> "OnlineNormalizer":
+        batch = self._pre(X).astype(np.float64)
+        n = batch.shape[0]
+        if n == 0:
+            return self
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        with self._lock:
+            total = self.count + n
+            delta = batch_mean - self.mean
+            self.mean = self.mean + delta * (n / total)
+            self.m2 = self.m2 + batch_m2 + delta**2 * (self.count * n / total)
+            self.count = total
+        return self
+
+    @property
+    def std(self) -> np.ndarray:
+        if self.count < 2:
+            return np.ones(self.n_features, dtype=np.float64)
+        return np.maximum(np.sqrt(self.m2 / (self.count - 1)), self.min_std)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        with self._lock:
+            mean, std = self.mean.astype(np.float32), self.std.astype(np.float32)
+        return (self._pre(X) - mean) / std
+
+    @classmethod
+    def fit(cls, X: np.ndarray, **kwargs) -> "OnlineNormalizer":
+        return cls(n_features=np.atleast_2d(X).shape[1], **kwargs).update(X)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            count, mean, m2 = self.count, self.mean, self.m2
+        return {
+            "n_features": self.n_features,
+            "log_columns": list(self.log_columns),
+            "min_std": self.min_std,
+            "count": count,
+            "mean": mean.tolist(),
+            "m2": m2.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OnlineNormalizer":
+        normalizer = cls(data["n_features"], data["log_columns"], data.get("min_std", 1e-3))
+        normalizer.count = int(data["count"])
+        normalizer.mean = np.asarray(data["mean"], dtype=np.float64)
+        normalizer.m2 = np.asarray(data["m2"], dtype=np.float64)
+        return normalizer
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["OnlineNormalizer"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_onnx(self, input_name: str, output_name: str, opset: int = 12, ir_version: int = None) -> onnx.ModelProto:
+        """A standalone graph computing transform(): Where(mask, Log(Max(x, 0) + 1), x), then (y - mean) / std."""
+        mean, std = self.mean.astype(np.float32), self.std.astype(np.float32)
+        initializers = [
+            numpy_helper.from_array(np.array(0.0, dtype=np.float32), "norm_zero"),
+            numpy_helper.from_array(np.array(1.0, dtype=np.float32), "norm_one"),
+            numpy_helper.from_array(self._log_mask.reshape(1, -1), "norm_log_mask"),
+            numpy_helper.from_array(mean.reshape(1, -1), "norm_mean"),
+            numpy_helper.from_array(std.reshape(1, -1), "norm_std"),
+        ]
+        nodes = [
+            helper.make_node("Max", [input_name, "norm_zero"], ["norm_clipped"]),
+            helper.make_node("Add", ["norm_clipped", "norm_one"], ["norm_shifted"]),
+            helper.make_node("Log", ["norm_shifted"], ["norm_logged"]),
+            helper.make_node("Where", ["norm_log_mask", "norm_logged", input_name], ["norm_pre"]),
+            helper.make_node("Sub", ["norm_pre", "norm_mean"], ["norm_centered"]),
+            helper.make_node("Div", ["norm_centered", "norm_std"], [output_name]),
+        ]
+        graph = helper.make_graph(
+            nodes,
+            "feature_normalizer",
+            [helper.make_tensor_value_info(input_name, TensorProto.FLOAT, [None, self.n_features])],
+            [helper.make_tensor_value_info(output_name, TensorProto.FLOAT, [None, self.n_features])],
+            initializer=initializers,
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", opset)])
+        if ir_version is not None:
+            model.ir_version = ir_version
+        return model
+
+    def prepend_to(self, model: onnx.ModelProto) -> onnx.ModelProto:
+        """Returns model with this normalizer in front, keeping the original raw-feature input name."""
+        model_input = model.graph.input[0].name
+        opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+        raw_input = f"{model_input}_raw"
+        pre = self.to_onnx(raw_input, f"{model_input}_normalized", opset=opset, ir_version=model.ir_version)
+        merged = onnx.compose.merge_models(pre, model, io_map=[(f"{model_input}_normalized", model_input)])
+        # Expose the raw input under the name callers already feed.
+        for node in merged.graph.node:
+            node.input[:] = [model_input if name == raw_input else name for name in node.input]
+        merged.graph.input[0].name = model_input
+        return merged
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending(NamedTuple):
+    model: object
+    row: np.ndarray
+    enqueued: float
+    future: Future
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row scoring calls into one batched model call.
+
+    gRPC worker threads call submit() and block on the result. A single scheduler thread takes
+    the first queued row and everything queued behind it. A lone row, with no other submission
+    pending, is scored at once; otherwise the scheduler keeps collecting until max_batch_size
+    rows are queued or max_wait_ms has passed since the first row arrived. It then runs one
+    predict() per distinct model and fans the labels back out. At a 1x4 row the per-call
+    overhead dwarfs the arithmetic, so scoring cost grows with the number of batches rather than
+    the number of tenants reporting.
+    """
+
+    def __init__(self, max_batch_size: int = 64, max_wait_ms: float = 1.0, stats_window: int = 1024):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._pending_lock = threading.Lock()
+        self._pending = 0  # submitted and not yet taken off the queue
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._model_calls = 0
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._queue_waits_ms = deque(maxlen=stats_window)
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, model, row: np.ndarray, timeout: float = None) -> int:
+        """Scores one feature row with model and returns its label."""
+        return self.submit_async(model, row).result(timeout=timeout)
+
+    def submit_async(self, model, row: np.ndarray) -> Future:
+        if self._stopped.is_set():
+            raise RuntimeError("MicroBatcher is stopped")
+        future = Future()
+        row = np.asarray(row, dtype=np.float32).reshape(-1)
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put(_Pending(model, row, time.perf_counter(), future))
+        return future
+
+    def stop(self, timeout: float = 1.0):
+        self._stopped.set()
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = self._collect(first)
+            self._score(batch)
+
+    def _take(self, n: int) -> int:
+        with self._pending_lock:
+            self._pending -= n
+            return self._pending
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Counted before it is queued, so a submission racing this check still holds the window open.
+        if self._take(len(batch)) == 0 and len(batch) == 1:
+            return batch
+
+        deadline = first.enqueued + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed: still take whatever is already queued, without waiting.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            self._take(1)
+        return batch
+
+    def _score(self, batch: List[_Pending]):
+        dispatched = time.perf_counter()
+        # Canary and active tenants can share a window; each model gets its own call.
+        groups: Dict[int, List[_Pending]] = {}
+        for pending in batch:
+            groups.setdefault(id(pending.model), []).append(pending)
+
+        for members in groups.values():
+            try:
+                labels = members[0].model.predict(np.vstack([p.row for p in members]))
+                for pending, label in zip(members, np.asarray(labels).reshape(-1)):
+                    pending.future.set_result(int(label))
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(members)} rows: {e}")
+                for pending in members:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+        with self._stats_lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._model_calls += len(groups)
+            self._batch_sizes.append(len(batch))
+            self._queue_waits_ms.extend((dispatched - p.enqueued) * 1000.0 for p in batch)
+
+    def stats(self) -> Dict[str, float]:
+        """Lifetime counters plus batch size and queue wait over the recent window."""
+        with self._stats_lock:
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            waits = np.asarray(self._queue_waits_ms, dtype=np.float64)
+            return {
+                "requests": float(self._requests),
+                "batches": float(self._batches),
+                "model_calls": float(self._model_calls),
+                "batch_size_mean": float(sizes.mean()) if sizes.size else 0.0,
+                "batch_size_max": float(sizes.max()) if sizes.size else 0.0,
+                "queue_wait_p50_ms": float(np.percentile(waits, 50)) if waits.size else 0.0,
+                "queue_wait_p99_ms": float(np.percentile(waits, 99)) if waits.size else 0.0,
+            }
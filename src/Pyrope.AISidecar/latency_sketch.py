@@ -0,0 +1,144 @@
+import math
+from typing import Dict, List, Sequence
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile with the P² algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers whose heights track the min, q/2, q, (1+q)/2 and max quantiles and
+    nudges them with a piecewise-parabolic fit on every sample, so updates and reads are O(1)
+    in time and memory regardless of how many samples have been seen.
+    """
+
+    def __init__(self, q: float):
+        if not 0.0 < q < 1.0:
+            raise ValueError("quantile must be in (0, 1)")
+        self.q = q
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self._desired = [0.0, 2.0 * q, 4.0 * q, 2.0 + 2.0 * q, 4.0]
+        self._increments = [0.0, q / 2.0, q, (1.0 + q) / 2.0, 1.0]
+
+    def update(self, x: float):
+        x = float(x)
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1.0
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            if (d >= 1.0 and positions[i + 1] - positions[i] > 1.0) or (
+                d <= -1.0 and positions[i - 1] - positions[i] < -1.0
+            ):
+                step = 1.0 if d > 0 else -1.0
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    j = i + int(step)
+                    candidate = heights[i] + step * (heights[j] - heights[i]) / (positions[j] - positions[i])
+                heights[i] = candidate
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: float) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float:
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            # Exact (linear-interpolated) quantile of the few samples seen so far.
+            rank = self.q * (len(self._heights) - 1)
+            lo = int(math.floor(rank))
+            hi = min(lo + 1, len(self._heights) - 1)
+            return self._heights[lo] + (rank - lo) * (self._heights[hi] - self._heights[lo])
+        return self._heights[2]
+
+
+class LatencySketch:
+    """A fixed set of P² quantiles plus count, mean, min and max for one latency cohort."""
+
+    def __init__(self, quantiles: Sequence[float] = (0.5, 0.9, 0.99)):
+        self._estimators = {q: P2Quantile(q) for q in quantiles}
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, x: float):
+        x = float(x)
+        self.count += 1
+        self.mean += (x - self.mean) / self.count
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        for estimator in self._estimators.values():
+            estimator.update(x)
+
+    def quantile(self, q: float) -> float:
+        return self._estimators[q].value()
+
+    def to_dict(self) -> Dict[str, float]:
+        out = {"count": float(self.count), "mean": self.mean if self.count else math.nan}
+        for q, estimator in self._estimators.items():
+            out[f"p{round(q * 100):d}"] = estimator.value()
+        out["max"] = self.max if self.count else math.nan
+        return out
+
+
+class BernoulliSPRT:
+    """Wald's sequential probability ratio test on a stream of exceedance indicators.
+
+    H0: exceedances occur at rate p0 (healthy); H1: at rate p1 (degraded). The log-likelihood
+    ratio moves up by log(p1/p0) per exceedance and down by log((1-p1)/(1-p0)) otherwise.
+    Crossing the upper bound decides "degraded" with false-alarm rate ~alpha. Crossing the lower
+    bound accepts H0, and the test restarts so it keeps watching a long-running canary.
+    """
+
+    def __init__(self, p0: float, p1: float, alpha: float = 0.05, beta: float = 0.1):
+        if not 0.0 < p0 < p1 < 1.0:
+            raise ValueError("require 0 < p0 < p1 < 1")
+        self.p0 = p0
+        self.p1 = p1
+        self._step_exceed = math.log(p1 / p0)
+        self._step_ok = math.log((1.0 - p1) / (1.0 - p0))
+        self.upper = math.log((1.0 - beta) / alpha)
+        self.lower = math.log(beta / (1.0 - alpha))
+        self.llr = 0.0
+        self.samples = 0
+
+    def update(self, exceeded: bool) -> bool:
+        """Adds one observation; returns True when H1 (degradation) is accepted."""
+        self.samples += 1
+        self.llr += self._step_exceed if exceeded else self._step_ok
+        if self.llr >= self.upper:
+            return True
+        if self.llr <= self.lower:
+            self.llr = 0.0
+        return False
+
+    def reset(self):
+        self.llr = 0.0
+        self.samples = 0
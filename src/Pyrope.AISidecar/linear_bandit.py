@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from policy_grid import surviving_arms
+from tenant_state import TenantStateStore
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("linucb", "thompson")
+
+# Posterior draws used to estimate Thompson sampling's selection probability.
+PROPENSITY_DRAWS = 256
+
+
+def context_vector(features: np.ndarray) -> np.ndarray:
+    """Maps raw (qps, miss_rate, latency_p99_ms, cpu_utilization) rows to bounded contexts plus a bias.
+
+    qps and latency are heavy-tailed, so they enter as log1p; cpu is a percentage.
+    """
+    x = np.atleast_2d(np.asarray(features, dtype=np.float64))
+    out = np.empty((x.shape[0], 5), dtype=np.float64)
+    out[:, 0] = np.log1p(np.maximum(x[:, 0], 0.0))
+    out[:, 1] = x[:, 1]
+    out[:, 2] = np.log1p(np.maximum(x[:, 2], 0.0))
+    out[:, 3] = x[:, 3] / 100.0
+    out[:, 4] = 1.0
+    return out
+
+
+class LinearBanditEngine:
+    """Disjoint linear bandit (one ridge regression per arm) with LinUCB or Thompson sampling.
+
+    Every arm keeps A^-1 and b for A = ridge * I + sum(x x^T), b = sum(reward * x). Updates are
+    Sherman-Morrison rank-one corrections of A^-1, so select and update are O(d^2) NumPy work on
+    a 5-dimensional context rather than estimator calls. Rewards are regressed directly, keeping
+    their magnitude.
+
+    - linucb: picks argmax theta.x + alpha * sqrt(x^T A^-1 x)
+    - thompson: samples each arm's score from its posterior N(theta.x, v^2 x^T A^-1 x)
+
+    Exploration shrinks as an arm's uncertainty shrinks, instead of a fixed epsilon. State is
+    per tenant in a TenantStateStore whose prior row also learns from every tenant, so cold
+    tenants start from the population posterior.
+
+    With eliminate, arms whose mean reward is confidently below the tenant's best arm are
+    dropped from selection (see policy_grid.surviving_arms).
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "linucb",
+        model_path: Optional[str] = None,
+        n_arms: int = 2,
+        alpha: float = 1.0,
+        posterior_scale: float = 0.5,
+        ridge: float = 1.0,
+        seed: Optional[int] = None,
+        eliminate: bool = False,
+        elimination_delta: float = 0.05,
+        min_pulls: int = 20,
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown bandit algorithm '{algorithm}'. Choose from {ALGORITHMS}.")
+        self.algorithm = algorithm
+        self.model_path = model_path or f"models/{algorithm}_state.npz"
+        self.n_arms = n_arms
+        self.alpha = alpha
+        self.posterior_scale = posterior_scale
+        self.classes = list(range(n_arms))
+        self.eliminate = eliminate
+        self.elimination_delta = elimination_delta
+        self.min_pulls = min_pulls
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+        d = 5
+        self.state = TenantStateStore(
+            {
+                "a_inv": ((n_arms, d, d), np.float64),
+                "b": ((n_arms, d), np.float64),
+                "pulls": ((n_arms,), np.int64),
+                "reward_sum": ((n_arms,), np.float64),
+                "last_action": ((), np.int8),
+                "last_context": ((4,), np.float32),
+                "last_policy": ((3,), np.float32),
+            }
+        )
+        self.state.set_prior("a_inv", np.broadcast_to(np.eye(d) / ridge, (n_arms, d, d)))
+        self._load()
+
+    @property
+    def initialized(self) -> bool:
+        return bool(self.state.array("pulls")[0].sum() > 0)
+
+    def _load(self):
+        if os.path.exists(self.model_path) and self.state.load(self.model_path):
+            logger.info(f"Loaded {self.algorithm} bandit state for {len(self.state)} tenants")
+
+    def exploration(self) -> Dict[str, float]:
+        """The parameter that scales uncertainty-driven exploration, keyed by engine kind."""
+        if self.algorithm == "linucb":
+            return {"linucb_alpha": float(self.alpha)}
+        return {"thompson_posterior_scale": float(self.posterior_scale)}
+
+    def save(self):
+        try:
+            self.state.save(self.model_path)
+        except Exception as e:
+            logger.error(f"Failed to save {self.algorithm} bandit state: {e}")
+
+    def get_features(self, system_metrics) -> np.ndarray:
+        return np.array(
+            [
+                [
+                    float(system_metrics.qps),
+                    float(system_metrics.miss_rate),
+                    float(system_metrics.latency_p99_ms),
+                    float(system_metrics.cpu_utilization),
+                ]
+            ]
+        )
+
+    @staticmethod
+    def _posterior(a_inv: np.ndarray, b: np.ndarray, contexts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(n, n_arms) posterior mean reward and its standard deviation for each context.
+
+        a_inv is (n, arms, d, d) and b is (n, arms, d): the rows of each context's tenant.
+        """
+        theta = np.einsum("nkij,nkj->nki", a_inv, b)
+        mean = np.einsum("nki,ni->nk", theta, contexts)
+        variance = np.einsum("ni,nkij,nj->nk", contexts, a_inv, contexts)
+        return mean, np.sqrt(np.maximum(variance, 0.0))
+
+    def _alive(self, pulls: np.ndarray, reward_sum: np.ndarray) -> np.ndarray:
+        if not self.eliminate:
+            return np.ones(pulls.shape, dtype=bool)
+        return surviving_arms(pulls, reward_sum, delta=self.elimination_delta, min_pulls=self.min_pulls)
+
+    def select_batch(
+        self, features: np.ndarray, tenant_ids: Sequence[Optional[str]], return_propensity: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Selects one arm per row; rows may belong to different tenants.
+
+        With return_propensity, also returns each chosen arm's selection probability: 1 for
+        LinUCB (deterministic), and a Monte Carlo estimate over posterior draws for Thompson.
+        """
+        contexts = context_vector(features)
+        rows = np.array([self.state.tenant_row(t) for t in tenant_ids], dtype=np.int64)
+        a_inv, b, pulls, reward_sum = self.state.read_rows(rows, "a_inv", "b", "pulls", "reward_sum")
+        mean, width = self._posterior(a_inv, b, contexts)
+        alive = self._alive(pulls, reward_sum)
+        if self.algorithm == "linucb":
+            scores = mean + self.alpha * width
+        else:
+            scores = mean + self.posterior_scale * width * self._rng.standard_normal(mean.shape)
+        actions = np.argmax(np.where(alive, scores, -np.inf), axis=1)
+        for tenant_id, row_features, action in zip(tenant_ids, np.atleast_2d(features), actions):
+            if tenant_id:
+                self.state.set(tenant_id, "last_action", action)
+                self.state.set(tenant_id, "last_context", row_features)
+        if not return_propensity:
+            return actions
+
+        if self.algorithm == "linucb":
+            return actions, np.ones(len(actions))
+        wins = self._thompson_wins(mean, width, alive)[np.arange(len(actions)), actions]
+        # Add-one smoothing keeps the estimate away from zero for importance weighting.
+        return actions, (wins + 1.0) / (PROPENSITY_DRAWS + 1.0)
+
+    def _thompson_wins(self, mean: np.ndarray, width: np.ndarray, alive: np.ndarray) -> np.ndarray:
+        """(n, n_arms) number of PROPENSITY_DRAWS posterior draws each arm wins."""
+        draws = mean + self.posterior_scale * width * self._rng.standard_normal((PROPENSITY_DRAWS,) + mean.shape)
+        winners = np.argmax(np.where(alive, draws, -np.inf), axis=2)  # (draws, n)
+        return (winners[:, :, None] == np.arange(self.n_arms)).sum(axis=0).astype(np.float64)
+
+    def action_probabilities(self, features: np.ndarray, tenant_ids: Sequence[Optional[str]] = None) -> np.ndarray:
+        """(n, n_arms) probability that select_batch picks each arm for each row; no side effects.
+
+        Exact (one-hot) for LinUCB, a Monte Carlo estimate for Thompson sampling.
+        """
+        contexts = context_vector(features)
+        tenant_ids = tenant_ids if tenant_ids is not None else [None] * len(contexts)
+        rows = np.array([self.state.tenant_row(t) for t in tenant_ids], dtype=np.int64)
+        a_inv, b, pulls, reward_sum = self.state.read_rows(rows, "a_inv", "b", "pulls", "reward_sum")
+        mean, width = self._posterior(a_inv, b, contexts)
+        alive = self._alive(pulls, reward_sum)
+        if self.algorithm == "linucb":
+            greedy = np.argmax(np.where(alive, mean + self.alpha * width, -np.inf), axis=1)
+            return np.eye(self.n_arms)[greedy]
+        return self._thompson_wins(mean, width, alive) / PROPENSITY_DRAWS
+
+    def select_action(self, features: np.ndarray, tenant_id: str = None) -> int:
+        return int(self.select_batch(features, [tenant_id])[0])
+
+    def select_with_propensity(self, features: np.ndarray, tenant_id: str = None) -> Tuple[int, float]:
+        actions, propensities = self.select_batch(features, [tenant_id], return_propensity=True)
+        return int(actions[0]), float(propensities[0])
+
+    def update_batch(
+        self, features: np.ndarray, actions: Sequence[int], rewards: Sequence[float], tenant_ids: Sequence[str]
+    ):
+        """Applies a batch of feedback to each sample's tenant and the prior.
+
+        The m contexts that hit the same (row, arm) are folded in with one Woodbury update,
+        A^-1 <- A^-1 - A^-1 X^T (I + X A^-1 X^T)^-1 X A^-1, which equals m Sherman-Morrison
+        steps (a single step when m = 1). The touched rows are published together, so
+        select_batch never sees a half-applied batch.
+        """
+        contexts = context_vector(features)
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        with self._lock:
+            samples, rows = self.state.feedback_rows(tenant_ids)
+            unique_rows, local = np.unique(rows, return_inverse=True)
+            a_inv, b, pulls, reward_sum = self.state.read_rows(unique_rows, "a_inv", "b", "pulls", "reward_sum")
+            arms = actions[samples]
+            groups, group_of = np.unique(local * self.n_arms + arms, return_inverse=True)
+            for g, key in enumerate(groups):
+                row, arm = divmod(int(key), self.n_arms)
+                members = samples[group_of == g]
+                X = contexts[members]  # (m, d)
+                a_inv_xt = a_inv[row, arm] @ X.T  # (d, m)
+                gram = np.eye(len(members)) + X @ a_inv_xt
+                a_inv[row, arm] -= a_inv_xt @ np.linalg.solve(gram, a_inv_xt.T)
+                b[row, arm] += rewards[members] @ X
+                pulls[row, arm] += len(members)
+                reward_sum[row, arm] += rewards[members].sum()
+            self.state.write_rows(unique_rows, {"a_inv": a_inv, "b": b, "pulls": pulls, "reward_sum": reward_sum})
+
+    def update(self, features: np.ndarray, action: int, reward: float, tenant_id: str = None):
+        self.update_batch(features, [action], [reward], [tenant_id])
+
+    def remember_policy(self, tenant_id: str, policy) -> None:
+        self.state.set(
+            tenant_id, "last_policy", (policy.admission_threshold, policy.ttl_seconds, policy.eviction_priority)
+        )
+
+    def arm_estimates(self, features: np.ndarray, tenant_id: str = None) -> np.ndarray:
+        """Posterior mean reward of every arm for one context (no exploration bonus)."""
+        a_inv, b = self.state.read_rows(self.state.tenant_row(tenant_id), "a_inv", "b")
+        theta = np.einsum("kij,kj->ki", a_inv, b)
+        return theta @ context_vector(features)[0]
@@ -0,0 +1,119 @@
+"""
+LLM backends for LLMWorker.
+
+A backend turns a prompt into an LLMResponse with `async generate(prompt)` and raises on
+failure; LLMWorker owns queueing, rate limiting and budgeting. Responses carry the provider's
+token usage when it reports one, so budgets are metered on billed tokens rather than
+estimates. PYROPE_LLM_BACKEND picks one:
+
+- gemini (default): Google Gemini via google.generativeai (GEMINI_API_KEY, GEMINI_MODEL_ID)
+- openai: any OpenAI-compatible /chat/completions endpoint, e.g. vLLM, llama.cpp, Ollama or
+  llm_standin.py (PYROPE_LLM_BASE_URL, PYROPE_LLM_MODEL, PYROPE_LLM_API_KEY)
+"""
+
+import asyncio
+import logging
+import os
+from typing import NamedTuple, Optional
+
+import google.generativeai as genai
+import requests
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ("gemini", "openai")
+
+
+class LLMResponse(NamedTuple):
+    text: str
+    # Provider-reported usage; None when the provider does not report it.
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+def _token_count(value) -> Optional[int]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(value)
+
+
+class GeminiBackend:
+    def __init__(self, api_key: str, model_name: str):
+        self.model_name = model_name
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        response = await self._model.generate_content_async(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            response.text,
+            _token_count(getattr(usage, "prompt_token_count", None)),
+            _token_count(getattr(usage, "candidates_token_count", None)),
+        )
+
+
+class OpenAICompatibleBackend:
+    """Chat completions over HTTP. Requests run in worker threads on a pooled requests.Session."""
+
+    def __init__(
+        self,
+        base_url: str,
+        model_name: str,
+        api_key: Optional[str] = None,
+        timeout_seconds: float = 30.0,
+        max_output_tokens: int = 512,
+    ):
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.model_name = model_name
+        self.timeout_seconds = timeout_seconds
+        self.max_output_tokens = max_output_tokens
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self._session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _post(self, prompt: str) -> LLMResponse:
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+            "max_tokens": self.max_output_tokens,
+        }
+        resp = self._session.post(self.url, json=payload, timeout=self.timeout_seconds)
+        resp.raise_for_status()
+        body = resp.json()
+        usage = body.get("usage") or {}
+        return LLMResponse(
+            body["choices"][0]["message"]["content"],
+            _token_count(usage.get("prompt_tokens")),
+            _token_count(usage.get("completion_tokens")),
+        )
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        return await asyncio.to_thread(self._post, prompt)
+
+
+def create_backend(name: Optional[str] = None, api_key: Optional[str] = None, model_name: Optional[str] = None):
+    """The configured backend, or None if it lacks credentials or fails to initialize."""
+    name = (name or os.getenv("PYROPE_LLM_BACKEND", "gemini")).lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; expected one of {', '.join(LLM_BACKENDS)}")
+
+    if name == "openai":
+        base_url = os.getenv("PYROPE_LLM_BASE_URL", "http://127.0.0.1:8089/v1")
+        model_name = model_name or os.getenv("PYROPE_LLM_MODEL", "local")
+        api_key = api_key or os.getenv("PYROPE_LLM_API_KEY") or os.getenv("OPENAI_API_KEY")
+        return OpenAICompatibleBackend(base_url, model_name, api_key=api_key)
+
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    # [Review] Prioritize constructor arg, then env var, then default
+    model_name = model_name or os.getenv("GEMINI_MODEL_ID", "gemini-2.5-flash-lite")
+    if not api_key:
+        logger.warning("GEMINI_API_KEY not found. LLMWorker is disabled.")
+        return None
+    try:
+        return GeminiBackend(api_key, model_name)
+    except Exception as e:
+        logger.error(f"Failed to initialize Gemini model: {e}")
+        return None
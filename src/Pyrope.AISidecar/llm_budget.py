@@ -0,0 +1,149 @@
+import calendar
+import math
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from token_bucket import TokenBucket
+
+# Word pieces, numbers and single punctuation marks, roughly as BPE tokenizers split them.
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Local approximation of an LLM tokenizer, for when the provider reports no usage.
+
+    Words cost one token per 6 letters (common words are single tokens), digit runs one per 3
+    digits and every punctuation mark one token, which tracks BPE counts on JSON-heavy prompts
+    far better than words * 1.3.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 6)
+        elif piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+def _month_bounds(now: float):
+    start = datetime.fromtimestamp(now, timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    days = calendar.monthrange(start.year, start.month)[1]
+    return start.timestamp(), start.timestamp() + days * 86400.0
+
+
+class BudgetAllocator:
+    """Paces a monthly token budget and spends it on the most valuable requests first.
+
+    Tokens accrue into a bucket at (remaining budget / remaining time in the calendar month),
+    holding at most burst_days of that pace: underspending rolls forward, but the month can
+    never be spent early. A request is admitted when the bucket can pay its estimated cost and
+    still keep a reserve that shrinks with the request's value per token, ranked against
+    recent requests. The most valuable requests may drain the bucket; low-value ones only get
+    through while it is nearly full.
+
+    admit() reserves the estimated cost, so a burst of admissions cannot all see the same
+    balance; charge() settles each reservation against the tokens actually spent.
+    """
+
+    def __init__(
+        self,
+        monthly_budget: float,
+        burst_days: float = 1.0,
+        reserve_fraction: float = 0.8,
+        window: int = 512,
+        clock: Callable[[], float] = time.time,
+    ):
+        if monthly_budget <= 0 or burst_days <= 0:
+            raise ValueError("monthly_budget and burst_days must be positive")
+        self.monthly_budget = float(monthly_budget)
+        self.burst_days = float(burst_days)
+        self.reserve_fraction = min(1.0, max(0.0, reserve_fraction))
+        self._clock = clock
+        self._densities: "deque[float]" = deque(maxlen=window)
+        self._start_month(clock())
+        self.stats = {"admitted": 0, "throttled": 0, "exhausted": 0}
+
+    def _start_month(self, now: float):
+        self._month_start, self._month_end = _month_bounds(now)
+        self.spent = 0.0
+        self.reserved = 0.0  # admitted, not yet charged
+        rate, capacity = self._pace(now)
+        self._bucket = TokenBucket(capacity, rate, self._clock)
+
+    def _pace(self, now: float):
+        rate = max(self.monthly_budget - self.spent - self.reserved, 0.0) / max(self._month_end - now, 1.0)
+        # Keep the bucket valid when the month's budget is gone; remaining() gates admission then.
+        rate = max(rate, 1e-9)
+        return rate, rate * self.burst_days * 86400.0
+
+    def _refresh(self) -> float:
+        now = self._clock()
+        if now >= self._month_end:
+            self._start_month(now)
+        self._bucket.available()  # accrue at the old pace up to now
+        self._bucket.rate, self._bucket.capacity = self._pace(now)
+        return self._bucket.available()
+
+    def remaining(self) -> float:
+        """Budget left this month, net of reservations for admitted requests."""
+        self._refresh()
+        return max(self.monthly_budget - self.spent - self.reserved, 0.0)
+
+    def admit(self, cost: float, value: float = 1.0) -> bool:
+        """Whether a request of estimated cost tokens and expected value should be sent now.
+
+        An admitted request's cost is reserved until it is settled with charge(tokens, cost).
+        """
+        available = self._refresh()
+        density = max(value, 0.0) / max(cost, 1.0)
+        if self._densities:
+            recent = np.fromiter(self._densities, dtype=np.float64, count=len(self._densities))
+            # Mid-rank, so a stream of equal values sits at 0.5 rather than at the bottom.
+            rank = (np.count_nonzero(recent < density) + 0.5 * np.count_nonzero(recent == density)) / len(recent)
+        else:
+            rank = 1.0
+        self._densities.append(density)
+
+        if self.spent + self.reserved + cost > self.monthly_budget:
+            self.stats["exhausted"] += 1
+            return False
+        if available - cost < self.reserve_fraction * self._bucket.capacity * (1.0 - rank):
+            self.stats["throttled"] += 1
+            return False
+        self._bucket.consume(cost)
+        self.reserved += float(cost)
+        self.stats["admitted"] += 1
+        return True
+
+    def charge(self, tokens: float, reserved: float = 0.0):
+        """Records tokens actually spent (from provider usage when available) and settles the
+        reservation made when the request was admitted; charge(0, reserved) releases one unused."""
+        self._refresh()
+        reserved = min(float(reserved), self.reserved)
+        self._bucket.consume(float(tokens) - reserved)
+        self.reserved -= reserved
+        self.spent += float(tokens)
+
+    def report(self) -> Dict[str, float]:
+        available = self._refresh()
+        now = self._clock()
+        month_fraction = (now - self._month_start) / (self._month_end - self._month_start)
+        return {
+            **{k: float(v) for k, v in self.stats.items()},
+            "spent": self.spent,
+            "reserved": self.reserved,
+            "remaining": max(self.monthly_budget - self.spent - self.reserved, 0.0),
+            "available": available,
+            "pace_tokens_per_hour": self._bucket.rate * 3600.0,
+            # > 1 means ahead of an even spend over the month.
+            "spend_vs_pace": self.spent / (self.monthly_budget * month_fraction) if month_fraction > 0 else 0.0,
+        }
@@ -9,13 +9,16 @@ Refactored to meet "50ms strict timeout" by using an async update pattern.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import re
-import time
 from dataclasses import dataclass
-from typing import Optional, Set
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
 
+import numpy as np
+
+from decision_cache import DecisionCache
 from policy_engine import HeuristicPolicyEngine, PolicyConfig
 
 logger = logging.getLogger(__name__)
@@ -32,6 +35,61 @@ class SystemMetrics:
     gpu_utilization: float = 0.0
 
 
+class PromptCoalescer:
+    """Gathers decision requests for a short window and hands them to submit_batch together.
+
+    The first request of a batch starts a window_ms timer; the batch goes out when the timer
+    fires or max_batch requests are pending, whichever comes first. Must be used from the event
+    loop the batches run on.
+    """
+
+    def __init__(
+        self,
+        submit_batch: Callable[[List[Tuple[str, SystemMetrics]]], Awaitable[None]],
+        window_ms: float = 50.0,
+        max_batch: int = 16,
+    ):
+        self._submit_batch = submit_batch
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._pending: List[Tuple[str, SystemMetrics]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "batches": 0}
+
+    def add(self, key: str, metrics: SystemMetrics):
+        self._pending.append((key, metrics))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_s, self._flush_soon)
+
+    def _take(self) -> List[Tuple[str, SystemMetrics]]:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.stats["batches"] += 1
+        return batch
+
+    def _flush_soon(self):
+        batch = self._take()
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._submit_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        """Submits whatever is pending now and waits for submissions still running."""
+        batch = self._take()
+        if batch:
+            await self._submit_batch(batch)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
 class LLMPolicyEngine:
     """
     LLM-based cache policy engine using Gemini.
@@ -44,14 +102,29 @@ class LLMPolicyEngine:
     - [New] Async non-blocking updates (returns Heuristic/Stale while updating)
     - [New] Input validation and clamping
     - [New] In-flight deduplication
+    - [New] Optional prompt coalescing: cache misses within a short window share one prompt
+    - [New] Bounded LRU decision cache: stale decisions are served while they refresh, and
+      survive restarts when cache_path is set
+    - [New] Optional nearest-neighbor reuse: a fresh decision for nearby metrics answers a cache miss
     """
 
-    PROMPT_TEMPLATE = """You are an autonomous controller for a vector database cache.
+    POLICY_GOALS = """You are an autonomous controller for a vector database cache.
 Your goal is to optimize for the following priorities:
 1. Stability: Keep P99 latency under 50ms.
 2. Efficiency: Maximize cache hit rate to reduce expensive vector search computations.
 3. Resource Management: Prevent CPU saturation (target < 80% utilization).
+"""
+
+    POLICY_TASK = """Task:
+Determine the optimal cache configuration to balance these goals based on the provided metrics.
+If resources are tight, sacrifice some cache efficiency to maintain stability.
+If latency is low and resources are available, try to increase TTL to improve future hit rates.
+If miss rate is high, consider whether increasing TTL or admission selectivity is better.
+"""
 
+    PROMPT_TEMPLATE = (
+        POLICY_GOALS
+        + """
 System Metrics:
 - Current QPS: {qps}
 - Current Cache Miss Rate: {miss_rate}
@@ -59,15 +132,40 @@ System Metrics:
 - CPU Utilization: {cpu_utilization}%
 - GPU Utilization: {gpu_utilization}%
 
-Task:
-Determine the optimal cache configuration to balance these goals based on the provided metrics.
-If resources are tight, sacrifice some cache efficiency to maintain stability.
-If latency is low and resources are available, try to increase TTL to improve future hit rates.
-If miss rate is high, consider whether increasing TTL or admission selectivity is better.
-
+"""
+        + POLICY_TASK
+        + """
 Respond ONLY with a valid JSON object in this exact format:
 {{"ttl_seconds": <int between 30 and 3600>, "admission_threshold": <float 0-1>, "eviction_priority": <int 0-2>, "reasoning": "<short explanation>"}}
 """
+    )
+
+    # One prompt for several caches: the instructions are sent once, the metrics once per cache.
+    BATCH_PROMPT_TEMPLATE = (
+        POLICY_GOALS
+        + """
+You control {count} independent caches. System Metrics per cache:
+{contexts}
+
+"""
+        + POLICY_TASK
+        + """Decide for each cache separately.
+
+Respond ONLY with a valid JSON array holding one object per cache, in this exact format:
+[{{"id": <cache number>, "ttl_seconds": <int between 30 and 3600>, "admission_threshold": <float 0-1>, "eviction_priority": <int 0-2>}}, ...]
+"""
+    )
+
+    CONTEXT_TEMPLATE = (
+        "{id}. QPS: {qps}, Cache Miss Rate: {miss_rate}, P99 Latency: {latency_p99_ms}ms, "
+        "CPU Utilization: {cpu_utilization}%, GPU Utilization: {gpu_utilization}%"
+    )
+
+    # llm_worker.PRIORITY_POLICY: policy refreshes overtake queued advisory work.
+    # (Not imported, to keep this module free of the Gemini SDK.)
+    LLM_PRIORITY = 0
+    # Share of its miss cost a stale decision's refresh is worth even when metrics have not moved.
+    MIN_REFRESH_VALUE = 0.1
 
     def __init__(
         self,
@@ -75,17 +173,44 @@ Respond ONLY with a valid JSON object in this exact format:
         fallback: HeuristicPolicyEngine,
         timeout_seconds: float = 5.0,  # Kept for API timeout logic, not blocking wait
         cache_ttl_seconds: float = 60.0,
+        coalesce_window_ms: float = 0.0,
+        max_batch: int = 16,
+        cache_max_entries: int = 1024,
+        cache_max_stale_seconds: float = 600.0,
+        cache_path: Optional[str] = None,
+        neighbor_radius: float = 0.0,
+        neighbor_k: int = 3,
     ):
         self._llm = llm_worker
         self._fallback = fallback
         self._timeout = timeout_seconds
         self._cache_ttl = cache_ttl_seconds
 
-        # Decision cache: (metrics_key) -> (PolicyConfig, timestamp)
-        self._cache: dict[str, tuple[PolicyConfig, float]] = {}
+        # Decision cache: metrics_key -> PolicyConfig, fresh for cache_ttl_seconds, then served
+        # stale for up to cache_max_stale_seconds while a refresh runs.
+        self._cache = DecisionCache(
+            max_entries=cache_max_entries,
+            ttl_seconds=cache_ttl_seconds,
+            max_stale_seconds=cache_max_stale_seconds,
+            path=cache_path,
+        )
+        restored = self._cache.load()
+        if restored:
+            logger.info(f"Restored {restored} LLM policy decisions from {cache_path}")
 
         # Deduplication set for keys currently being processed by LLM
         self._inflight_keys: Set[str] = set()
+        # Decisions answered by the heuristic because no LLM decision (fresh, stale or nearby) was at hand.
+        self._fallbacks = 0
+
+        # 0 disables neighbor reuse: only an exact cache key match avoids an LLM call.
+        self._neighbor_radius = neighbor_radius
+        self._neighbor_k = max(1, int(neighbor_k))
+
+        # 0 disables coalescing: every cache miss sends its own prompt.
+        self._coalescer = (
+            PromptCoalescer(self._submit_batch, coalesce_window_ms, max_batch) if coalesce_window_ms > 0 else None
+        )
 
     def _build_prompt(self, metrics: SystemMetrics) -> str:
         """Build prompt from system metrics."""
@@ -97,6 +222,21 @@ Respond ONLY with a valid JSON object in this exact format:
             gpu_utilization=metrics.gpu_utilization,
         )
 
+    def _build_batch_prompt(self, metrics_list: List[SystemMetrics]) -> str:
+        """Build one prompt covering several metric contexts, numbered from 1."""
+        contexts = "\n".join(
+            self.CONTEXT_TEMPLATE.format(
+                id=i,
+                qps=m.qps,
+                miss_rate=m.miss_rate,
+                latency_p99_ms=m.latency_p99_ms,
+                cpu_utilization=m.cpu_utilization,
+                gpu_utilization=m.gpu_utilization,
+            )
+            for i, m in enumerate(metrics_list, start=1)
+        )
+        return self.BATCH_PROMPT_TEMPLATE.format(count=len(metrics_list), contexts=contexts)
+
     def _validate_and_clamp(self, config: PolicyConfig) -> PolicyConfig:
         """
         [Review] Validate and clamp policy values to safe ranges.
@@ -124,27 +264,67 @@ Respond ONLY with a valid JSON object in this exact format:
                 logger.warning(f"No JSON found in LLM response: {response[:100]}")
                 return None
 
-            data = json.loads(json_match.group())
-
-            # Validate required fields
-            required = ["ttl_seconds", "admission_threshold", "eviction_priority"]
-            if not all(k in data for k in required):
-                logger.warning(f"Missing required fields in LLM response: {data}")
-                return None
-
-            config = PolicyConfig(
-                admission_threshold=float(data["admission_threshold"]),
-                ttl_seconds=int(data["ttl_seconds"]),
-                eviction_priority=int(data["eviction_priority"]),
-            )
-
-            # [Review] Validate semantics
-            return self._validate_and_clamp(config)
+            return self._config_from_dict(json.loads(json_match.group()))
 
         except (json.JSONDecodeError, ValueError, TypeError) as e:
             logger.warning(f"Failed to parse LLM response: {e}, response: {response[:100]}")
             return None
 
+    def _config_from_dict(self, data) -> Optional[PolicyConfig]:
+        # Validate required fields
+        required = ["ttl_seconds", "admission_threshold", "eviction_priority"]
+        if not isinstance(data, dict) or not all(k in data for k in required):
+            logger.warning(f"Missing required fields in LLM response: {data}")
+            return None
+
+        config = PolicyConfig(
+            admission_threshold=float(data["admission_threshold"]),
+            ttl_seconds=int(data["ttl_seconds"]),
+            eviction_priority=int(data["eviction_priority"]),
+        )
+
+        # [Review] Validate semantics
+        return self._validate_and_clamp(config)
+
+    def _parse_batch_response(self, response: str, count: int) -> List[Optional[PolicyConfig]]:
+        """Parse a JSON array of decisions into one PolicyConfig (or None) per numbered context.
+
+        Entries are matched by their "id"; entries without one fill the remaining slots in order.
+        Invalid or missing entries leave None for that context only.
+        """
+        configs: List[Optional[PolicyConfig]] = [None] * count
+        if not response:
+            return configs
+
+        try:
+            json_match = re.search(r"\[.*\]", response, re.DOTALL)
+            if not json_match:
+                logger.warning(f"No JSON array found in LLM response: {response[:100]}")
+                return configs
+            entries = json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            logger.warning(f"Failed to parse LLM batch response: {e}, response: {response[:100]}")
+            return configs
+        if not isinstance(entries, list):
+            return configs
+
+        unnumbered = []
+        for entry in entries:
+            try:
+                index = int(entry["id"]) - 1 if isinstance(entry, dict) and "id" in entry else None
+                config = self._config_from_dict(entry)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Invalid entry in LLM batch response: {e}, entry: {entry}")
+                continue
+            if index is None:
+                unnumbered.append(config)
+            elif 0 <= index < count and configs[index] is None:
+                configs[index] = config
+        free = (i for i in range(count) if configs[i] is None)
+        for i, config in zip(free, unnumbered):
+            configs[i] = config
+        return configs
+
     def _get_cache_key(self, metrics: SystemMetrics) -> str:
         """Generate cache key from metrics."""
         qps_bucket = int(metrics.qps / 10) * 10
@@ -155,49 +335,107 @@ Respond ONLY with a valid JSON object in this exact format:
         gpu_bucket = int(metrics.gpu_utilization / 10) * 10
         return f"{qps_bucket}:{miss_bucket}:{latency_bucket}:{cpu_bucket}:{gpu_bucket}"
 
-    def _get_cached(self, metrics: SystemMetrics) -> Optional[PolicyConfig]:
-        """Get cached decision if still valid."""
-        key = self._get_cache_key(metrics)
-        if key in self._cache:
-            config, timestamp = self._cache[key]
-            # Use strict TTL for now, but we could return stale data if needed
-            if time.time() - timestamp < self._cache_ttl:
-                return config
-            else:
-                del self._cache[key]
-        return None
+    @staticmethod
+    def _metrics_vector(metrics: SystemMetrics) -> np.ndarray:
+        """Metrics scaled so a distance of 1 is about one cache-key bucket.
+
+        QPS and p99 latency are on a log scale (a 20% change is one unit at any load),
+        miss rate in steps of 0.05, CPU and GPU utilization in steps of 10 points.
+        """
+        return np.array(
+            [
+                np.log1p(max(metrics.qps, 0.0)) / np.log(1.2),
+                metrics.miss_rate / 0.05,
+                np.log1p(max(metrics.latency_p99_ms, 0.0)) / np.log(1.2),
+                metrics.cpu_utilization / 10.0,
+                metrics.gpu_utilization / 10.0,
+            ]
+        )
+
+    def _interpolate(self, neighbors: List[Tuple[PolicyConfig, float]]) -> PolicyConfig:
+        """Inverse-distance weighted blend of neighbor decisions; eviction priority comes from the nearest."""
+        nearest = neighbors[0][0]
+        if len(neighbors) == 1:
+            return nearest
+        weights = 1.0 / (np.array([distance for _, distance in neighbors]) + 1e-6)
+        weights /= weights.sum()
+        ttl = sum(w * config.ttl_seconds for w, (config, _) in zip(weights, neighbors))
+        admission = sum(w * config.admission_threshold for w, (config, _) in zip(weights, neighbors))
+        return self._validate_and_clamp(
+            PolicyConfig(
+                admission_threshold=float(admission),
+                ttl_seconds=int(round(ttl)),
+                eviction_priority=nearest.eviction_priority,
+            )
+        )
+
+    def _request_value(self, key: str, metrics: SystemMetrics) -> float:
+        """Expected benefit of asking the LLM about metrics, used by the worker's budget allocator.
+
+        The base is the cost of misses: misses per second times p99 latency, roughly the backend
+        seconds spent per second on misses. Refreshing a stale decision is worth that in
+        proportion to how far the metrics drifted from the ones it was made for (a key bucket or
+        more counts in full), so volatile tenants are refreshed first and steady ones coast on
+        their last answer when the budget is tight.
+        """
+        miss_cost = max(metrics.qps, 0.0) * metrics.miss_rate * max(metrics.latency_p99_ms, 1.0) / 1000.0
+        previous = self._cache.vector(key)
+        if previous is None:
+            return miss_cost
+        drift = float(np.linalg.norm(self._metrics_vector(metrics) - previous))
+        return miss_cost * min(1.0, max(self.MIN_REFRESH_VALUE, drift))
 
     def _set_cache(self, metrics: SystemMetrics, config: PolicyConfig):
         """Cache decision."""
-        key = self._get_cache_key(metrics)
-        self._cache[key] = (config, time.time())
+        self._cache.put(self._get_cache_key(metrics), config, self._metrics_vector(metrics))
+
+    def cache_stats(self) -> dict:
+        return {**self._cache.stats(), "fallbacks": float(self._fallbacks)}
+
+    def save_cache(self):
+        """Persist decisions changed since the last save (no-op without cache_path)."""
+        self._cache.flush()
 
     async def compute_policy(self, metrics: SystemMetrics) -> PolicyConfig:
         """
         Compute cache policy using LLM.
 
         [Review] Non-blocking implementation:
-        1. Checks cache -> returns if Hit
-        2. Checks inflight -> returns Heuristic if already processing
-        3. If Cache Miss & No Inflight -> Launches Async Job & Returns Heuristic immediately.
+        1. Checks cache -> returns if fresh Hit, else reuses fresh decisions for nearby metrics
+        2. Checks inflight -> returns stale decision or Heuristic if already processing
+        3. If stale/Miss & No Inflight -> Launches Async Job & Returns stale decision or Heuristic immediately.
 
         This satisfies the strict latency requirements of the metrics reporting loop.
         """
+        key = self._get_cache_key(metrics)
+
         # 1. Check cache first
-        cached = self._get_cached(metrics)
-        if cached:
+        cached, fresh = self._cache.lookup(key)
+        if cached and fresh:
             return cached
-
-        key = self._get_cache_key(metrics)
+        if self._neighbor_radius > 0:
+            # Jitter across a bucket boundary should not cost an LLM call.
+            neighbors = self._cache.nearest(self._metrics_vector(metrics), self._neighbor_radius, self._neighbor_k)
+            if neighbors:
+                return self._interpolate(neighbors)
+        # Stale-while-revalidate: an expired LLM decision beats the heuristic until it is refreshed.
+        interim = cached or self._fallback.compute_policy(metrics.miss_rate)
+        if cached is None:
+            self._fallbacks += 1
 
         # 2. Check if already in flight (Deduplication)
         if key in self._inflight_keys:
-            # Already working on it, return heuristic/fallback for now to keep things fast
-            return self._fallback.compute_policy(metrics.miss_rate)
+            # Already working on it, return stale/fallback for now to keep things fast
+            return interim
 
         # 3. Launch async update (Fire and Forget)
         self._inflight_keys.add(key)
 
+        if self._coalescer:
+            # Share one prompt with the other cache misses of the next few milliseconds.
+            self._coalescer.add(key, metrics)
+            return interim
+
         # Capture context for callback
         current_metrics = metrics
 
@@ -218,7 +456,9 @@ Respond ONLY with a valid JSON object in this exact format:
                 self._inflight_keys.discard(key)
 
         prompt = self._build_prompt(metrics)
-        success = await self._llm.submit_task(prompt, callback=on_complete)
+        success = await self._llm.submit_task(
+            prompt, callback=on_complete, priority=self.LLM_PRIORITY, value=self._request_value(key, metrics)
+        )
 
         if success:
             logger.info(f"Triggered async LLM update for key {key}")
@@ -226,5 +466,51 @@ Respond ONLY with a valid JSON object in this exact format:
             self._inflight_keys.discard(key)
             logger.warning(f"Failed to submit LLM task for {key}")
 
-        # Return heuristic immediately so we don't block the Sidecar server
-        return self._fallback.compute_policy(metrics.miss_rate)
+        # Return stale decision or heuristic immediately so we don't block the Sidecar server
+        return interim
+
+    async def _submit_batch(self, batch: List[Tuple[str, SystemMetrics]]):
+        """Send one coalesced prompt for batch and cache each decision under its own key."""
+        keys = [key for key, _ in batch]
+        metrics_list = [metrics for _, metrics in batch]
+
+        def apply(parse, response_text):
+            try:
+                configs = parse(response_text) if response_text else []
+                for metrics, config in zip(metrics_list, configs):
+                    if config:
+                        self._set_cache(metrics, config)
+                parsed = sum(config is not None for config in configs)
+                logger.info(f"LLM batch of {len(batch)} policies updated {parsed}")
+            except Exception as e:
+                logger.error(f"Error in LLM batch callback: {e}")
+            finally:
+                self._inflight_keys.difference_update(keys)
+
+        if len(batch) == 1:
+            # A batch of one uses the single-decision prompt and response format.
+            prompt = self._build_prompt(metrics_list[0])
+
+            async def callback(response_text):
+                apply(lambda text: [self._parse_response(text)], response_text)
+
+        else:
+            prompt = self._build_batch_prompt(metrics_list)
+
+            async def callback(response_text):
+                apply(lambda text: self._parse_batch_response(text, len(batch)), response_text)
+
+        value = sum(self._request_value(key, metrics) for key, metrics in batch)
+        try:
+            success = await self._llm.submit_task(prompt, callback=callback, priority=self.LLM_PRIORITY, value=value)
+        except Exception as e:
+            logger.error(f"Failed to submit LLM batch: {e}")
+            success = False
+        if not success:
+            self._inflight_keys.difference_update(keys)
+            logger.warning(f"Failed to submit LLM batch of {len(batch)}")
+
+    async def flush(self):
+        """Send any coalesced requests now (e.g. before shutdown or in tests)."""
+        if self._coalescer:
+            await self._coalescer.flush()
@@ -0,0 +1,195 @@
+"""
+Offline stand-in for an OpenAI-compatible LLM server.
+
+Serves POST /v1/chat/completions with a configurable latency distribution and error rate,
+answering with canned responses or, by default, with random but well-formed cache policy JSON
+(a JSON array for LLMPolicyEngine's coalesced prompts). Lets the LLM policy path be load
+tested without credentials:
+
+    python llm_standin.py --port 8089 --latency lognormal:200,0.5 --error-rate 0.02
+    PYROPE_LLM_BACKEND=openai PYROPE_LLM_BASE_URL=http://127.0.0.1:8089/v1 python server.py
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+from llm_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_BATCH_COUNT = re.compile(r"You control (\d+) independent caches")
+
+
+class LatencyModel:
+    """Response delays from a spec: "fixed:MS", "uniform:LOW_MS,HIGH_MS" or "lognormal:MEDIAN_MS,SIGMA"."""
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r}; use fixed:MS, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+        self.kind = kind
+        self.values = values
+
+    def sample_seconds(self, rng: np.random.Generator) -> float:
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.values)
+        else:
+            ms = self.values[0] * np.exp(rng.normal(0.0, self.values[1]))
+        return max(0.0, ms) / 1000.0
+
+
+def policy_response(prompt: str, rng: np.random.Generator) -> str:
+    """A plausible answer to an LLMPolicyEngine prompt: one decision, or one per numbered cache."""
+
+    def decision():
+        return {
+            "ttl_seconds": int(rng.choice([60, 120, 300, 600])),
+            "admission_threshold": float(rng.choice([0.05, 0.1, 0.2])),
+            "eviction_priority": int(rng.integers(0, 3)),
+        }
+
+    match = _BATCH_COUNT.search(prompt)
+    if match:
+        return json.dumps([{"id": i, **decision()} for i in range(1, int(match.group(1)) + 1)])
+    return json.dumps({**decision(), "reasoning": "stand-in"})
+
+
+class StandInLLMServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        responses: Optional[List[str]] = None,
+        seed: int = 0,
+    ):
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._responses = itertools.cycle(responses) if responses else None
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    prompt = body["messages"][-1]["content"]
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    self._reply(400, {"error": {"message": f"Bad request: {e}"}})
+                    return
+                status, payload, delay = server._answer(prompt, body.get("model", "stand-in"))
+                time.sleep(delay)
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _answer(self, prompt: str, model: str):
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency.sample_seconds(self._rng)
+            if self._rng.uniform() < self.error_rate:
+                self.stats["errors"] += 1
+                return self.error_status, {"error": {"message": "stand-in injected error"}}, delay
+            content = next(self._responses) if self._responses else policy_response(prompt, self._rng)
+
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        payload = {
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        return 200, payload, delay
+
+    def start(self) -> "StandInLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="llm-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible LLM stand-in for load testing")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on")
+    parser.add_argument("--latency", type=str, default="lognormal:200,0.5", help="Response latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--responses", type=str, default=None, help="JSON file with a list of canned responses")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, "r") as f:
+            responses = json.load(f)
+
+    server = StandInLLMServer(
+        args.host, args.port, args.latency, args.error_rate, args.error_status, responses, args.seed
+    ).start()
+    logger.info(f"LLM stand-in serving {server.url}/chat/completions")
+    try:
+        while True:
+            time.sleep(86400)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,27 @@
 import os
 import asyncio
+import heapq
+import itertools
 import logging
-import google.generativeai as genai
-from collections import deque
+from collections import defaultdict, deque
 import time
-from typing import Optional
+from typing import Dict, List, Optional
+
+from llm_backends import create_backend
+from llm_budget import BudgetAllocator, estimate_tokens
+from token_bucket import TokenBucket
 
 logger = logging.getLogger(__name__)
 
-# Sentinel to signal shutdown
-_SHUTDOWN_SENTINEL = object()
+# Task priorities: lower values are served first.
+PRIORITY_POLICY = 0  # latency-critical policy refreshes
+PRIORITY_ADVISORY = 1  # prefetch / TTL advice
+PRIORITY_BULK = 2  # background analysis
 
 
 class LLMWorker:
     """
-    P6-8 + P6-12: LLM Worker with Gemini integration and budgeting.
+    P6-8 + P6-12: LLM Worker with pluggable backends (llm_backends) and budgeting.
 
     Fixes from Codex review:
     - Queue limit to prevent memory bloat
@@ -27,8 +34,10 @@ class LLMWorker:
     DEFAULT_MAX_REQUESTS_PER_MINUTE = 60
     DEFAULT_MAX_TOKENS_PER_MINUTE = 100000
     DEFAULT_MONTHLY_TOKEN_BUDGET = 10_000_000
-    DEFAULT_MAX_RETRIES = 3
-    DEFAULT_QUEUE_SIZE = 10  # [Review] Queue limit
+    DEFAULT_MAX_DEFER_SECONDS = 60.0
+    DEFAULT_QUEUE_SIZE = 10  # [Review] Queue limit, per priority unless queue_limits says otherwise
+    DEFAULT_CONCURRENCY = 4
+    DEFAULT_OUTPUT_TOKENS = 100  # expected response size until real responses have been seen
 
     def __init__(
         self,
@@ -37,27 +46,42 @@ class LLMWorker:
         max_requests_per_minute=None,
         max_tokens_per_minute=None,
         monthly_token_budget=None,
-        max_retries=None,
+        max_defer_seconds=None,
+        concurrency=None,
+        queue_limits: Optional[Dict[int, int]] = None,
+        backend=None,
+        budget_allocator: Optional[BudgetAllocator] = None,
     ):
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        # [Review] Allow env override or default
-        # [Review] Prioritize constructor arg, then env var, then default
-        self.model_name = model_name or os.getenv("GEMINI_MODEL_ID", "gemini-2.5-flash-lite")
 
-        self.queue: Optional[asyncio.Queue] = None
+        self.queue: Optional[asyncio.PriorityQueue] = None
         self.running = False
-        self._worker_task: Optional[asyncio.Task] = None
+        self._worker_tasks: List[asyncio.Task] = []
         self._loop: Optional[asyncio.AbstractEventLoop] = None
 
+        # Concurrent consumers: each runs one LLM call at a time, so this bounds calls in flight.
+        self.concurrency = concurrency or int(os.getenv("PYROPE_LLM_CONCURRENCY", self.DEFAULT_CONCURRENCY))
+        # Per-priority queue limits, so bulk work cannot crowd out policy refreshes.
+        self.queue_limits = dict(queue_limits or {})
+        self._queued = defaultdict(int)
+        self._sequence = itertools.count()  # FIFO within a priority
+        self._in_flight = 0
+
         # P6-12: Budgeting configuration
         self.max_requests_per_minute = max_requests_per_minute or self.DEFAULT_MAX_REQUESTS_PER_MINUTE
         self.max_tokens_per_minute = max_tokens_per_minute or self.DEFAULT_MAX_TOKENS_PER_MINUTE
-        self.monthly_token_budget = monthly_token_budget or self.DEFAULT_MONTHLY_TOKEN_BUDGET
-        self.max_retries = max_retries or self.DEFAULT_MAX_RETRIES
-
-        # P6-12: Rate limiting state
-        self._request_timestamps = deque(maxlen=1000)
-        self._token_window = deque(maxlen=1000)
+        self.monthly_token_budget = monthly_token_budget or int(
+            os.getenv("PYROPE_LLM_MONTHLY_TOKEN_BUDGET", self.DEFAULT_MONTHLY_TOKEN_BUDGET)
+        )
+        self.max_defer_seconds = max_defer_seconds or self.DEFAULT_MAX_DEFER_SECONDS
+
+        # P6-12: Rate limiting state. A rate-limited task reserves its slot in both buckets and
+        # waits in a timer heap, so consumers keep serving other work instead of sleeping.
+        self._request_bucket = TokenBucket.per_minute(self.max_requests_per_minute)
+        self._token_bucket = TokenBucket.per_minute(self.max_tokens_per_minute)
+        self._deferred: List[tuple] = []  # (ready_at, seq, priority, prompt, callback, budgeted)
+        self._release_handle: Optional[asyncio.TimerHandle] = None
+        # Spreads the monthly budget over the month and admits the most valuable tasks first.
+        self.budget = budget_allocator or BudgetAllocator(self.monthly_token_budget)
 
         # P6-12: Stats and metering
         self.stats = {
@@ -66,89 +90,143 @@ class LLMWorker:
             "requests_failed": 0,
             "requests_rate_limited": 0,
             "requests_budget_exceeded": 0,
-            "requests_dropped_max_retry": 0,
+            "requests_budget_throttled": 0,
+            "requests_dropped_rate_limited": 0,
             "tokens_total": 0,
             "tokens_input": 0,
             "tokens_output": 0,
+            "requests_metered": 0,  # token counts reported by the provider rather than estimated
             "monthly_tokens_used": 0,
             "errors_total": 0,
             "last_request_latency": 0,
             "avg_latency": 0,
+            "requests_rejected_queue_full": 0,
+            "max_in_flight": 0,
         }
         self._latencies = deque(maxlen=100)
-        self._is_disabled = False
+        self._output_tokens = deque(maxlen=100)
 
-        if self.api_key:
-            try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel(self.model_name)
-                logger.info(f"LLMWorker initialized with model {self.model_name}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini model: {e}")
-                self._is_disabled = True
-        else:
-            self.model = None
-            self._is_disabled = True
-            logger.warning("GEMINI_API_KEY not found. LLMWorker is disabled.")
+        # The backend that answers prompts; None (missing credentials, init failure) disables the worker.
+        self.model = backend if backend is not None else create_backend(api_key=api_key, model_name=model_name)
+        self._is_disabled = self.model is None
+        if self.model is not None:
+            logger.info(f"LLMWorker initialized with {type(self.model).__name__} model {self.model.model_name}")
 
     async def start(self):
-        """Starts the background worker loop."""
+        """Starts the background consumers."""
         self._loop = asyncio.get_running_loop()
-        # [Review] Add maxsize to prevent unbounded growth
-        self.queue = asyncio.Queue(maxsize=self.DEFAULT_QUEUE_SIZE)
+        # Bounded by per-priority limits in _enqueue rather than a single maxsize.
+        self.queue = asyncio.PriorityQueue()
         self.running = True
-        self._worker_task = asyncio.create_task(self._process_queue())
-        logger.info("LLMWorker started.")
+        self._worker_tasks = [
+            asyncio.create_task(self._process_queue(), name=f"llm-worker-{i}") for i in range(self.concurrency)
+        ]
+        logger.info(f"LLMWorker started with {self.concurrency} consumers.")
 
     async def stop(self):
-        """Stops the background worker loop cleanly."""
+        """Stops the consumers and answers tasks still queued with None."""
         self.running = False
 
-        if self.queue:
+        for task in self._worker_tasks:
+            task.cancel()
+        for task in self._worker_tasks:
             try:
-                # Use nowait to avoid blocking on full queue during shutdown
-                self.queue.put_nowait((_SHUTDOWN_SENTINEL, None, 0))
-            except asyncio.QueueFull:
-                pass
-
-        if self._worker_task:
-            self._worker_task.cancel()
-            try:
-                await self._worker_task
+                await task
             except asyncio.CancelledError:
                 pass
+        self._worker_tasks = []
+        if self._release_handle:
+            self._release_handle.cancel()
+            self._release_handle = None
+
+        unanswered = [(entry[4], entry[5]) for entry in self._deferred]
+        self._deferred.clear()
+        while self.queue and not self.queue.empty():
+            entry = self.queue.get_nowait()
+            unanswered.append((entry[3], entry[5]))
+            self.queue.task_done()
+        self._queued.clear()
+        for callback, budgeted in unanswered:
+            self.budget.charge(0, budgeted)
+            if callback:
+                await callback(None)
 
         logger.info("LLMWorker stopped.")
 
-    def is_rate_limited(self) -> bool:
-        """P6-12: Check if we're hitting rate limits."""
-        now = time.time()
-        window_start = now - 60
+    def queue_limit(self, priority: int) -> int:
+        return self.queue_limits.get(priority, self.DEFAULT_QUEUE_SIZE)
 
-        while self._request_timestamps and self._request_timestamps[0] < window_start:
-            self._request_timestamps.popleft()
-        while self._token_window and self._token_window[0][0] < window_start:
-            self._token_window.popleft()
+    def _enqueue(self, prompt, callback, priority: int, reserved: bool = False, budgeted: float = 0.0) -> bool:
+        # Reserved tasks were accepted before being deferred, so they skip the limit.
+        # budgeted is the monthly-budget reservation made on admission, settled once the task ends.
+        if not reserved and self._queued[priority] >= self.queue_limit(priority):
+            return False
+        self._queued[priority] += 1
+        self.queue.put_nowait((priority, next(self._sequence), prompt, callback, reserved, budgeted))
+        return True
 
-        if len(self._request_timestamps) >= self.max_requests_per_minute:
-            return True
+    def estimate_cost(self, prompt: str) -> float:
+        """Expected tokens for a prompt: its input plus the recent average response size."""
+        output = (
+            sum(self._output_tokens) / len(self._output_tokens) if self._output_tokens else self.DEFAULT_OUTPUT_TOKENS
+        )
+        return estimate_tokens(prompt) + output
 
-        tokens_in_window = sum(t[1] for t in self._token_window)
-        if tokens_in_window >= self.max_tokens_per_minute:
-            return True
+    def rate_limit_wait(self, tokens: float = 0.0) -> float:
+        """P6-12: Seconds until a request of this many tokens fits both per-minute limits."""
+        return max(self._request_bucket.wait_time(1), self._token_bucket.wait_time(tokens))
 
-        return False
+    def is_rate_limited(self) -> bool:
+        return self.rate_limit_wait() > 0
+
+    def _defer(self, ready_at: float, priority: int, prompt, callback, budgeted: float):
+        entry = (ready_at, next(self._sequence), priority, prompt, callback, budgeted)
+        heapq.heappush(self._deferred, entry)
+        if self._deferred[0] is entry:
+            self._schedule_release()
+
+    def _schedule_release(self):
+        if self._release_handle:
+            self._release_handle.cancel()
+        self._release_handle = None
+        if self._deferred:
+            delay = max(0.0, self._deferred[0][0] - time.monotonic())
+            self._release_handle = asyncio.get_running_loop().call_later(delay, self._release_due)
+
+    def _release_due(self):
+        now = time.monotonic()
+        while self._deferred and self._deferred[0][0] <= now:
+            _, _, priority, prompt, callback, budgeted = heapq.heappop(self._deferred)
+            self._enqueue(prompt, callback, priority, reserved=True, budgeted=budgeted)
+        self._schedule_release()
 
     def is_over_budget(self) -> bool:
-        return self.stats["monthly_tokens_used"] >= self.monthly_token_budget
+        return self.budget.remaining() <= 0
 
     def get_stats(self) -> dict:
-        return dict(self.stats)
-
-    async def submit_task(self, prompt, callback=None, priority=0) -> bool:
-        """Submits a prompt to the queue."""
+        stats = dict(self.stats)
+        stats["budget_spend_vs_pace"] = self.budget.report()["spend_vs_pace"]
+        stats["in_flight"] = self._in_flight
+        stats["deferred"] = len(self._deferred)
+        for priority, depth in self._queued.items():
+            stats[f"queued_p{priority}"] = depth
+        return stats
+
+    async def submit_task(self, prompt, callback=None, priority=PRIORITY_POLICY, value: float = 1.0) -> bool:
+        """Submits a prompt to the queue; lower priority values are served first.
+
+        Returns whether the task was queued. A callback is always invoked exactly once: with the
+        response text, or with None when the task fails or is rejected (including here, before
+        returning False). An exception the callback raises after a completed call is logged, not
+        counted as a failed call.
+
+        value is the caller's expected benefit of an answer (any consistent scale); when spend
+        runs ahead of the monthly pace, tasks with the lowest value per token are turned away.
+        """
         if not self.queue:
             logger.error("LLMWorker: Not started. Call start() first.")
+            if callback:
+                await callback(None)
             return False
         if self._is_disabled:
             logger.warning("LLMWorker is disabled (missing API key or init failure). Rejecting task.")
@@ -163,105 +241,113 @@ class LLMWorker:
                 await callback(None)
             return False
 
-        try:
-            # [Review] Don't block if queue is full, just reject (Fail fast strategy)
-            self.queue.put_nowait((prompt, callback, 0))
-            return True
-        except asyncio.QueueFull:
-            logger.warning("LLMWorker: Queue full. Rejecting task.")
+        cost = self.estimate_cost(prompt)
+        if not self.budget.admit(cost, value):
+            self.stats["requests_budget_throttled"] += 1
+            logger.debug(f"LLMWorker: Task of value {value:.3g} throttled to pace the monthly budget.")
+            if callback:
+                await callback(None)
+            return False
+
+        # [Review] Don't block if queue is full, just reject (Fail fast strategy)
+        if not self._enqueue(prompt, callback, priority, reserved=False, budgeted=cost):
+            self.budget.charge(0, cost)
+            self.stats["requests_rejected_queue_full"] += 1
+            logger.warning(f"LLMWorker: Queue for priority {priority} full. Rejecting task.")
+            if callback:
+                await callback(None)
             return False
+        return True
 
     async def _process_queue(self):
         while self.running:
             try:
+                priority, _, prompt, callback, reserved, budgeted = await self.queue.get()
+                self._queued[priority] -= 1
                 try:
-                    item = await asyncio.wait_for(self.queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
-                    continue
-
-                if item[0] is _SHUTDOWN_SENTINEL:
-                    self.queue.task_done()
-                    break
-
-                prompt, callback, retry_count = item
-
-                if self._is_disabled or not self.model:
-                    self.stats["requests_failed"] += 1
-                    self.queue.task_done()
-                    if callback:
-                        await callback(None)  # Callback right away
-                    continue
-
-                if self.is_rate_limited():
-                    self.stats["requests_rate_limited"] += 1
-                    if retry_count >= self.max_retries:
-                        logger.warning(f"LLMWorker: Max retries ({self.max_retries}) exceeded. Dropping task.")
-                        self.stats["requests_dropped_max_retry"] += 1
-                        if callback:
-                            await callback(None)
-                        self.queue.task_done()
-                        continue
-
-                    logger.warning(f"LLMWorker: Rate limited. Retry {retry_count + 1}/{self.max_retries}")
-                    await asyncio.sleep(1)
-                    try:
-                        self.queue.put_nowait((prompt, callback, retry_count + 1))
-                    except asyncio.QueueFull:
-                        if callback:
-                            await callback(None)
-
-                    self.queue.task_done()
-                    continue
-
-                if self.is_over_budget():
-                    self.stats["requests_budget_exceeded"] += 1
-                    if callback:
-                        await callback(None)
-                    self.queue.task_done()
-                    continue
-
-                start_time = time.time()
-                try:
-                    # Execute LLM call
-                    response = await self.model.generate_content_async(prompt)
-
-                    text = response.text
-                    latency = time.time() - start_time
-
-                    input_tokens = len(prompt.split()) * 1.3
-                    output_tokens = len(text.split()) * 1.3 if text else 0
-                    total_tokens = int(input_tokens + output_tokens)
-
-                    now = time.time()
-                    self._request_timestamps.append(now)
-                    self._token_window.append((now, total_tokens))
-
-                    self.stats["requests_total"] += 1
-                    self.stats["requests_succeeded"] += 1
-                    self.stats["tokens_total"] += total_tokens
-                    self.stats["tokens_input"] += int(input_tokens)
-                    self.stats["tokens_output"] += int(output_tokens)
-                    self.stats["monthly_tokens_used"] += total_tokens
-                    self.stats["last_request_latency"] = latency
-
-                    self._latencies.append(latency)
-                    self.stats["avg_latency"] = sum(self._latencies) / len(self._latencies)
-
-                    if callback:
-                        await callback(text)
-
-                except Exception as e:
-                    logger.error(f"LLMWorker Error: {e}")
-                    self.stats["requests_total"] += 1
-                    self.stats["requests_failed"] += 1
-                    self.stats["errors_total"] += 1
-                    if callback:
-                        await callback(None)
+                    await self._handle(prompt, callback, priority, reserved, budgeted)
                 finally:
                     self.queue.task_done()
-
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"LLMWorker Loop Error: {e}")
                 await asyncio.sleep(1)
+
+    async def _handle(self, prompt, callback, priority: int, reserved: bool, budgeted: float = 0.0):
+        # The monthly budget was checked and reserved on admission; every exit settles it.
+        if self._is_disabled or not self.model:
+            self.budget.charge(0, budgeted)
+            self.stats["requests_failed"] += 1
+            if callback:
+                await callback(None)  # Callback right away
+            return
+
+        input_estimate = estimate_tokens(prompt)
+        if not reserved:
+            wait = self.rate_limit_wait(input_estimate)
+            if wait > self.max_defer_seconds:
+                logger.warning(f"LLMWorker: Rate limited for {wait:.1f}s. Dropping task.")
+                self.budget.charge(0, budgeted)
+                self.stats["requests_dropped_rate_limited"] += 1
+                if callback:
+                    await callback(None)
+                return
+            # Reserve now; the balance goes negative and later tasks queue up behind this one.
+            self._request_bucket.consume(1)
+            self._token_bucket.consume(input_estimate)
+            if wait > 0:
+                self.stats["requests_rate_limited"] += 1
+                logger.info(f"LLMWorker: Rate limited. Deferring task by {wait:.2f}s")
+                self._defer(time.monotonic() + wait, priority, prompt, callback, budgeted)
+                return
+
+        start_time = time.time()
+        self._in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        try:
+            # Execute LLM call
+            response = await self.model.generate(prompt)
+            text = response.text
+            latency = time.time() - start_time
+
+            # Billed usage when the provider reports it, the local estimate otherwise.
+            if response.input_tokens is not None and response.output_tokens is not None:
+                self.stats["requests_metered"] += 1
+                input_tokens, output_tokens = response.input_tokens, response.output_tokens
+            else:
+                input_tokens, output_tokens = input_estimate, estimate_tokens(text)
+            total_tokens = int(input_tokens + output_tokens)
+            # The input estimate was charged up front; settle it and add the output tokens.
+            self._token_bucket.consume(input_tokens - input_estimate + output_tokens)
+            self.budget.charge(total_tokens, budgeted)
+            budgeted = 0.0
+            self.stats["monthly_tokens_used"] = int(self.budget.spent)
+            self._output_tokens.append(output_tokens)
+
+            self.stats["requests_total"] += 1
+            self.stats["requests_succeeded"] += 1
+            self.stats["tokens_total"] += total_tokens
+            self.stats["tokens_input"] += int(input_tokens)
+            self.stats["tokens_output"] += int(output_tokens)
+            self.stats["last_request_latency"] = latency
+
+            self._latencies.append(latency)
+            self.stats["avg_latency"] = sum(self._latencies) / len(self._latencies)
+        except Exception as e:
+            logger.error(f"LLMWorker Error: {e}")
+            self.stats["requests_total"] += 1
+            self.stats["requests_failed"] += 1
+            self.stats["errors_total"] += 1
+            text = None
+        finally:
+            self._in_flight -= 1
+            # Failed or cancelled calls release their reservation.
+            self.budget.charge(0, budgeted)
+
+        # Answered once, outside the call's error handling: a failing callback is not a failed call.
+        if callback:
+            try:
+                await callback(text)
+            except Exception as e:
+                logger.error(f"LLMWorker callback error: {e}")
@@ -4,10 +4,13 @@ import logging
 import os
 import shutil
 import threading
-from collections import deque
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from latency_sketch import BernoulliSPRT, LatencySketch
+from model_registry import ModelRegistry
+from model_runtime import LoadedModel, load_model
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,8 +23,15 @@ class ModelManager:
         canary_model_path="models/canary.onnx",
         canary_p99_degradation_ratio=1.2,
         canary_min_baseline_samples=10,
-        canary_auto_rollback_streak=3,
-        canary_baseline_window=100,
+        canary_baseline_window=1000,
+        canary_reference_quantile=0.9,
+        canary_sprt_p0=0.1,
+        canary_sprt_p1=0.4,
+        canary_sprt_alpha=0.01,
+        canary_sprt_beta=0.1,
+        trainer=None,
+        registry_path=None,
+        promotion_gate=None,
     ):
         self.models_dir = models_dir
         self.staging_dir = staging_dir
@@ -31,69 +41,97 @@ class ModelManager:
         self.canary_version = None
         self.canary_tenants = set()
         self.lock = threading.Lock()
+        self.trainer = trainer
+        # Optional promotion_gate.PromotionGate run before a version becomes active.
+        self.promotion_gate = promotion_gate
+
+        # In-process ONNX Runtime sessions, one per deployed version. Deploy/rollback swap these
+        # references under the lock; callers that already hold a LoadedModel keep using it.
+        self._loaded_models: Dict[str, LoadedModel] = {}
+        self._active_model: Optional[LoadedModel] = None
+        self._canary_model: Optional[LoadedModel] = None
 
         self.canary_p99_degradation_ratio = float(canary_p99_degradation_ratio)
         self.canary_min_baseline_samples = int(canary_min_baseline_samples)
-        self.canary_auto_rollback_streak = int(canary_auto_rollback_streak)
-        self._baseline_p99_samples = deque(maxlen=max(1, int(canary_baseline_window)))
-        self._canary_degradation_streak = 0
+        self.canary_baseline_window = max(1, int(canary_baseline_window))
+        self.canary_reference_quantile = float(canary_reference_quantile)
+        # A canary sample "exceeds" when it is above ratio * the baseline's reference quantile.
+        # Healthy canaries exceed at most ~(1 - quantile) of the time (p0); degraded ones at p1.
+        self._sprt_params = (
+            float(canary_sprt_p0),
+            float(canary_sprt_p1),
+            float(canary_sprt_alpha),
+            float(canary_sprt_beta),
+        )
+        self._baseline_sketch = self._new_sketch()
+        self._previous_baseline_sketch: Optional[LatencySketch] = None
+        self._canary_sketch = self._new_sketch()
+        self._canary_sprt = BernoulliSPRT(*self._sprt_params)
 
         # Ensure directories exist
         os.makedirs(self.models_dir, exist_ok=True)
         os.makedirs(self.staging_dir, exist_ok=True)
 
-        self._scan_models()
+        self.registry = ModelRegistry(registry_path or os.path.join(self.models_dir, "registry.json"))
         self._load_state()
+        if not self.registry.exists:
+            self._import_staged_models()
 
-    def _scan_models(self) -> List[Dict]:
-        """Scans the models directory for trained models."""
-        models = []
-        files = glob.glob(os.path.join(self.staging_dir, "*.onnx"))
+    def _import_staged_models(self):
+        """One-time bootstrap for trees that predate the registry manifest."""
+        files = sorted(glob.glob(os.path.join(self.staging_dir, "*.onnx")), key=os.path.getmtime)
         for f in files:
-            stat = os.stat(f)
-            version = os.path.basename(f).replace(".onnx", "")
-            created_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
+            version = os.path.basename(f)[: -len(".onnx")]
+            created_at = datetime.fromtimestamp(os.path.getmtime(f)).isoformat()
+            self.registry.register(version, f, created_at=created_at)
+        if self.active_version and self.active_version in self.registry:
+            self.registry.record_active(self.active_version)
+        self.registry.save()
+        logger.info(f"Imported {len(files)} staged models into {self.registry.manifest_path}")
 
+    def list_models(self) -> Dict:
+        models = []
+        for record in self.registry.list():
+            version = record["version"]
             status = "trained"
             if self.active_version == version:
                 status = "active"
             elif self.canary_version == version:
                 status = "canary"
-
             models.append(
                 {
                     "version": version,
-                    "created_at": created_at,
+                    "created_at": record["created_at"],
                     "status": status,
-                    "evaluation_score": 0.0,  # TODO: Store evaluations in a sidecar file
+                    "evaluation_score": float(record["evaluation"].get("accuracy", 0.0)),
+                    "parent": record["parent"] or "",
+                    "sha256": record["sha256"],
+                    "size_bytes": int(record["size_bytes"]),
+                    "trainer": record["trainer"] or "",
+                    "inference_p50_ms": float(record["inference_latency"].get("single_row_p50_ms", 0.0)),
                 }
             )
-
-        # Sort by creation time desc
-        models.sort(key=lambda x: x["created_at"], reverse=True)
-        return models
-
-    def list_models(self) -> Dict:
-        models = self._scan_models()
         return {
             "models": models,
             "active_model_version": self.active_version or "none",
             "canary_model_version": self.canary_version or "none",
         }
 
-    def train_model(self, dataset_path: Optional[str] = None) -> str:
+    def train_model(self, dataset_path: Optional[str] = None, trainer: Optional[str] = None) -> str:
         """Triggers training and returns a job ID (version)."""
         version = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = os.path.join(self.staging_dir, f"{version}.onnx")
 
         # Run training in a separate thread to avoid blocking API
         # In a real system, this should be a proper job queue
-        thread = threading.Thread(target=self._run_training, args=(dataset_path, output_path, version))
+        thread = threading.Thread(
+            target=self._run_training, args=(dataset_path, output_path, version, trainer or self.trainer)
+        )
         thread.start()
 
         return version
 
-    def _run_training(self, dataset_path, output_path, version):
+    def _run_training(self, dataset_path, output_path, version, trainer=None):
         logger.info(f"Starting training for version {version}")
         try:
             # Call the training logic
@@ -103,43 +141,163 @@ class ModelManager:
 
             # Create a dummy args object or call a function directly
             log_path = dataset_path if dataset_path else "logs/query_log.jsonl"
+            trainer = trainer or train_model.DEFAULT_TRAINER
 
-            logger.info(f"Training on {log_path} -> {output_path}")
+            logger.info(f"Training {trainer} on {log_path} -> {output_path}")
 
+            parent = self.active_version
             logs = train_model.load_logs(log_path)
             df = train_model.extract_features_and_labels(logs)
-            train_model.train_and_export(df, output_path)
+            result = train_model.train_and_export(df, output_path, trainer=trainer)
+            if result is None:
+                logger.warning(f"Training produced no model for {version}")
+                return
+
+            timestamps = [entry["timestamp"] for entry in logs if "timestamp" in entry]
+            self.registry.register(
+                version,
+                output_path,
+                parent=parent,
+                trainer=result["trainer"],
+                training_data={
+                    "path": log_path,
+                    "n_samples": result["n_samples"],
+                    "start_timestamp": min(timestamps) if timestamps else None,
+                    "end_timestamp": max(timestamps) if timestamps else None,
+                    "fit_seconds": result["fit_seconds"],
+                },
+                evaluation={"accuracy": result["accuracy"]},
+                normalizer=result.get("normalizer"),
+            )
+            model = load_model(version, output_path)
+            if model is not None:
+                self.registry.update(version, inference_latency=model.measure_latency())
 
             logger.info(f"Training completed for {version}")
         except Exception as e:
             logger.error(f"Training failed for {version}: {e}")
 
     def deploy_model(self, version: str, canary: bool = False, tenants: List[str] = None) -> str:
+        # Build the inference session before taking the lock so scoring is never blocked on it.
+        model = None
+        if os.path.exists(self._staged_path(version)):
+            model = self._load_version(version)
+            if model is not None and not canary and self.promotion_gate is not None:
+                self._check_promotion_gate(version)
         with self.lock:
-            return self._deploy_model_locked(version, canary=canary, tenants=tenants)
+            return self._deploy_model_locked(version, model, canary=canary, tenants=tenants)
 
-    def _deploy_model_locked(self, version: str, canary: bool, tenants: Optional[List[str]]) -> str:
-        src_path = os.path.join(self.staging_dir, f"{version}.onnx")
+    def _check_promotion_gate(self, version: str):
+        """Benchmarks a version before it becomes active; raises ValueError when it is refused."""
+        candidate = self._load_version(version)
+        if candidate is None:
+            raise ValueError(f"Model version {version} cannot be loaded; promotion refused")
+        with self.lock:
+            active = self._active_model
+        if active is candidate:
+            return
+
+        report = self.promotion_gate.evaluate(candidate, active)
+        if version not in self.registry:
+            self.registry.register(version, self._staged_path(version))
+        self.registry.update(version, gate=report.to_dict(), inference_latency=report.latency)
+        if not report.passed:
+            raise ValueError(f"Promotion gate refused {version}: {'; '.join(report.violations)}")
+
+    def get_model_record(self, version: str) -> Optional[Dict]:
+        return self.registry.get(version)
+
+    def _staged_path(self, version: str) -> str:
+        return os.path.join(self.staging_dir, f"{version}.onnx")
+
+    def _load_version(self, version: str) -> Optional[LoadedModel]:
+        """The session for a version. Call without the lock: the session is built outside it,
+        and _loaded_models is only read and written under it."""
+        with self.lock:
+            model = self._loaded_models.get(version)
+        if model is None:
+            model = load_model(version, self._staged_path(version))
+            if model is not None:
+                with self.lock:
+                    model = self._loaded_models.setdefault(version, model)
+        return model
+
+    def _prune_loaded_models_locked(self):
+        live = {self.active_version, self.canary_version}
+        for version in [v for v in self._loaded_models if v not in live]:
+            del self._loaded_models[version]
+
+    def _deploy_model_locked(
+        self,
+        version: str,
+        model: Optional[LoadedModel],
+        canary: bool,
+        tenants: Optional[List[str]],
+        rollback: bool = False,
+    ) -> str:
+        """Points a slot at version; model is its session, loaded by the caller outside the lock."""
+        src_path = self._staged_path(version)
         if not os.path.exists(src_path):
             raise ValueError(f"Model version {version} not found")
-
+        if model is None:
+            # Leave the slot alone rather than silently dropping scoring to the heuristic.
+            raise ValueError(f"Model version {version} cannot be loaded; deploy refused")
+        if version not in self.registry:
+            # Dropped into staging by hand; lineage and metrics are unknown.
+            self.registry.register(version, src_path)
+
+        # Another deploy may have pruned the session since it was loaded.
+        self._loaded_models[version] = model
         if canary:
-            shutil.copy2(src_path, self.canary_model_path)
+            self._point_slot(self.canary_model_path, src_path)
             self.canary_version = version
             self.canary_tenants = set(tenants) if tenants else set()
-            self._canary_degradation_streak = 0
+            self._canary_model = model
+            self._canary_sketch = self._new_sketch()
+            self._canary_sprt.reset()
             logger.info(f"Deployed {version} as CANARY for tenants: {self.canary_tenants}")
         else:
-            shutil.copy2(src_path, self.active_model_path)
+            self._point_slot(self.active_model_path, src_path)
             self.active_version = version
+            self._active_model = model
+            if rollback:
+                self.registry.pop_active()
+            else:
+                self.registry.record_active(version)
             # If promoting canary to active, maybe clear canary?
             if self.canary_version == version:
                 self._rollback_canary_locked()
             logger.info(f"Deployed {version} as ACTIVE")
 
+        self._prune_loaded_models_locked()
         self._save_state()
         return "OK"
 
+    @staticmethod
+    def _point_slot(slot_path: str, src_path: str):
+        """Atomically points active.onnx/canary.onnx at an immutable staged artifact.
+
+        The new symlink is created beside the slot and rename()d over it, so a reader opening the
+        slot sees either the old or the new model, never a partially written file, and deploys
+        cost the same regardless of model size.
+        """
+        tmp_path = f"{slot_path}.tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.symlink(os.path.relpath(src_path, os.path.dirname(os.path.abspath(slot_path))), tmp_path)
+        except (OSError, NotImplementedError):
+            # No symlink support (e.g. unprivileged Windows): fall back to an atomic full copy.
+            shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, slot_path)
+
+    def get_model(self, tenant_id: str) -> Optional[LoadedModel]:
+        """Returns the loaded model that should score this tenant's requests, if any."""
+        with self.lock:
+            if self._canary_model is not None and (not self.canary_tenants or tenant_id in self.canary_tenants):
+                return self._canary_model
+            return self._active_model
+
     def is_canary_tenant(self, tenant_id: str) -> bool:
         with self.lock:
             if not self.canary_version:
@@ -155,66 +313,83 @@ class ModelManager:
         with self.lock:
             # Keep baseline from non-canary traffic (or all traffic when no canary is active).
             if not self.canary_version or (self.canary_tenants and tenant_id not in self.canary_tenants):
-                self._baseline_p99_samples.append(float(latency_p99_ms))
+                self._record_baseline_locked(latency_p99_ms)
                 return False
 
-            if len(self._baseline_p99_samples) < self.canary_min_baseline_samples:
+            self._canary_sketch.update(latency_p99_ms)
+            reference = self._baseline_reference_locked()
+            if reference is None:
                 return False
 
-            baseline = sum(self._baseline_p99_samples) / len(self._baseline_p99_samples)
-            threshold = baseline * self.canary_p99_degradation_ratio
-
-            if latency_p99_ms > threshold:
-                self._canary_degradation_streak += 1
-            else:
-                self._canary_degradation_streak = 0
-
-            if self._canary_degradation_streak >= self.canary_auto_rollback_streak:
+            threshold = reference.quantile(self.canary_reference_quantile) * self.canary_p99_degradation_ratio
+            if self._canary_sprt.update(latency_p99_ms > threshold):
                 logger.warning(
-                    "Canary latency degraded (latency_p99_ms=%.3f baseline=%.3f threshold=%.3f). Rolling back canary %s",
-                    latency_p99_ms,
-                    baseline,
+                    "Canary latency degraded (SPRT llr=%.2f over %d samples, threshold=%.3f, canary p50=%.3f). "
+                    "Rolling back canary %s",
+                    self._canary_sprt.llr,
+                    self._canary_sprt.samples,
                     threshold,
+                    self._canary_sketch.quantile(0.5),
                     self.canary_version,
                 )
                 self._rollback_canary_locked()
-                self._canary_degradation_streak = 0
+                self._canary_sprt.reset()
                 return True
 
             return False
 
-    def rollback_model(self, canary_only: bool = False) -> str:
+    def _new_sketch(self) -> LatencySketch:
+        return LatencySketch(sorted({0.5, self.canary_reference_quantile, 0.99}))
+
+    def _record_baseline_locked(self, latency_p99_ms: float):
+        # Tumbling windows: the sketch restarts every canary_baseline_window samples so the
+        # baseline follows load shifts; the last complete window covers the restart.
+        if self._baseline_sketch.count >= self.canary_baseline_window:
+            self._previous_baseline_sketch = self._baseline_sketch
+            self._baseline_sketch = self._new_sketch()
+        self._baseline_sketch.update(latency_p99_ms)
+
+    def _baseline_reference_locked(self) -> Optional[LatencySketch]:
+        if self._baseline_sketch.count >= self.canary_min_baseline_samples:
+            return self._baseline_sketch
+        return self._previous_baseline_sketch
+
+    def latency_report(self) -> Dict[str, float]:
+        """Flattened baseline/canary latency sketches and the canary SPRT state."""
         with self.lock:
-            if canary_only:
+            report = {f"baseline_{k}": v for k, v in self._baseline_sketch.to_dict().items()}
+            report.update({f"canary_{k}": v for k, v in self._canary_sketch.to_dict().items()})
+            report["canary_sprt_llr"] = self._canary_sprt.llr
+            report["canary_sprt_samples"] = float(self._canary_sprt.samples)
+            return report
+
+    def rollback_model(self, canary_only: bool = False) -> str:
+        if canary_only:
+            with self.lock:
                 return self._rollback_canary_locked()
 
-            # Rollback active model... to what?
-            # Ideally we track history. For now, let's just say we can't easily rollback active without a version
-            # Or we scan for the previous version.
-            models = self._scan_models()
-            if not models:
-                return "No models found"
-
-            # Find current active index
-            current_idx = -1
-            for i, m in enumerate(models):
-                if m["version"] == self.active_version:
-                    current_idx = i
-                    break
-
-            if current_idx != -1 and current_idx + 1 < len(models):
-                prev_version = models[current_idx + 1]["version"]
+        while True:
+            with self.lock:
+                prev_version = self.registry.previous_active()
+            if prev_version is None:
+                return "No previous version found to rollback to"
+            model = self._load_version(prev_version) if os.path.exists(self._staged_path(prev_version)) else None
+
+            with self.lock:
+                if self.registry.previous_active() != prev_version:
+                    continue  # a deploy or rollback moved the history while the session loaded
                 logger.info(f"Rolling back active from {self.active_version} to {prev_version}")
-                self._deploy_model_locked(prev_version, canary=False, tenants=None)
+                self._deploy_model_locked(prev_version, model, canary=False, tenants=None, rollback=True)
                 return f"Rolled back to {prev_version}"
-            return "No previous version found to rollback to"
 
     def _rollback_canary_locked(self) -> str:
         if self.canary_version:
             logger.info(f"Rolling back canary {self.canary_version}")
             self.canary_version = None
             self.canary_tenants = set()
-            if os.path.exists(self.canary_model_path):
+            self._canary_model = None
+            self._prune_loaded_models_locked()
+            if os.path.lexists(self.canary_model_path):
                 os.remove(self.canary_model_path)
             self._save_state()
             return "OK"
@@ -226,8 +401,10 @@ class ModelManager:
             "canary_version": self.canary_version,
             "canary_tenants": list(self.canary_tenants),
         }
-        with open(os.path.join(self.models_dir, "state.json"), "w") as f:
+        state_path = os.path.join(self.models_dir, "state.json")
+        with open(f"{state_path}.tmp", "w") as f:
             json.dump(state, f)
+        os.replace(f"{state_path}.tmp", state_path)
 
     def _load_state(self):
         state_path = os.path.join(self.models_dir, "state.json")
@@ -237,3 +414,7 @@ class ModelManager:
                 self.active_version = state.get("active_version")
                 self.canary_version = state.get("canary_version")
                 self.canary_tenants = set(state.get("canary_tenants", []))
+        if self.active_version and os.path.exists(self._staged_path(self.active_version)):
+            self._active_model = self._load_version(self.active_version)
+        if self.canary_version and os.path.exists(self._staged_path(self.canary_version)):
+            self._canary_model = self._load_version(self.canary_version)
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """JSON manifest of trained model versions and the active deployment history.
+
+    The manifest is the source of truth for listing and rollback, so neither depends on staging
+    directory scans or file mtimes. Every mutation rewrites the manifest to a temp file and
+    os.replace()s it over the old one, so a crash never leaves a half-written manifest behind.
+
+    Layout:
+        {"manifest_version": 1,
+         "models": {version: record},      # insertion-ordered, oldest first
+         "active_history": [version, ...]} # active deploys, most recent last
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._active_history: List[str] = []
+        self.exists = os.path.exists(manifest_path)
+        if self.exists:
+            self._load()
+
+    def _load(self):
+        with open(self.manifest_path, "r") as f:
+            manifest = json.load(f)
+        self._models = dict(manifest.get("models", {}))
+        self._active_history = list(manifest.get("active_history", []))
+
+    def _save_locked(self):
+        manifest = {
+            "manifest_version": MANIFEST_VERSION,
+            "models": self._models,
+            "active_history": self._active_history,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self.exists = True
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def register(
+        self,
+        version: str,
+        path: str,
+        parent: Optional[str] = None,
+        created_at: Optional[str] = None,
+        **fields: Any,
+    ) -> Dict[str, Any]:
+        """Records a model artifact. Extra fields (trainer, training_data, evaluation, ...) are stored as-is."""
+        record = {
+            "version": version,
+            "parent": parent,
+            "created_at": created_at or datetime.now().isoformat(),
+            "path": path,
+            "sha256": file_sha256(path),
+            "size_bytes": os.path.getsize(path),
+            "trainer": None,
+            "training_data": None,
+            "evaluation": {},
+            "inference_latency": {},
+        }
+        record.update(fields)
+        with self._lock:
+            self._models.pop(version, None)
+            self._models[version] = record
+            self._save_locked()
+        return dict(record)
+
+    def update(self, version: str, **fields: Any) -> Dict[str, Any]:
+        """Merges fields into an existing record; dict-valued fields are merged key by key."""
+        with self._lock:
+            record = self._models.get(version)
+            if record is None:
+                raise KeyError(version)
+            for key, value in fields.items():
+                if isinstance(value, dict) and isinstance(record.get(key), dict):
+                    record[key] = {**record[key], **value}
+                else:
+                    record[key] = value
+            self._save_locked()
+            return dict(record)
+
+    def get(self, version: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._models.get(version)
+            return dict(record) if record is not None else None
+
+    def __contains__(self, version: str) -> bool:
+        with self._lock:
+            return version in self._models
+
+    def list(self) -> List[Dict[str, Any]]:
+        """All records, newest registration first."""
+        with self._lock:
+            return [dict(r) for r in reversed(self._models.values())]
+
+    def record_active(self, version: str):
+        with self._lock:
+            if self._active_history and self._active_history[-1] == version:
+                return
+            self._active_history.append(version)
+            self._save_locked()
+
+    def pop_active(self) -> Optional[str]:
+        """Drops the current active version from the history and returns the one it replaced."""
+        with self._lock:
+            if len(self._active_history) < 2:
+                return None
+            self._active_history.pop()
+            self._save_locked()
+            return self._active_history[-1]
+
+    def previous_active(self) -> Optional[str]:
+        with self._lock:
+            return self._active_history[-2] if len(self._active_history) >= 2 else None
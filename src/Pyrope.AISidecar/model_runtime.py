@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedModel:
+    """An ONNX Runtime session bound to one immutable model version.
+
+    Instances are never mutated after construction, so a request that grabbed a reference keeps
+    scoring against the same session even if a deploy or rollback swaps in another version.
+    InferenceSession.run is safe to call concurrently from the gRPC worker threads.
+    """
+
+    def __init__(self, version: str, path: str, intra_op_num_threads: int = 1):
+        self.version = version
+        # Resolve deploy symlinks so the session is tied to the immutable staged artifact.
+        self.path = os.path.realpath(path)
+
+        options = ort.SessionOptions()
+        # Policy rows are tiny; extra intra-op threads only add wake-up latency.
+        options.intra_op_num_threads = intra_op_num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.n_features = model_input.shape[1] if len(model_input.shape) > 1 else None
+        # First output is the predicted label for skl2onnx classifiers.
+        self.label_output = self.session.get_outputs()[0].name
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Returns one integer action per feature row."""
+        batch = np.ascontiguousarray(features, dtype=np.float32)
+        if batch.ndim == 1:
+            batch = batch.reshape(1, -1)
+        labels = self.session.run([self.label_output], {self.input_name: batch})[0]
+        return np.asarray(labels, dtype=np.int64).reshape(-1)
+
+    def measure_latency(self, iterations: int = 200, batch_size: int = 64) -> Dict[str, float]:
+        """predict() latency for one row and for a batch_size-row batch of zeros, in milliseconds."""
+        width = self.n_features or 1
+        result = {"batch_size": float(batch_size)}
+        for name, rows in (("single_row", 1), ("batch", batch_size)):
+            batch = np.zeros((rows, width), dtype=np.float32)
+            self.predict(batch)  # warm-up: first run allocates the arena
+            timings = np.empty(iterations, dtype=np.float64)
+            for i in range(iterations):
+                start = time.perf_counter()
+                self.predict(batch)
+                timings[i] = time.perf_counter() - start
+            timings *= 1000.0
+            result[f"{name}_p50_ms"] = float(np.percentile(timings, 50))
+            result[f"{name}_p99_ms"] = float(np.percentile(timings, 99))
+        return result
+
+    def __repr__(self) -> str:
+        return f"LoadedModel(version={self.version!r}, path={self.path!r})"
+
+
+def load_model(version: str, path: str) -> Optional[LoadedModel]:
+    """Loads a model, returning None (and logging) when the artifact is not a valid ONNX model."""
+    try:
+        return LoadedModel(version, path)
+    except Exception as e:
+        logger.error(f"Failed to load model {version} from {path}: {e}")
+        return None
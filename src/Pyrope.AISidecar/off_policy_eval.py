@@ -0,0 +1,263 @@
+import argparse
+import logging
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from linear_bandit import context_vector
+from policy_engine import HeuristicPolicyEngine
+from policy_grid import BinaryOverrideArms, PolicyGrid, policy_arms_from_spec
+from reward_attribution import attributed_reward
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# A target policy maps (features, tenant_ids) to an (n, n_arms) matrix of action probabilities.
+# Bandit engines expose one as engine.action_probabilities.
+Policy = Callable[[np.ndarray, Optional[Sequence[str]]], np.ndarray]
+
+
+class LoggedFeedback(NamedTuple):
+    features: np.ndarray  # (n, 4) raw qps, miss_rate, latency_p99_ms, cpu_utilization
+    actions: np.ndarray
+    propensities: np.ndarray
+    rewards: np.ndarray
+    tenant_ids: List[str]
+    n_arms: int
+
+
+def logged_feedback(
+    logs: List[Dict[str, Any]],
+    horizon: int = 1,
+    miss_weight: float = 1.0,
+    latency_weight: float = 0.0,
+    cost_weight: float = 0.0,
+) -> LoggedFeedback:
+    """Bandit decisions from decision-log entries, rewarded the way RewardAttributor rewards them online.
+
+    A decision's reward compares its report with the same tenant's report horizon entries later.
+    Entries without a logged propensity (written before propensities were logged), and the last
+    horizon decisions of each tenant, are left out.
+    """
+    rows = []
+    for entry in logs:
+        decision = entry.get("decision", {})
+        metrics = entry.get("system_metrics", {})
+        rows.append(
+            {
+                "tenant_id": entry.get("tenant_id", "system"),
+                "timestamp": float(entry.get("timestamp", 0.0)),
+                "qps": float(metrics.get("qps", 0.0)),
+                "miss_rate": float(metrics.get("miss_rate", 0.0)),
+                "latency_p99_ms": float(metrics.get("latency_p99_ms", 0.0)),
+                "cpu_utilization": float(metrics.get("cpu_utilization", 0.0)),
+                "action": int(decision.get("bandit_action", 0)),
+                "propensity": float(decision.get("bandit_propensity", np.nan)),
+                "n_arms": int(decision.get("bandit_arms", 2)),
+            }
+        )
+    columns = ["miss_rate", "latency_p99_ms", "cpu_utilization"]
+    df = pd.DataFrame(rows, columns=["tenant_id", "timestamp", "qps"] + columns + ["action", "propensity", "n_arms"])
+    df = df.sort_values(["tenant_id", "timestamp"], kind="stable")
+    after = df.groupby("tenant_id")[columns].shift(-horizon)
+    keep = after.notna().all(axis=1).to_numpy() & (df["propensity"] > 0).to_numpy()
+    df, after = df[keep], after[keep]
+
+    rewards = attributed_reward(
+        tuple(df[c].to_numpy() for c in columns),
+        tuple(after[c].to_numpy() for c in columns),
+        miss_weight,
+        latency_weight,
+        cost_weight,
+    )
+    return LoggedFeedback(
+        features=df[["qps"] + columns].to_numpy(dtype=np.float64),
+        actions=df["action"].to_numpy(dtype=np.int64),
+        propensities=df["propensity"].to_numpy(dtype=np.float64),
+        rewards=np.asarray(rewards, dtype=np.float64).reshape(-1),
+        tenant_ids=df["tenant_id"].tolist(),
+        n_arms=int(max(df["n_arms"].max(), df["action"].max() + 1)) if len(df) else 2,
+    )
+
+
+def constant_policy(arm: int, n_arms: int) -> Policy:
+    """Always picks the same arm."""
+
+    def policy(features, tenant_ids=None):
+        return np.tile(np.eye(n_arms)[arm], (len(np.atleast_2d(features)), 1))
+
+    return policy
+
+
+def model_arms(arms, n_labels: int = 2) -> np.ndarray:
+    """The arm that reproduces each policy-model label's PolicyConfig, indexed by label.
+
+    Model labels name HeuristicPolicyEngine policies (0 = default, 1 = aggressive), so each label
+    needs a PolicyGrid policy equal to its own. The binary override arms have none: arm 0 serves
+    whatever base policy was in force and arm 1 derives its TTL and admission from that base, so
+    neither serves a fixed PolicyConfig. Raises ValueError when a label has no such arm.
+    """
+    if isinstance(arms, BinaryOverrideArms):
+        raise ValueError("Override arms are relative to the served base policy; model labels need a policy grid")
+    if not isinstance(arms, PolicyGrid):
+        raise ValueError(f"Cannot map policy model labels onto {type(arms).__name__} arms")
+    heuristic = HeuristicPolicyEngine()
+    mapping = []
+    for label in range(n_labels):
+        target = heuristic.policy_for_action(label)
+        if target not in arms.policies:
+            raise ValueError(f"No policy grid arm reproduces model label {label} ({target}); cannot score the model")
+        mapping.append(arms.policies.index(target) + (1 if arms.keep_base_arm else 0))
+    return np.array(mapping, dtype=np.int64)
+
+
+def model_policy(model, arms) -> Policy:
+    """Deterministic policy from a policy model (e.g. model_runtime.LoadedModel), over the bandit's arms.
+
+    Each prediction is mapped to the arm serving the same PolicyConfig (see model_arms).
+    """
+    mapping = model_arms(arms)
+    identity = np.eye(arms.n_arms)
+
+    def policy(features, tenant_ids=None):
+        labels = np.asarray(model.predict(np.atleast_2d(features).astype(np.float32)), dtype=np.int64).reshape(-1)
+        return identity[mapping[labels]]
+
+    return policy
+
+
+def fit_reward_model(feedback: LoggedFeedback, ridge: float = 1.0, folds: int = 2, seed: int = 0) -> np.ndarray:
+    """Cross-fitted ridge estimates of every arm's reward for every logged context, shape (n, n_arms).
+
+    One linear model per arm over the bandit's context vector. Each sample is predicted by
+    models fit on the other folds, which keeps the doubly robust estimate free of overfitting bias.
+    """
+    contexts = context_vector(feedback.features)
+    n, d = contexts.shape
+    fold_of = np.random.default_rng(seed).permutation(n) % folds if n >= 2 * folds else np.zeros(n, dtype=int)
+    estimates = np.zeros((n, feedback.n_arms))
+    for fold in np.unique(fold_of):
+        test = fold_of == fold
+        train = ~test if (~test).any() else test
+        for arm in range(feedback.n_arms):
+            mask = train & (feedback.actions == arm)
+            X = contexts[mask]
+            theta = np.linalg.solve(X.T @ X + ridge * np.eye(d), X.T @ feedback.rewards[mask])
+            estimates[test, arm] = contexts[test] @ theta
+    return estimates
+
+
+def evaluate_policy(
+    feedback: LoggedFeedback,
+    policy: Policy,
+    max_weight: Optional[float] = None,
+    reward_estimates: Optional[np.ndarray] = None,
+) -> Dict[str, float]:
+    """Estimates the average reward policy would have earned on the logged decisions.
+
+    - ips: mean of w * r, with importance weight w = pi(a|x) / propensity
+    - snips: sum(w * r) / sum(w); slightly biased, much lower variance
+    - dr: mean of sum_a pi(a|x) q(x, a) + w * (r - q(x, a_logged)), with q from fit_reward_model;
+      unbiased if either the propensities or q are right
+
+    max_weight clips importance weights (trading bias for variance). ess is the effective sample
+    size (sum w)^2 / sum w^2; a small ess means the candidate rarely agrees with the logs.
+    """
+    n = len(feedback.actions)
+    if n == 0:
+        raise ValueError("No logged bandit decisions with propensities to evaluate against")
+    index = np.arange(n)
+    pi = np.asarray(policy(feedback.features, feedback.tenant_ids), dtype=np.float64)
+    weights = pi[index, feedback.actions] / feedback.propensities
+    if max_weight is not None:
+        weights = np.minimum(weights, max_weight)
+    rewards = feedback.rewards
+
+    q = fit_reward_model(feedback) if reward_estimates is None else reward_estimates
+    ips_terms = weights * rewards
+    dr_terms = (pi * q).sum(axis=1) + weights * (rewards - q[index, feedback.actions])
+    weight_sum = weights.sum()
+    return {
+        "n": float(n),
+        "logged_value": float(rewards.mean()),
+        "ips": float(ips_terms.mean()),
+        "ips_se": float(ips_terms.std(ddof=1) / np.sqrt(n)) if n > 1 else 0.0,
+        "snips": float(ips_terms.sum() / weight_sum) if weight_sum > 0 else 0.0,
+        "dr": float(dr_terms.mean()),
+        "dr_se": float(dr_terms.std(ddof=1) / np.sqrt(n)) if n > 1 else 0.0,
+        "ess": float(weight_sum**2 / (weights**2).sum()) if weight_sum > 0 else 0.0,
+    }
+
+
+def evaluate_policies(
+    feedback: LoggedFeedback, policies: Dict[str, Policy], max_weight: Optional[float] = None
+) -> Dict[str, Dict[str, float]]:
+    """Scores several candidates against the same logs, sharing one reward model."""
+    q = fit_reward_model(feedback)
+    return {name: evaluate_policy(feedback, policy, max_weight, q) for name, policy in policies.items()}
+
+
+def print_report(results: Dict[str, Dict[str, float]]):
+    print("\n" + "=" * 78)
+    print(f"{'policy':<24}{'ips':>9}{'snips':>9}{'dr':>9}{'dr_se':>9}{'ess':>9}{'logged':>9}")
+    print("-" * 78)
+    for name, r in results.items():
+        print(
+            f"{name:<24}{r['ips']:>9.4f}{r['snips']:>9.4f}{r['dr']:>9.4f}{r['dr_se']:>9.4f}"
+            f"{r['ess']:>9.1f}{r['logged_value']:>9.4f}"
+        )
+    print("=" * 78 + "\n")
+
+
+def main():
+    from bandit_engine import BANDIT_ENGINES, create_bandit_engine
+    from model_runtime import load_model
+    from train_model import load_logs
+
+    parser = argparse.ArgumentParser(description="Off-policy evaluation of bandit and ONNX policies on decision logs")
+    parser.add_argument("--log-path", type=str, default="logs/query_log.jsonl", help="Path to query log JSONL")
+    parser.add_argument("--horizon", type=int, default=1, help="Reports between a decision and its reward")
+    parser.add_argument("--latency-weight", type=float, default=0.0, help="Weight of the relative p99 drop")
+    parser.add_argument("--cost-weight", type=float, default=0.0, help="Weight of the relative CPU drop")
+    parser.add_argument("--max-weight", type=float, default=None, help="Clip importance weights at this value")
+    parser.add_argument("--bandit", type=str, choices=BANDIT_ENGINES, help="Also score a saved bandit engine")
+    parser.add_argument("--bandit-state", type=str, default=None, help="State file of the --bandit engine")
+    parser.add_argument("--onnx", type=str, action="append", default=[], help="ONNX policy model(s) to score")
+    parser.add_argument(
+        "--policy-grid",
+        type=str,
+        default=os.getenv("PYROPE_POLICY_GRID", ""),
+        help="Bandit arm spec the logs were made with (default: PYROPE_POLICY_GRID, else the override pair, "
+        "which cannot score --onnx models)",
+    )
+    args = parser.parse_args()
+
+    feedback = logged_feedback(
+        load_logs(args.log_path), args.horizon, latency_weight=args.latency_weight, cost_weight=args.cost_weight
+    )
+    logger.info(f"{len(feedback.actions)} logged decisions over {feedback.n_arms} arms")
+
+    policies = {f"always arm {arm}": constant_policy(arm, feedback.n_arms) for arm in range(feedback.n_arms)}
+    if args.bandit:
+        kwargs = {"model_path": args.bandit_state} if args.bandit_state else {}
+        engine = create_bandit_engine(args.bandit, n_arms=feedback.n_arms, **kwargs)
+        policies[f"bandit:{args.bandit}"] = engine.action_probabilities
+    arms = policy_arms_from_spec(args.policy_grid)
+    if arms.n_arms != feedback.n_arms:
+        logger.warning(f"Logs cover {feedback.n_arms} arms but the arm spec defines {arms.n_arms}")
+    for path in args.onnx:
+        model = load_model(path, path)
+        if model is None:
+            continue
+        try:
+            policies[f"onnx:{os.path.basename(path)}"] = model_policy(model, arms)
+        except ValueError as e:
+            logger.warning(f"Skipping {path}: {e}")
+
+    print_report(evaluate_policies(feedback, policies, args.max_weight))
+
+
+if __name__ == "__main__":
+    main()
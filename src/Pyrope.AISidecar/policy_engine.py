@@ -23,3 +23,7 @@ class HeuristicPolicyEngine:
         if miss_rate > 0.5:
             return self._aggressive_policy
         return self._default_policy
+
+    def policy_for_action(self, action: int) -> PolicyConfig:
+        """Maps a policy model's label (0 = default, 1 = aggressive) to a policy."""
+        return self._aggressive_policy if int(action) == 1 else self._default_policy
@@ -0,0 +1,117 @@
+import dataclasses
+from typing import Optional, Sequence
+
+import numpy as np
+
+from cache_simulator import policy_grid
+from policy_engine import PolicyConfig
+
+
+class BinaryOverrideArms:
+    """The original two bandit arms: 0 keeps the base policy, 1 halves its TTL and lowers admission by 0.1."""
+
+    n_arms = 2
+
+    def policy_for_action(self, action: int, base: PolicyConfig) -> PolicyConfig:
+        if int(action) != 1:
+            return base
+        # PolicyConfig is frozen; derive the overridden copy instead of mutating the shared default.
+        return dataclasses.replace(
+            base,
+            ttl_seconds=max(10, base.ttl_seconds // 2),
+            admission_threshold=max(0.0, base.admission_threshold - 0.1),
+        )
+
+    def describe(self, action: int) -> str:
+        return "aggressive" if int(action) == 1 else "base"
+
+
+class PolicyGrid:
+    """Bandit arms over a grid of absolute (ttl_seconds, admission_threshold, eviction_priority) policies.
+
+    With keep_base_arm, arm 0 passes the base policy (model, LLM or heuristic) through unchanged
+    and arm i > 0 is grid policy i - 1, so the bandit can still learn to defer to the base.
+    """
+
+    def __init__(self, policies: Sequence[PolicyConfig], keep_base_arm: bool = True):
+        if not policies:
+            raise ValueError("a policy grid needs at least one policy")
+        self.policies = tuple(policies)
+        self.keep_base_arm = keep_base_arm
+        self._offset = 1 if keep_base_arm else 0
+
+    @classmethod
+    def from_levels(
+        cls,
+        ttl_seconds: Sequence[int],
+        admission_thresholds: Sequence[float],
+        eviction_priorities: Sequence[int] = (0,),
+        keep_base_arm: bool = True,
+    ) -> "PolicyGrid":
+        """The cartesian product of the given levels (the same grid cache_simulator sweeps)."""
+        return cls(policy_grid(ttl_seconds, admission_thresholds, eviction_priorities), keep_base_arm=keep_base_arm)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "PolicyGrid":
+        """Parses "ttl=30,60,300;admission=0.05,0.1;eviction=0,1" (eviction optional; base=false drops arm 0)."""
+        levels = {}
+        for part in spec.split(";"):
+            if not part.strip():
+                continue
+            key, _, values = part.partition("=")
+            levels[key.strip().lower()] = [v.strip() for v in values.split(",") if v.strip()]
+        if "ttl" not in levels or "admission" not in levels:
+            raise ValueError(f"Policy grid spec needs ttl= and admission= levels: {spec!r}")
+        return cls.from_levels(
+            [int(v) for v in levels["ttl"]],
+            [float(v) for v in levels["admission"]],
+            [int(v) for v in levels.get("eviction", ["0"])],
+            keep_base_arm=levels.get("base", ["true"])[0].lower() not in ("0", "false", "no"),
+        )
+
+    @property
+    def n_arms(self) -> int:
+        return len(self.policies) + self._offset
+
+    def policy_for_action(self, action: int, base: PolicyConfig) -> PolicyConfig:
+        action = int(action)
+        if action < self._offset:
+            return base
+        return self.policies[action - self._offset]
+
+    def describe(self, action: int) -> str:
+        action = int(action)
+        if action < self._offset:
+            return "base"
+        policy = self.policies[action - self._offset]
+        return f"ttl={policy.ttl_seconds},admission={policy.admission_threshold:g},eviction={policy.eviction_priority}"
+
+
+def policy_arms_from_spec(spec: Optional[str]):
+    """PolicyGrid for a PYROPE_POLICY_GRID spec, or the original two override arms when unset."""
+    if not spec:
+        return BinaryOverrideArms()
+    return PolicyGrid.from_spec(spec)
+
+
+def surviving_arms(
+    pulls: np.ndarray,
+    reward_sum: np.ndarray,
+    delta: float = 0.05,
+    min_pulls: int = 20,
+    reward_range: float = 2.0,
+) -> np.ndarray:
+    """Successive elimination over the last axis: False for arms confidently worse than the best.
+
+    Each arm's mean reward gets an anytime Hoeffding radius, range * sqrt(log(4 K n^2 / delta) / 2n).
+    An arm is dropped once its upper bound falls below the best lower bound. Arms with fewer than
+    min_pulls pulls are never dropped and never set the bar, and the best arm always survives.
+    """
+    pulls = np.asarray(pulls, dtype=np.float64)
+    n = np.maximum(pulls, 1.0)
+    mean = np.asarray(reward_sum, dtype=np.float64) / n
+    radius = reward_range * np.sqrt(np.log(4.0 * pulls.shape[-1] * n**2 / delta) / (2.0 * n))
+    explored = pulls >= min_pulls
+    lower = np.where(explored, mean - radius, -np.inf)
+    upper = np.where(explored, mean + radius, np.inf)
+    return upper >= lower.max(axis=-1, keepdims=True)
@@ -0,0 +1,96 @@
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from cache_simulator import CacheSimulator, Trace, load_trace, synthetic_trace
+from model_runtime import LoadedModel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class GateThresholds:
+    max_single_row_p99_ms: float = 2.0
+    max_batch_p99_ms: float = 10.0
+    max_size_bytes: int = 20 * 1024 * 1024
+    # Absolute replay hit-rate drop tolerated against the currently active model.
+    max_hit_rate_regression: float = 0.02
+
+
+@dataclass
+class GateReport:
+    passed: bool
+    violations: List[str] = field(default_factory=list)
+    latency: Dict[str, float] = field(default_factory=dict)
+    size_bytes: int = 0
+    replay: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class PromotionGate:
+    """Benchmarks a candidate model before it may become active.
+
+    Checks single-row and batched ONNX Runtime latency, artifact size, and cache hit rate when
+    the candidate drives an offline replay (cache_simulator) compared with the active model.
+    The replay trace comes from trace_path, or is a synthetic Zipf trace built on first use.
+    """
+
+    def __init__(
+        self,
+        thresholds: Optional[GateThresholds] = None,
+        trace_path: Optional[str] = None,
+        trace: Optional[Trace] = None,
+        latency_iterations: int = 200,
+        batch_size: int = 64,
+    ):
+        self.thresholds = thresholds or GateThresholds()
+        self.trace_path = trace_path
+        self.latency_iterations = latency_iterations
+        self.batch_size = batch_size
+        self._trace = trace
+        self._simulator: Optional[CacheSimulator] = None
+
+    def _get_simulator(self) -> CacheSimulator:
+        if self._simulator is None:
+            if self._trace is None:
+                if self.trace_path:
+                    self._trace = load_trace(self.trace_path)
+                else:
+                    self._trace = synthetic_trace(n_events=200_000, n_keys=20_000, duration_s=600.0)
+            self._simulator = CacheSimulator(self._trace)
+        return self._simulator
+
+    def evaluate(self, candidate: LoadedModel, active: Optional[LoadedModel] = None) -> GateReport:
+        limits = self.thresholds
+        report = GateReport(passed=True, size_bytes=os.path.getsize(candidate.path))
+        report.latency = candidate.measure_latency(self.latency_iterations, self.batch_size)
+
+        if report.latency["single_row_p99_ms"] > limits.max_single_row_p99_ms:
+            report.violations.append(
+                f"single-row p99 {report.latency['single_row_p99_ms']:.3f}ms > {limits.max_single_row_p99_ms}ms"
+            )
+        if report.latency["batch_p99_ms"] > limits.max_batch_p99_ms:
+            report.violations.append(f"batch p99 {report.latency['batch_p99_ms']:.3f}ms > {limits.max_batch_p99_ms}ms")
+        if report.size_bytes > limits.max_size_bytes:
+            report.violations.append(f"size {report.size_bytes} bytes > {limits.max_size_bytes} bytes")
+
+        simulator = self._get_simulator()
+        if simulator.trace.features is not None:
+            result = simulator.run_model(candidate, label=candidate.version)
+            report.replay = {"hit_rate": result.hit_rate, "search_cost_saved_ms": result.search_cost_saved_ms}
+            if active is not None:
+                baseline = simulator.run_model(active, label=active.version)
+                report.replay["active_version"] = active.version
+                report.replay["active_hit_rate"] = baseline.hit_rate
+                if result.hit_rate < baseline.hit_rate - limits.max_hit_rate_regression:
+                    report.violations.append(
+                        f"replay hit rate {result.hit_rate:.4f} < active {baseline.hit_rate:.4f}"
+                        f" - {limits.max_hit_rate_regression}"
+                    )
+
+        report.passed = not report.violations
+        logger.info(f"Promotion gate for {candidate.version}: {'PASS' if report.passed else report.violations}")
+        return report
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def attributed_reward(
+    before: Tuple,
+    after: Tuple,
+    miss_weight: float = 1.0,
+    latency_weight: float = 0.0,
+    cost_weight: float = 0.0,
+):
+    """Reward for moving from before to after, each a (miss_rate, latency_p99_ms, cpu_utilization) triple.
+
+    Works elementwise on scalars or NumPy arrays; see RewardAttributor for the formula.
+    """
+    miss_0, p99_0, cpu_0 = (np.asarray(v, dtype=np.float64) for v in before)
+    miss_1, p99_1, cpu_1 = (np.asarray(v, dtype=np.float64) for v in after)
+    reward = miss_weight * (miss_0 - miss_1)
+    if latency_weight:
+        reward = reward + latency_weight * _relative_drop(p99_0, p99_1)
+    if cost_weight:
+        reward = reward + cost_weight * _relative_drop(cpu_0, cpu_1)
+    return np.clip(reward, -1.0, 1.0)
+
+
+def _relative_drop(before: np.ndarray, after: np.ndarray) -> np.ndarray:
+    """(before - after) / before, and 0 where before is not positive."""
+    out = np.zeros(np.broadcast(before, after).shape)
+    return np.divide(before - after, before, out=out, where=before > 0)
+
+
+@dataclass(frozen=True)
+class PendingDecision:
+    """A bandit decision waiting for the reports that show its effect."""
+
+    features: np.ndarray
+    action: int
+    propensity: float
+    miss_rate: float
+    latency_p99_ms: float
+    cpu_utilization: float
+    timestamp: float
+
+
+class RewardAttributor:
+    """Credits each bandit decision with the change it caused, once that change is observable.
+
+    A policy handed out on report t only shapes the cache from then on, so its reward is measured
+    on report t + horizon against the metrics at decision time:
+
+        reward = miss_weight * (miss_t - miss_t+h)
+               + latency_weight * (p99_t - p99_t+h) / p99_t
+               + cost_weight * (cpu_t - cpu_t+h) / cpu_t
+
+    clipped to [-1, 1]. CPU utilization stands in for search cost. Decisions older than
+    max_age_seconds when their report arrives are dropped unrewarded, since a gap that long
+    says more about the tenant than about the policy.
+    """
+
+    def __init__(
+        self,
+        horizon: int = 1,
+        miss_weight: float = 1.0,
+        latency_weight: float = 0.0,
+        cost_weight: float = 0.0,
+        max_age_seconds: float = 600.0,
+        clock=time.time,
+    ):
+        if horizon < 1:
+            raise ValueError("horizon must be at least one report")
+        self.horizon = horizon
+        self.miss_weight = miss_weight
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Per tenant: decisions in report order, each with the number of reports seen since.
+        self._pending: Dict[str, Deque[List]] = {}
+        self.attributed = 0
+        self.expired = 0
+
+    def reward(self, decision: PendingDecision, miss_rate: float, latency_p99_ms: float, cpu: float) -> float:
+        return float(
+            attributed_reward(
+                (decision.miss_rate, decision.latency_p99_ms, decision.cpu_utilization),
+                (miss_rate, latency_p99_ms, cpu),
+                self.miss_weight,
+                self.latency_weight,
+                self.cost_weight,
+            )
+        )
+
+    def observe(
+        self,
+        tenant_id: str,
+        miss_rate: float,
+        latency_p99_ms: float,
+        cpu_utilization: float,
+        now: Optional[float] = None,
+    ) -> List[Tuple[PendingDecision, float]]:
+        """Advances the tenant's pending decisions by one report and returns the (decision, reward) pairs that matured."""
+        now = self._clock() if now is None else now
+        matured = []
+        with self._lock:
+            pending = self._pending.get(tenant_id)
+            if not pending:
+                return matured
+            for entry in pending:
+                entry[1] += 1
+            while pending:
+                decision, seen = pending[0]
+                if now - decision.timestamp > self.max_age_seconds:
+                    pending.popleft()
+                    self.expired += 1
+                    continue
+                if seen < self.horizon:
+                    break
+                pending.popleft()
+                matured.append((decision, self.reward(decision, miss_rate, latency_p99_ms, cpu_utilization)))
+                self.attributed += 1
+        return matured
+
+    def record(
+        self,
+        tenant_id: str,
+        features: np.ndarray,
+        action: int,
+        propensity: float,
+        miss_rate: float,
+        latency_p99_ms: float,
+        cpu_utilization: float,
+        now: Optional[float] = None,
+    ):
+        """Stores a decision made on this report; it is rewarded horizon reports later."""
+        decision = PendingDecision(
+            features=np.array(features, dtype=np.float64, copy=True),
+            action=int(action),
+            propensity=float(propensity),
+            miss_rate=float(miss_rate),
+            latency_p99_ms=float(latency_p99_ms),
+            cpu_utilization=float(cpu_utilization),
+            timestamp=self._clock() if now is None else now,
+        )
+        with self._lock:
+            self._pending.setdefault(tenant_id, deque()).append([decision, 0])
+
+    def pending_count(self, tenant_id: Optional[str] = None) -> int:
+        with self._lock:
+            if tenant_id is not None:
+                return len(self._pending.get(tenant_id, ()))
+            return sum(len(p) for p in self._pending.values())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": float(self.pending_count()),
+            "attributed": float(self.attributed),
+            "expired": float(self.expired),
+        }
@@ -0,0 +1,153 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# (name, bucket width in seconds, bucket count): every window is a 60-slot ring.
+WINDOWS: Tuple[Tuple[str, int, int], ...] = (("1m", 1, 60), ("15m", 15, 60), ("1h", 60, 60))
+
+# Per-bucket columns.
+_HITS, _MISSES, _REPORTS, _P99_SUM = range(4)
+
+BASELINE_COHORT = "heuristic"
+
+
+class _Series:
+    """Fixed-size ring buffers for every window of one scope (global, a tenant or a cohort).
+
+    Slot i of a window holds the bucket whose absolute index (timestamp // width) is stored in
+    bucket_ids; a write that lands on a slot still holding an older bucket clears it first, so
+    expiry needs no sweeping and each write is O(1).
+    """
+
+    def __init__(self):
+        n_buckets = max(n for _, _, n in WINDOWS)
+        self.values = np.zeros((len(WINDOWS), n_buckets, 4), dtype=np.float64)
+        self.bucket_ids = np.full((len(WINDOWS), n_buckets), -1, dtype=np.int64)
+
+    def add(self, now: float, hits: float, misses: float, latency_p99_ms: float):
+        for w, (_, width, n_buckets) in enumerate(WINDOWS):
+            bucket = int(now // width)
+            slot = bucket % n_buckets
+            row = self.values[w, slot]
+            if self.bucket_ids[w, slot] != bucket:
+                self.bucket_ids[w, slot] = bucket
+                row[:] = 0.0
+            row[_HITS] += hits
+            row[_MISSES] += misses
+            row[_REPORTS] += 1.0
+            row[_P99_SUM] += latency_p99_ms
+
+    def summary(self, window: int, now: float) -> Dict[str, float]:
+        _, width, n_buckets = WINDOWS[window]
+        current = int(now // width)
+        ids = self.bucket_ids[window, :n_buckets]
+        live = (ids >= 0) & (ids > current - n_buckets) & (ids <= current)
+        rows = self.values[window, :n_buckets][live]
+        hits, misses, reports, p99_sum = rows.sum(axis=0) if rows.size else np.zeros(4)
+        lookups = hits + misses
+
+        trend = 0.0
+        if live.sum() >= 2:
+            # Least-squares slope of per-bucket mean p99 against time, in ms per minute.
+            t = ids[live].astype(np.float64) * width / 60.0
+            p99 = rows[:, _P99_SUM] / rows[:, _REPORTS]
+            if np.ptp(t) > 0:
+                trend = float(np.polyfit(t, p99, 1)[0])
+
+        return {
+            "hits": float(hits),
+            "misses": float(misses),
+            "reports": float(reports),
+            "hit_rate": float(hits / lookups) if lookups else 0.0,
+            "p99_mean_ms": float(p99_sum / reports) if reports else 0.0,
+            "p99_trend_ms_per_min": trend,
+        }
+
+
+class RollingMetrics:
+    """Rolling 1m/15m/1h hit-rate and p99 windows per tenant, per policy cohort and globally.
+
+    Garnet reports cumulative hit/miss counters, so each report contributes the delta since the
+    tenant's previous report. That delta (and the p99 that came with it) accrued under the policy
+    handed out on the previous report, so it is credited to the tenant's previous cohort.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series: Dict[str, _Series] = {}
+        self._last_totals: Dict[str, Tuple[int, int]] = {}
+        self._last_cohort: Dict[str, str] = {}
+
+    def _get(self, scope: str) -> _Series:
+        series = self._series.get(scope)
+        if series is None:
+            series = self._series[scope] = _Series()
+        return series
+
+    def record(
+        self,
+        tenant_id: str,
+        cohort: str,
+        cache_hit_total: int,
+        cache_miss_total: int,
+        latency_p99_ms: float,
+        now: Optional[float] = None,
+    ):
+        now = self._clock() if now is None else now
+        with self._lock:
+            previous = self._last_totals.get(tenant_id)
+            self._last_totals[tenant_id] = (cache_hit_total, cache_miss_total)
+            if previous is None:
+                hits = misses = 0
+            else:
+                # A counter that went backwards means Garnet restarted; count from zero.
+                hits = cache_hit_total - previous[0] if cache_hit_total >= previous[0] else cache_hit_total
+                misses = cache_miss_total - previous[1] if cache_miss_total >= previous[1] else cache_miss_total
+
+            credited = self._last_cohort.get(tenant_id, cohort)
+            self._last_cohort[tenant_id] = cohort
+            for scope in ("global", f"tenant:{tenant_id}", f"cohort:{credited}"):
+                self._get(scope).add(now, hits, misses, latency_p99_ms)
+
+    def summary(self, scope: str, window: str, now: Optional[float] = None) -> Dict[str, float]:
+        now = self._clock() if now is None else now
+        index = [name for name, _, _ in WINDOWS].index(window)
+        with self._lock:
+            series = self._series.get(scope)
+            if series is None:
+                return _Series().summary(index, now)
+            return series.summary(index, now)
+
+    def p99_improvement(self, window: str = "15m", now: Optional[float] = None) -> float:
+        """Relative p99 reduction of AI-controlled cohorts versus the heuristic cohort (0 if either is empty)."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            cohorts = [scope for scope in self._series if scope.startswith("cohort:")]
+        baseline = self.summary(f"cohort:{BASELINE_COHORT}", window, now)
+        controlled = [self.summary(scope, window, now) for scope in cohorts if scope != f"cohort:{BASELINE_COHORT}"]
+        reports = sum(s["reports"] for s in controlled)
+        if not baseline["reports"] or not reports or not baseline["p99_mean_ms"]:
+            return 0.0
+        controlled_p99 = sum(s["p99_mean_ms"] * s["reports"] for s in controlled) / reports
+        return 1.0 - controlled_p99 / baseline["p99_mean_ms"]
+
+    def evaluation_metrics(self, tenant_id: Optional[str] = None, now: Optional[float] = None) -> Dict[str, float]:
+        """Flattened global, cohort and (optionally) tenant summaries for GetEvaluations."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            cohorts = sorted(scope.split(":", 1)[1] for scope in self._series if scope.startswith("cohort:"))
+        scopes = [("global", "global")] + [(f"cohort_{c}", f"cohort:{c}") for c in cohorts]
+        if tenant_id:
+            scopes.append(("tenant", f"tenant:{tenant_id}"))
+
+        metrics = {}
+        for prefix, scope in scopes:
+            for window, _, _ in WINDOWS:
+                for key, value in self.summary(scope, window, now).items():
+                    metrics[f"{prefix}_{window}_{key}"] = value
+        for window, _, _ in WINDOWS:
+            metrics[f"p99_improvement_{window}"] = self.p99_improvement(window, now)
+        return metrics
@@ -5,9 +5,11 @@ import sys
 import threading
 import time
 import warnings
+from collections import defaultdict, deque
 from concurrent import futures
 
 import grpc
+import numpy as np
 
 # These imports will work after running codegen.py
 try:
@@ -18,13 +20,19 @@ except ImportError as e:
     sys.exit(1)
 
 from feature_engineering import FeatureEngineer
+from inference_batcher import MicroBatcher
 from llm_policy_engine import LLMPolicyEngine, SystemMetrics
 from llm_worker import LLMWorker
 from logger import QueryLogger
 from policy_engine import HeuristicPolicyEngine
 from prediction_engine import PredictionEngine
 from model_manager import ModelManager
-from bandit_engine import ContextualBanditEngine
+from promotion_gate import PromotionGate
+from rolling_metrics import RollingMetrics
+from bandit_engine import create_bandit_engine
+from bandit_learner import BackgroundBanditLearner
+from policy_grid import policy_arms_from_spec
+from reward_attribution import RewardAttributor
 
 # Suppress google.generativeai deprecation warning for clean demo output
 warnings.filterwarnings("ignore", category=FutureWarning, module="google.generativeai")
@@ -42,6 +50,49 @@ logger.info("Logging configured successfully")
 # Feature flag for Gemini-based cache control
 LLM_POLICY_ENABLED = os.getenv("LLM_POLICY_ENABLED", "false").lower() == "true"
 
+# LLM policy cache misses within this window (0 disables) share one prompt of up to max-batch contexts.
+LLM_COALESCE_WINDOW_MS = float(os.getenv("PYROPE_LLM_COALESCE_WINDOW_MS", "50"))
+LLM_COALESCE_MAX_BATCH = int(os.getenv("PYROPE_LLM_COALESCE_MAX_BATCH", "16"))
+
+# LLM decisions are kept in a bounded LRU cache, served stale while they refresh and persisted
+# here across restarts (empty disables persistence).
+LLM_DECISION_CACHE_PATH = os.getenv("PYROPE_LLM_DECISION_CACHE_PATH", "models/llm_decision_cache.json")
+LLM_DECISION_CACHE_SIZE = int(os.getenv("PYROPE_LLM_DECISION_CACHE_SIZE", "1024"))
+LLM_DECISION_MAX_STALE_SECONDS = float(os.getenv("PYROPE_LLM_DECISION_MAX_STALE_SECONDS", "600"))
+# Fresh LLM decisions within this distance (about one cache-key bucket per unit; 0 disables)
+# answer a cache miss, blended over up to the nearest k.
+LLM_NEIGHBOR_RADIUS = float(os.getenv("PYROPE_LLM_NEIGHBOR_RADIUS", "1.0"))
+LLM_NEIGHBOR_K = int(os.getenv("PYROPE_LLM_NEIGHBOR_K", "3"))
+
+# Fraction of ingested per-query rows attached to the decision log, and the per-tenant cap
+# on rows held between two ReportSystemMetrics calls.
+QUERY_SAMPLE_RATE = float(os.getenv("PYROPE_QUERY_SAMPLE_RATE", "0.01"))
+MAX_QUERY_SAMPLES_PER_REPORT = 100
+
+# Online policy learner: "epsilon_greedy" (default), "linucb" or "thompson".
+BANDIT_ENGINE = os.getenv("PYROPE_BANDIT_ENGINE", "epsilon_greedy")
+
+# Bandit arms: unset keeps the normal/aggressive override pair; otherwise a policy grid such as
+# "ttl=30,60,300;admission=0.05,0.1,0.2;eviction=0,1". Elimination drops confidently worse arms.
+POLICY_GRID = os.getenv("PYROPE_POLICY_GRID", "")
+BANDIT_ELIMINATION = os.getenv("PYROPE_BANDIT_ELIMINATION", "false").lower() == "true"
+
+# Bandit rewards are the miss-rate drop over this many reports after a decision, plus optional
+# weighted relative p99 and CPU (search cost) drops.
+REWARD_HORIZON = int(os.getenv("PYROPE_REWARD_HORIZON", "1"))
+REWARD_LATENCY_WEIGHT = float(os.getenv("PYROPE_REWARD_LATENCY_WEIGHT", "0.0"))
+REWARD_COST_WEIGHT = float(os.getenv("PYROPE_REWARD_COST_WEIGHT", "0.0"))
+
+# Bandit rewards are applied by a background learner in mini-batches of up to this many.
+BANDIT_UPDATE_BATCH_SIZE = int(os.getenv("PYROPE_BANDIT_UPDATE_BATCH_SIZE", "256"))
+BANDIT_UPDATE_INTERVAL_MS = float(os.getenv("PYROPE_BANDIT_UPDATE_INTERVAL_MS", "20"))
+# Bandit state is checkpointed this often, and on shutdown, so a crash loses at most one interval.
+BANDIT_SAVE_INTERVAL_SECONDS = float(os.getenv("PYROPE_BANDIT_SAVE_INTERVAL_SECONDS", "300"))
+
+# Micro-batching window for policy model scoring across concurrent ReportSystemMetrics calls.
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("PYROPE_INFERENCE_MAX_BATCH_SIZE", "64"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("PYROPE_INFERENCE_MAX_WAIT_MS", "1.0"))
+
 
 class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
     def __init__(self, log_path="logs/query_log.jsonl"):
@@ -50,19 +101,46 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
         self._prediction_engine = PredictionEngine()
         self._logger = QueryLogger(log_path)
         self._latest_system_features = None
+        self._query_sample_rate = QUERY_SAMPLE_RATE
+        self._query_samples = defaultdict(lambda: deque(maxlen=MAX_QUERY_SAMPLES_PER_REPORT))
+        self._query_ingested = defaultdict(int)
+        self._query_lock = threading.Lock()
+        self._rolling_metrics = RollingMetrics()
         self._llm_worker = LLMWorker()  # Initialize LLM Worker
         self._event_loop = None  # Will be set when async loop starts
 
-        self._model_manager = ModelManager()
-        self._bandit_engine = ContextualBanditEngine()
+        self._model_manager = ModelManager(
+            trainer=os.getenv("PYROPE_MODEL_TRAINER") or None,
+            promotion_gate=PromotionGate(trace_path=os.getenv("PYROPE_PROMOTION_TRACE") or None),
+        )
+        self._policy_arms = policy_arms_from_spec(POLICY_GRID)
+        self._bandit_engine = create_bandit_engine(
+            BANDIT_ENGINE, n_arms=self._policy_arms.n_arms, eliminate=BANDIT_ELIMINATION
+        )
+        self._bandit_learner = BackgroundBanditLearner(
+            self._bandit_engine, max_batch_size=BANDIT_UPDATE_BATCH_SIZE, interval_ms=BANDIT_UPDATE_INTERVAL_MS
+        )
+        self._reward_attributor = RewardAttributor(
+            horizon=REWARD_HORIZON, latency_weight=REWARD_LATENCY_WEIGHT, cost_weight=REWARD_COST_WEIGHT
+        )
+        self._inference_batcher = MicroBatcher(
+            max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS
+        )
 
         # P6-13: LLMPolicyEngine with fallback to heuristic
         if LLM_POLICY_ENABLED:
             self._llm_policy_engine = LLMPolicyEngine(
                 llm_worker=self._llm_worker,
                 fallback=self._heuristic_engine,
+                coalesce_window_ms=LLM_COALESCE_WINDOW_MS,
+                max_batch=LLM_COALESCE_MAX_BATCH,
+                cache_max_entries=LLM_DECISION_CACHE_SIZE,
+                cache_max_stale_seconds=LLM_DECISION_MAX_STALE_SECONDS,
+                cache_path=LLM_DECISION_CACHE_PATH or None,
+                neighbor_radius=LLM_NEIGHBOR_RADIUS,
+                neighbor_k=LLM_NEIGHBOR_K,
             )
-            print("LLM Policy Engine ENABLED (Gemini-based cache control)")
+            print("LLM Policy Engine ENABLED (LLM-based cache control)")
         else:
             self._llm_policy_engine = None
             print("LLM Policy Engine DISABLED (using heuristic)")
@@ -71,11 +149,37 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
         self._training_thread = threading.Thread(target=self._training_loop, daemon=True)
         self._training_thread.start()
 
+        self._stopping = threading.Event()
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, name="bandit-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+
     def start_background_services(self):
         asyncio.run(self._llm_worker.start())
 
-    def stop_background_services(self):
-        asyncio.run(self._llm_worker.stop())
+    def stop_background_services(self, loop=None):
+        """Stops background work and persists learned state.
+
+        loop is the event loop running the LLM worker, if it runs on one (as in serve()).
+        Queued bandit rewards are applied before the bandit state is saved.
+        """
+        if loop is not None and loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._llm_worker.stop(), loop)
+            try:
+                future.result(timeout=5.0)
+            except Exception as e:
+                print(f"LLMWorker stop error: {e}")
+        else:
+            asyncio.run(self._llm_worker.stop())
+        self._stopping.set()
+        self._inference_batcher.stop()
+        self._bandit_learner.stop()
+        self._bandit_engine.save()
+        if self._llm_policy_engine:
+            self._llm_policy_engine.save_cache()
+
+    def _checkpoint_loop(self):
+        while not self._stopping.wait(BANDIT_SAVE_INTERVAL_SECONDS):
+            self._bandit_engine.save()
 
     def _training_loop(self):
         while True:
@@ -121,20 +225,33 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
             logger.warning("Auto-rollback triggered for canary deployment due to P99 degradation")
 
         # P8-6: Online Learning Loop
-        # 1. Update Bandit with previous reward (Change in miss rate?)
-        # For simplicity, we just assume improvement is reward.
-        # But we need state from PREVIOUS step.
-        # Here we just use current state to predict Action.
+        # 1. Reward earlier decisions with the change this report shows since they were made.
+        for decision, reward in self._reward_attributor.observe(
+            tenant_id, request.miss_rate, request.latency_p99_ms, request.cpu_utilization
+        ):
+            self._bandit_learner.submit(decision.features, decision.action, reward, tenant_id=tenant_id)
 
+        # 2. Choose this report's action; it is rewarded once its effect shows up.
         bandit_features = self._bandit_engine.get_features(request)
-        action = self._bandit_engine.select_action(bandit_features)
+        action, propensity = self._bandit_engine.select_with_propensity(bandit_features, tenant_id=tenant_id)
 
-        # Action 0: Normal (Heuristic/LLM), Action 1: Aggressive Override
+        # Action 0 keeps the base (model/LLM/heuristic) policy; other actions select an override arm.
 
         policy_config = None
+        policy_source = "heuristic"
+
+        # A deployed policy model (active, or canary for canary tenants) takes precedence.
+        model = self._model_manager.get_model(tenant_id)
+        if model is not None:
+            try:
+                model_action = self._inference_batcher.submit(model, self._model_features(request), timeout=1.0)
+                policy_config = self._heuristic_engine.policy_for_action(model_action)
+                policy_source = f"model:{model.version}"
+            except Exception as e:
+                logger.error(f"Model {model.version} scoring failed: {e}, falling back")
 
         # P6-13: Use LLM or heuristic based on feature flag
-        if self._llm_policy_engine and self._event_loop:
+        if policy_config is None and self._llm_policy_engine and self._event_loop:
             # Async LLM path
             metrics = SystemMetrics(
                 qps=request.qps,
@@ -146,25 +263,36 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
             future = asyncio.run_coroutine_threadsafe(self._llm_policy_engine.compute_policy(metrics), self._event_loop)
             try:
                 policy_config = future.result(timeout=5.0)
+                policy_source = "llm"
             except Exception as e:
                 print(f"LLM policy error: {e}, falling back to heuristic")
                 policy_config = self._heuristic_engine.compute_policy(request.miss_rate)
-        else:
+        elif policy_config is None:
             # Heuristic path
             policy_config = self._heuristic_engine.compute_policy(request.miss_rate)
 
-        # Apply Bandit Override (Action 1 = Aggressive)
-        if action == 1:
-            policy_config.ttl_seconds = max(10, policy_config.ttl_seconds // 2)
-            policy_config.admission_threshold = max(0.0, policy_config.admission_threshold - 0.1)
-            # print("BANDIT: Applied Aggressive override")
+        # Apply the bandit's arm on top of the base policy.
+        policy_config = self._policy_arms.policy_for_action(action, policy_config)
+
+        # Credit this report's counters to the cohort ("model", "llm" or "heuristic") that set the last policy.
+        self._rolling_metrics.record(
+            tenant_id,
+            policy_source.split(":", 1)[0],
+            request.cache_hit_total,
+            request.cache_miss_total,
+            request.latency_p99_ms,
+        )
 
-        # Fake Reward Calculation (minimize miss rate)
-        # Positive reward for low miss rate; negative for high miss rate.
-        baseline = 0.3
-        reward = baseline - request.miss_rate
-        reward = max(-1.0, min(1.0, reward))
-        self._bandit_engine.update(bandit_features, action, reward)
+        self._reward_attributor.record(
+            tenant_id,
+            bandit_features,
+            action,
+            propensity,
+            request.miss_rate,
+            request.latency_p99_ms,
+            request.cpu_utilization,
+        )
+        self._bandit_engine.remember_policy(tenant_id, policy_config)
 
         print(
             "Metrics: "
@@ -182,9 +310,8 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
             eviction_priority=policy_config.eviction_priority,
         )
 
-        # Log decision for offline datagen
-        # Use latest features if available
-        query_features = {}  # We don't have per-query features in ReportSystemMetrics yet
+        # Log decision for offline datagen, joined with per-query rows sampled since the last report
+        query_features = self._drain_query_samples(tenant_id)
         system_metrics = {
             "qps": request.qps,
             "miss_rate": request.miss_rate,
@@ -197,11 +324,54 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
             "ttl_seconds": policy_config.ttl_seconds,
             "eviction_priority": policy_config.eviction_priority,
             "bandit_action": int(action),
+            "bandit_arm": self._policy_arms.describe(action),
+            "bandit_propensity": propensity,
+            "bandit_arms": self._policy_arms.n_arms,
+            "policy_source": policy_source,
         }
         self._logger.log_decision(tenant_id, query_features, system_metrics, decision)
 
         return policy_service_pb2.SystemMetricsResponse(status="OK", next_report_interval_ms=0, policy=policy_proto)
 
+    @staticmethod
+    def _model_features(request) -> np.ndarray:
+        # Same column order as train_model.FEATURE_COLUMNS: qps, miss_rate, latency, cpu
+        return np.array(
+            [[request.qps, request.miss_rate, request.latency_p99_ms, request.cpu_utilization]], dtype=np.float32
+        )
+
+    def ReportQueryFeatures(self, request, context):
+        tenant_id = self._resolve_tenant_id(request, context)
+        n = len(request.query_hashes)
+        columns = (request.top_k, request.filter_types, request.norms, request.hits)
+        if any(len(column) != n for column in columns) or len(request.timestamps_unix_ms) not in (0, n):
+            return policy_service_pb2.QueryFeatureBatchResponse(status="Error: column length mismatch", accepted=0)
+
+        samples = self._feature_engineer.ingest_query_batch(
+            request.query_hashes,
+            request.top_k,
+            request.filter_types,
+            request.norms,
+            request.hits,
+            timestamps_ms=request.timestamps_unix_ms,
+            sample_rate=self._query_sample_rate,
+            tenant_id=tenant_id,
+        )
+        with self._query_lock:
+            self._query_ingested[tenant_id] += n
+            if samples:
+                index_name = request.index_name
+                self._query_samples[tenant_id].extend(dict(row, index_name=index_name) for row in samples)
+        return policy_service_pb2.QueryFeatureBatchResponse(status="OK", accepted=n)
+
+    def _drain_query_samples(self, tenant_id: str) -> dict:
+        with self._query_lock:
+            ingested = self._query_ingested.pop(tenant_id, 0)
+            samples = self._query_samples.pop(tenant_id, None)
+        if not ingested and not samples:
+            return {}
+        return {"ingested": ingested, "samples": list(samples) if samples else []}
+
     def ReportClusterAccess(self, request, context):
         for access in request.accesses:
             self._prediction_engine.record_interaction(request.tenant_id, request.index_name, access.cluster_id)
@@ -230,7 +400,7 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
         )
 
     def TrainModel(self, request, context):
-        job_id = self._model_manager.train_model(request.dataset_path)
+        job_id = self._model_manager.train_model(request.dataset_path, trainer=request.trainer or None)
         return policy_service_pb2.TrainResponse(status="Started", job_id=job_id)
 
     def DeployModel(self, request, context):
@@ -246,10 +416,25 @@ class PolicyService(policy_service_pb2_grpc.PolicyServiceServicer):
         return policy_service_pb2.RollbackResponse(status=status, active_version=active)
 
     def GetEvaluations(self, request, context):
+        tenant_id = self._resolve_tenant_id(request, context)
         return policy_service_pb2.EvaluationMetrics(
-            current_p99_improvement=0.25,  # Placeholder from evaluate_model.py logic
-            current_cache_hit_rate=0.85,
-            other_metrics={"bandit_epsilon": self._bandit_engine.epsilon},
+            current_p99_improvement=self._rolling_metrics.p99_improvement("15m"),
+            current_cache_hit_rate=self._rolling_metrics.summary("global", "1m")["hit_rate"],
+            other_metrics={
+                **self._rolling_metrics.evaluation_metrics(tenant_id),
+                **{f"bandit_{k}": v for k, v in self._bandit_engine.exploration().items()},
+                "bandit_arms": float(self._policy_arms.n_arms),
+                **{f"reward_{k}": v for k, v in self._reward_attributor.stats().items()},
+                **{f"bandit_learner_{k}": v for k, v in self._bandit_learner.stats().items()},
+                **{f"inference_{k}": v for k, v in self._inference_batcher.stats().items()},
+                **self._model_manager.latency_report(),
+                **(
+                    {f"llm_cache_{k}": v for k, v in self._llm_policy_engine.cache_stats().items()}
+                    if self._llm_policy_engine
+                    else {}
+                ),
+                **{f"llm_budget_{k}": v for k, v in self._llm_worker.budget.report().items()},
+            },
         )
 
 
@@ -334,14 +519,10 @@ def serve():
             time.sleep(86400)
     except KeyboardInterrupt:
         print("Shutting down...")
-        # FIX: Properly stop LLM worker using thread-safe call
-        if llm_worker and loop.is_running():
-            future = asyncio.run_coroutine_threadsafe(llm_worker.stop(), loop)
-            try:
-                future.result(timeout=5.0)
-            except Exception as e:
-                print(f"LLMWorker stop error: {e}")
-            # Stop the event loop
+        # FIX: Properly stop LLM worker using thread-safe call, then flush and save learned state.
+        # Runs before server.stop(0) so the bandit learner applies every queued reward first.
+        policy_service.stop_background_services(loop)
+        if loop.is_running():
             loop.call_soon_threadsafe(loop.stop)
         server.stop(0)
         print("AI Sidecar stopped.")
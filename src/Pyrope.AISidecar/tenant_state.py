@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRIOR_KEY = "__prior__"
+
+
+class TenantStateStore:
+    """Per-tenant state kept as rows of preallocated NumPy arrays.
+
+    Each field is one array of shape (capacity, *field_shape); a tenant is a row index, so
+    thousands of tenants cost a few contiguous arrays rather than thousands of Python objects,
+    and batch operations can index many tenants at once. Row 0 is the shared prior: a tenant
+    seen for the first time starts as a copy of it. Capacity doubles when full.
+    """
+
+    def __init__(self, fields: Dict[str, Tuple[Tuple[int, ...], np.dtype]], initial_capacity: int = 64):
+        self.fields = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in fields.items()}
+        self._lock = threading.RLock()
+        self._index: Dict[str, int] = {PRIOR_KEY: 0}
+        self._arrays = {
+            name: np.zeros((max(2, initial_capacity),) + shape, dtype=dtype)
+            for name, (shape, dtype) in self.fields.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._index) - 1
+
+    def tenants(self) -> Iterable[str]:
+        return [t for t in self._index if t != PRIOR_KEY]
+
+    def row(self, tenant_id: str) -> int:
+        """Returns the tenant's row, creating it from the prior on first use."""
+        with self._lock:
+            index = self._index.get(tenant_id)
+            if index is not None:
+                return index
+            index = len(self._index)
+            capacity = next(iter(self._arrays.values())).shape[0]
+            if index >= capacity:
+                for name, array in self._arrays.items():
+                    grown = np.zeros((capacity * 2,) + array.shape[1:], dtype=array.dtype)
+                    grown[:capacity] = array
+                    self._arrays[name] = grown
+            for array in self._arrays.values():
+                array[index] = array[0]
+            self._index[tenant_id] = index
+            return index
+
+    def has(self, tenant_id: str) -> bool:
+        with self._lock:
+            return tenant_id in self._index
+
+    def array(self, name: str) -> np.ndarray:
+        """The live backing array for a field (rows beyond len(self) + 1 are unused)."""
+        with self._lock:
+            return self._arrays[name]
+
+    def get(self, tenant_id: str, name: str) -> np.ndarray:
+        with self._lock:
+            row = self.row(tenant_id)  # may grow (and replace) the arrays
+            return self._arrays[name][row].copy()
+
+    def set(self, tenant_id: str, name: str, value):
+        with self._lock:
+            row = self.row(tenant_id)
+            self._arrays[name][row] = value
+
+    def read_rows(self, rows, *names: str) -> Tuple[np.ndarray, ...]:
+        """Copies of the given rows of several fields, taken together so they are mutually consistent."""
+        with self._lock:
+            return tuple(np.array(self._arrays[name][rows]) for name in names)
+
+    def write_rows(self, rows, values: Dict[str, np.ndarray]):
+        """Publishes new values for the given rows of several fields in one step (see read_rows)."""
+        with self._lock:
+            for name, value in values.items():
+                self._arrays[name][rows] = value
+
+    def feedback_rows(self, tenant_ids: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(sample index, row) pairs for a batch of feedback: every sample updates the prior, and its
+        tenant's row too when it names one (creating the row if needed)."""
+        samples = [i for i, t in enumerate(tenant_ids) if t]
+        rows = [self.row(tenant_ids[i]) for i in samples]
+        n = len(tenant_ids)
+        return (
+            np.concatenate([np.arange(n), np.asarray(samples, dtype=np.int64)]),
+            np.concatenate([np.zeros(n, dtype=np.int64), np.asarray(rows, dtype=np.int64)]),
+        )
+
+    def set_prior(self, name: str, value):
+        with self._lock:
+            self._arrays[name][0] = value
+
+    def save(self, path: str):
+        # Copy under the lock: a write_rows landing while the file is written must not tear the snapshot.
+        with self._lock:
+            n_rows = len(self._index)
+            tenants = np.array(sorted(self._index, key=self._index.get), dtype=object)
+            payload = {f"field_{name}": array[:n_rows].copy() for name, array in self._arrays.items()}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, tenants=tenants.astype(str), **payload)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Restores rows saved by save(); fields missing from the file keep the prior."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                tenants = [str(t) for t in data["tenants"]]
+                loaded = {name: data[f"field_{name}"] for name in self.fields if f"field_{name}" in data}
+        except Exception as e:
+            logger.error(f"Failed to load tenant state from {path}: {e}")
+            return False
+
+        with self._lock:
+            self._index = {tenant: i for i, tenant in enumerate(tenants)}
+            n_rows = len(tenants)
+            capacity = max(next(iter(self._arrays.values())).shape[0], n_rows)
+            for name, (shape, dtype) in self.fields.items():
+                array = np.zeros((capacity,) + shape, dtype=dtype)
+                if name in loaded and loaded[name].shape[1:] == shape:
+                    array[:n_rows] = loaded[name]
+                else:
+                    array[:n_rows] = self._arrays[name][0]
+                self._arrays[name] = array
+        return True
+
+    def tenant_row(self, tenant_id: Optional[str]) -> int:
+        """Row used for reads: the tenant's own row, or the prior for unknown/blank tenants."""
+        with self._lock:
+            return self._index.get(tenant_id, 0) if tenant_id else 0
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bandit_engine import ContextualBanditEngine
+
+FEATURES = np.array([[120.0, 0.3, 15.0, 40.0]])
+
+
+class TestContextualBanditEngine(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = ContextualBanditEngine(model_path=os.path.join(self.test_dir, "bandit.npz"), epsilon=0.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _train(self, tenant_id, best_action, steps=50):
+        for i in range(steps):
+            action = i % 2
+            reward = 1.0 if action == best_action else -1.0
+            self.engine.update(FEATURES, action, reward, tenant_id=tenant_id)
+
+    def test_tenants_with_opposite_workloads_learn_separate_policies(self):
+        self._train("rag-tenant", best_action=1)
+        self._train("ingest-tenant", best_action=0)
+
+        self.assertEqual(1, self.engine.select_action(FEATURES, tenant_id="rag-tenant"))
+        self.assertEqual(0, self.engine.select_action(FEATURES, tenant_id="ingest-tenant"))
+
+    def test_cold_tenant_starts_from_shared_prior(self):
+        self._train("tenant-a", best_action=1)
+
+        self.assertEqual(1, self.engine.select_action(FEATURES, tenant_id="brand-new"))
+        np.testing.assert_array_equal(
+            FEATURES[0].astype(np.float32), self.engine.state.get("brand-new", "last_context")
+        )
+
+    def test_untrained_engine_explores(self):
+        actions = {self.engine.select_action(FEATURES, tenant_id="t") for _ in range(50)}
+        self.assertEqual({0, 1}, actions)
+        self.assertFalse(self.engine.initialized)
+
+    def test_propensity_reflects_epsilon(self):
+        engine = ContextualBanditEngine(model_path=os.path.join(self.test_dir, "p.npz"), epsilon=0.2, n_arms=4)
+        self.assertEqual(0.25, engine.select_with_propensity(FEATURES, tenant_id="t")[1])
+
+        for _ in range(50):
+            engine.update(FEATURES, 2, 1.0, tenant_id="t")
+        propensities = {}
+        for _ in range(200):
+            action, propensity = engine.select_with_propensity(FEATURES, tenant_id="t")
+            propensities[action] = propensity
+
+        self.assertAlmostEqual(0.85, propensities[2])
+        self.assertAlmostEqual(0.05, propensities[next(a for a in propensities if a != 2)])
+
+    def test_batch_of_identical_samples_takes_a_single_step(self):
+        single = ContextualBanditEngine(model_path=os.path.join(self.test_dir, "single.npz"))
+        single.update(FEATURES, 1, 1.0, tenant_id="t")
+
+        batch = 32
+        self.engine.update_batch(np.repeat(FEATURES, batch, axis=0), [1] * batch, [1.0] * batch, ["t"] * batch)
+
+        # Both the tenant row and the prior, which sees every sample, move as far as one update.
+        for tenant_id in ("t", None):
+            np.testing.assert_allclose(
+                single.state.get(tenant_id, "weights"), self.engine.state.get(tenant_id, "weights")
+            )
+        self.assertEqual(batch, self.engine.state.get("t", "pulls")[1])
+
+    def test_state_persists(self):
+        self._train("rag-tenant", best_action=1)
+        self.engine.save()
+
+        restored = ContextualBanditEngine(model_path=self.engine.model_path, epsilon=0.0)
+
+        self.assertTrue(restored.initialized)
+        self.assertEqual(1, restored.select_action(FEATURES, tenant_id="rag-tenant"))
+
+
+if __name__ == "__main__":
+    unittest.main()
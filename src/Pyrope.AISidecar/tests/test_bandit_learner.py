@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from bandit_engine import ContextualBanditEngine
+from bandit_learner import BackgroundBanditLearner
+from linear_bandit import LinearBanditEngine
+
+
+def _feedback(n, seed=0):
+    rng = np.random.default_rng(seed)
+    features = np.column_stack(
+        [rng.lognormal(5, 1, n), rng.uniform(0, 1, n), rng.lognormal(3, 0.5, n), rng.uniform(0, 100, n)]
+    )
+    actions = rng.integers(0, 2, n)
+    rewards = rng.normal(0, 0.5, n)
+    tenants = [f"t{i % 3}" if i % 4 else None for i in range(n)]
+    return features, actions, rewards, tenants
+
+
+class TestBatchedUpdates(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_woodbury_batch_matches_sequential_updates(self):
+        features, actions, rewards, tenants = _feedback(64)
+        sequential = LinearBanditEngine("linucb", model_path=os.path.join(self.test_dir, "a.npz"))
+        batched = LinearBanditEngine("linucb", model_path=os.path.join(self.test_dir, "b.npz"))
+        # Tenants already have rows by the time feedback arrives (select_action creates them).
+        for engine in (sequential, batched):
+            for tenant in ("t1", "t2"):
+                engine.state.row(tenant)
+
+        for i in range(len(features)):
+            sequential.update(features[[i]], actions[i], rewards[i], tenant_id=tenants[i])
+        batched.update_batch(features, actions, rewards, tenants)
+
+        for tenant in (None, "t1", "t2"):
+            for field in ("a_inv", "b", "pulls", "reward_sum"):
+                row_a = sequential.state.read_rows(sequential.state.tenant_row(tenant), field)[0]
+                row_b = batched.state.read_rows(batched.state.tenant_row(tenant), field)[0]
+                np.testing.assert_allclose(row_a, row_b, rtol=1e-8, atol=1e-10)
+
+    def test_epsilon_greedy_batch_counts_every_sample(self):
+        features, actions, rewards, tenants = _feedback(40)
+        engine = ContextualBanditEngine(model_path=os.path.join(self.test_dir, "e.npz"))
+
+        engine.update_batch(features, actions, rewards, tenants)
+
+        self.assertEqual(40, engine.state.get("__prior__", "updates"))
+        self.assertEqual(sum(t == "t1" for t in tenants), engine.state.get("t1", "updates"))
+        np.testing.assert_allclose(
+            [rewards[actions == a].sum() for a in (0, 1)], engine.state.get("__prior__", "reward_sum")
+        )
+
+
+class TestBackgroundBanditLearner(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = LinearBanditEngine("linucb", model_path=os.path.join(self.test_dir, "l.npz"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_concurrent_submissions_are_applied_in_batches(self):
+        learner = BackgroundBanditLearner(self.engine, max_batch_size=64, interval_ms=5.0)
+        features, actions, rewards, tenants = _feedback(400)
+
+        def producer(offset):
+            for i in range(offset, 400, 4):
+                learner.submit(features[i], actions[i], rewards[i], tenant_id=tenants[i])
+                self.engine.select_action(features[[i]], tenant_id=tenants[i])
+
+        threads = [threading.Thread(target=producer, args=(k,)) for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        learner.stop()
+
+        stats = learner.stats()
+        self.assertEqual(400.0, stats["applied"])
+        self.assertEqual(0.0, stats["pending"])
+        self.assertGreater(stats["batch_size_mean"], 1.0)
+        self.assertEqual(400, self.engine.state.get("__prior__", "pulls").sum())
+
+    def test_full_buffer_drops_oldest_feedback(self):
+        learner = BackgroundBanditLearner(self.engine, capacity=10, max_batch_size=100, interval_ms=10_000.0)
+        features, actions, rewards, tenants = _feedback(15)
+        for i in range(15):
+            learner.submit(features[i], actions[i], rewards[i], tenant_id="t")
+        learner.stop()
+
+        self.assertEqual(5.0, learner.stats()["dropped"])
+        self.assertEqual(10, self.engine.state.get("t", "pulls").sum())
+        np.testing.assert_allclose(rewards[5:].sum(), self.engine.state.get("t", "reward_sum").sum())
+
+    def test_failed_update_is_logged_and_skipped(self):
+        class _Broken:
+            def update_batch(self, *args):
+                raise RuntimeError("boom")
+
+        learner = BackgroundBanditLearner(_Broken(), interval_ms=10_000.0)
+        learner.submit(np.zeros(4), 0, 1.0)
+        with self.assertLogs("bandit_learner", level="ERROR"):
+            learner.stop()
+        self.assertEqual(0.0, learner.stats()["applied"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from cache_simulator import CacheSimulator, Trace, policy_grid, synthetic_trace
+from policy_engine import PolicyConfig
+
+
+def _brute_force_hits(trace: Trace, policy: PolicyConfig) -> int:
+    """Event-by-event reference: absolute TTL from insert, admission by prior reuse."""
+    expiry, seen, hits = {}, {}, 0
+    for t, key in sorted(zip(trace.timestamp_ms, trace.query_hash)):
+        prior = seen.get(key, 0)
+        seen[key] = prior + 1
+        if key in expiry and t <= expiry[key]:
+            hits += 1
+            continue
+        if prior / (prior + 1.0) >= policy.admission_threshold:
+            expiry[key] = t + policy.ttl_seconds * 1000.0
+        else:
+            expiry.pop(key, None)
+    return hits
+
+
+class _ConstantModel:
+    def __init__(self, action):
+        self.action = action
+
+    def predict(self, features):
+        return np.full(len(features), self.action)
+
+
+class TestCacheSimulator(unittest.TestCase):
+    def setUp(self):
+        self.trace = synthetic_trace(n_events=5000, n_keys=500, duration_s=300, seed=7)
+
+    def test_unbounded_replay_matches_event_by_event_reference(self):
+        simulator = CacheSimulator(self.trace)
+        for policy in policy_grid([1, 10, 60], [0.0, 0.5, 0.75]):
+            with self.subTest(policy=policy):
+                result = simulator.run(policy)
+                self.assertEqual(_brute_force_hits(self.trace, policy), result.hits)
+                self.assertAlmostEqual(result.hits / result.events, result.hit_rate)
+
+    def test_ttl_expiry_is_absolute_from_insert(self):
+        df = pd.DataFrame({"timestamp_ms": [0, 500, 900, 1100, 1500], "query_hash": [1, 1, 1, 1, 1]})
+        result = CacheSimulator(Trace.from_frame(df)).run(PolicyConfig(0.0, 1, 0))
+
+        # Inserted at 0 (expires 1000): hits at 500/900, miss at 1100 re-inserts, hit at 1500.
+        self.assertEqual(3, result.hits)
+        self.assertEqual(2, result.admitted_inserts)
+
+    def test_admission_score_column_controls_inserts(self):
+        df = pd.DataFrame(
+            {
+                "timestamp_ms": [0, 10, 20, 30],
+                "query_hash": ["a", "a", "a", "a"],
+                "admission_score": [0.1, 0.9, 0.1, 0.1],
+                "latency_ms": [10.0, 10.0, 10.0, 10.0],
+            }
+        )
+        result = CacheSimulator(Trace.from_frame(df)).run(PolicyConfig(0.5, 60, 0))
+
+        self.assertEqual(2, result.hits)
+        self.assertAlmostEqual(20.0, result.search_cost_saved_ms)
+
+    def test_capacity_bounds_mean_occupancy(self):
+        policy = PolicyConfig(0.0, 300, 0)
+        unbounded = CacheSimulator(self.trace).run(policy)
+        bounded = CacheSimulator(self.trace, capacity=50).run(policy)
+
+        self.assertGreater(unbounded.mean_occupancy, 50)
+        self.assertLessEqual(bounded.mean_occupancy, 50)
+        self.assertLess(bounded.hit_rate, unbounded.hit_rate)
+        self.assertTrue(np.isinf(unbounded.characteristic_time_ms))
+
+    def test_eviction_priority_retains_entries_under_pressure(self):
+        simulator = CacheSimulator(self.trace, capacity=50)
+        policies = [PolicyConfig(0.0, 300, 0), PolicyConfig(0.0, 300, 2)]
+        actions = (self.trace.query_hash % 2).astype(np.int64)
+        result = simulator.run(policies, actions=actions)
+
+        self.assertLessEqual(result.mean_occupancy, 50)
+        self.assertGreater(result.hit_rate_by_action[1], result.hit_rate_by_action[0])
+
+    def test_run_model_uses_predicted_actions(self):
+        simulator = CacheSimulator(self.trace)
+        default = simulator.run_model(_ConstantModel(0))
+        aggressive = simulator.run_model(_ConstantModel(1))
+
+        # Heuristic aggressive policy: longer TTL and lower admission threshold.
+        self.assertGreater(aggressive.hit_rate, default.hit_rate)
+        self.assertEqual(default.hits, simulator.run(PolicyConfig(0.1, 60, 0)).hits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from decision_cache import DecisionCache
+from policy_engine import PolicyConfig
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _config(ttl):
+    return PolicyConfig(admission_threshold=0.1, ttl_seconds=ttl, eviction_priority=0)
+
+
+class TestDecisionCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "decisions.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_fresh_stale_and_expired_entries(self):
+        cache = DecisionCache(ttl_seconds=60, max_stale_seconds=100, clock=self.clock)
+        cache.put("a", _config(120))
+
+        self.assertEqual((_config(120), True), cache.lookup("a"))
+        self.clock.now += 90
+        self.assertEqual((_config(120), False), cache.lookup("a"))
+        self.clock.now += 100
+        self.assertEqual((None, False), cache.lookup("a"))
+        self.assertEqual((None, False), cache.lookup("b"))
+
+        stats = cache.stats()
+        self.assertEqual(
+            (1.0, 1.0, 2.0, 1.0), (stats["hits"], stats["stale_hits"], stats["misses"], stats["expirations"])
+        )
+        self.assertEqual(0.0, stats["entries"])
+        self.assertAlmostEqual(0.5, stats["hit_rate"])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = DecisionCache(max_entries=2, clock=self.clock)
+        cache.put("a", _config(30))
+        cache.put("b", _config(60))
+        cache.lookup("a")
+        cache.put("c", _config(90))
+
+        self.assertIsNone(cache.lookup("b")[0])
+        self.assertEqual(_config(30), cache.lookup("a")[0])
+        self.assertEqual(1.0, cache.stats()["evictions"])
+        self.assertEqual(2, len(cache))
+
+    def test_entries_survive_a_restart(self):
+        cache = DecisionCache(ttl_seconds=60, max_stale_seconds=100, path=self.path, clock=self.clock)
+        cache.put("old", _config(30))
+        self.clock.now += 150
+        cache.put("new", _config(60))
+        cache.flush()
+
+        self.clock.now += 20  # "old" is now past its stale window
+        restored = DecisionCache(ttl_seconds=60, max_stale_seconds=100, path=self.path, clock=self.clock)
+        self.assertEqual(1, restored.load())
+        self.assertEqual((_config(60), True), restored.lookup("new"))
+        self.assertIsNone(restored.lookup("old")[0])
+
+    def test_put_saves_periodically(self):
+        cache = DecisionCache(path=self.path, save_interval_seconds=30, clock=self.clock)
+        cache.put("a", _config(30))
+        self.assertFalse(os.path.exists(self.path))
+        self.clock.now += 30
+        cache.put("b", _config(60))
+        self.assertEqual(2, DecisionCache(path=self.path, clock=self.clock).load())
+
+    def test_nearest_returns_fresh_entries_within_radius(self):
+        cache = DecisionCache(max_entries=3, ttl_seconds=60, clock=self.clock)
+        cache.put("stale", _config(30), np.array([0.0, 0.1]))
+        self.clock.now += 61
+        cache.put("far", _config(60), np.array([3.0, 0.0]))
+        cache.put("b", _config(90), np.array([0.0, 0.6]))
+        cache.put("a", _config(120), np.array([0.3, 0.0]))  # evicts "stale"
+
+        neighbors = cache.nearest(np.zeros(2), radius=1.0, k=3)
+        self.assertEqual([_config(120), _config(90)], [config for config, _ in neighbors])
+        np.testing.assert_allclose([0.3, 0.6], [distance for _, distance in neighbors])
+        self.assertEqual([_config(120)], [config for config, _ in cache.nearest(np.zeros(2), radius=1.0)])
+        self.assertEqual([], cache.nearest(np.array([10.0, 10.0]), radius=1.0))
+
+        self.clock.now += 60
+        self.assertEqual([], cache.nearest(np.zeros(2), radius=1.0))
+        self.assertEqual(2.0, cache.stats()["neighbor_hits"])
+
+    def test_vectors_survive_a_restart(self):
+        cache = DecisionCache(path=self.path, clock=self.clock)
+        cache.put("a", _config(120), np.array([1.0, 2.0]))
+        cache.put("b", _config(60))
+        cache.save()
+
+        restored = DecisionCache(path=self.path, clock=self.clock)
+        restored.load()
+        self.assertEqual([(_config(120), 0.0)], restored.nearest(np.array([1.0, 2.0]), radius=0.5))
+
+    def test_unreadable_file_is_ignored(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        cache = DecisionCache(path=self.path, clock=self.clock)
+        with self.assertLogs("decision_cache", level="ERROR"):
+            self.assertEqual(0, cache.load())
+        self.assertEqual(0, len(cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -46,6 +46,66 @@ class FeatureEngineeringTests(unittest.TestCase):
         self.assertAlmostEqual(features.hit_rate, 0.5, places=6)
         self.assertEqual(features.revisit_interval_ms, 500.0)
 
+    def test_record_batch_matches_sequential_records(self):
+        ids = [7, 3, 7, 9, 3, 7]
+        hits = [True, False, False, True, True, True]
+        timestamps = [100, 110, 120, 130, 140, 150]
+
+        sequential = QueryHistory()
+        for query_id, hit, ts in zip(ids, hits, timestamps):
+            sequential.record(query_id, hit, timestamp_ms=ts)
+        batched = QueryHistory()
+        batched.record_batch(ids, hits, timestamps)
+
+        for query_id in (3, 7, 9):
+            self.assertEqual(
+                sequential.features(query_id, timestamp_ms=200), batched.features(query_id, timestamp_ms=200)
+            )
+        self.assertEqual(list(sequential._entries), list(batched._entries))
+
+    def test_record_batch_evicts_oldest(self):
+        history = QueryHistory(max_entries=2)
+        history.record_batch([1, 2, 3], [True, True, True], [10, 20, 30])
+
+        self.assertEqual(2, len(history._entries))
+        self.assertEqual(-1.0, history.features(1).revisit_interval_ms)
+
+    def test_ingest_query_batch_samples_features_before_update(self):
+        engineer = FeatureEngineer()
+        engineer.record_query(42, hit=True, timestamp_ms=1000)
+
+        samples = engineer.ingest_query_batch(
+            query_ids=[42, 43],
+            top_k=[10, 5],
+            filter_types=[1, 99],
+            norms=[2.0, 1.0],
+            hits=[False, False],
+            timestamps_ms=[1500, 1600],
+            sample_rate=1.0,
+        )
+
+        self.assertEqual(2, len(samples))
+        self.assertEqual(1.0, samples[0]["hit_rate"])
+        self.assertEqual(500.0, samples[0]["revisit_interval_ms"])
+        self.assertEqual(FILTER_TYPE_ENCODING["tag"], samples[0]["filter_type"])
+        self.assertEqual(FILTER_TYPE_ENCODING["unknown"], samples[1]["filter_type"])
+        self.assertAlmostEqual(0.5, engineer.extract_history_features(42, timestamp_ms=1500).hit_rate)
+
+    def test_query_history_is_kept_per_tenant(self):
+        engineer = FeatureEngineer(max_entries_per_tenant=2)
+        engineer.ingest_query_batch([1], [10], [0], [1.0], [True], [1000], tenant_id="quiet")
+        # A busy tenant fills its own history, and shares query 1's hash with different outcomes.
+        engineer.ingest_query_batch(
+            [1, 2, 3, 4], [10] * 4, [0] * 4, [1.0] * 4, [False] * 4, [2000] * 4, tenant_id="busy"
+        )
+
+        quiet = engineer.extract_history_features(1, timestamp_ms=3000, tenant_id="quiet")
+        self.assertEqual(1.0, quiet.hit_rate)
+        self.assertEqual(2000.0, quiet.revisit_interval_ms)
+        self.assertEqual(-1.0, engineer.extract_history_features(1, tenant_id="busy").revisit_interval_ms)
+        self.assertEqual(-1.0, engineer.extract_history_features(4, tenant_id="quiet").revisit_interval_ms)
+        self.assertEqual(0.0, engineer.extract_history_features(4, timestamp_ms=3000, tenant_id="busy").hit_rate)
+
 
 if __name__ == "__main__":
     unittest.main()
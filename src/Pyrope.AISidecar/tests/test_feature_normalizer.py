@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from sklearn.linear_model import LogisticRegression
+from skl2onnx import to_onnx
+
+from feature_normalizer import OnlineNormalizer
+
+
+def _raw_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        [
+            rng.lognormal(6.0, 1.5, n),  # qps
+            rng.uniform(0.0, 1.0, n),  # miss_rate
+            rng.lognormal(2.0, 1.0, n),  # latency_p99_ms
+            rng.uniform(0.0, 100.0, n),  # cpu_utilization
+        ]
+    ).astype(np.float32)
+
+
+class TestOnlineNormalizer(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.X = _raw_features(500)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_streaming_updates_match_batch_statistics(self):
+        normalizer = OnlineNormalizer()
+        for batch in np.array_split(self.X, 13):
+            normalizer.update(batch)
+
+        pre = self.X.astype(np.float64).copy()
+        pre[:, [0, 2]] = np.log1p(pre[:, [0, 2]])
+        np.testing.assert_allclose(pre.mean(axis=0), normalizer.mean, rtol=1e-5)
+        np.testing.assert_allclose(pre.std(axis=0, ddof=1), normalizer.std, rtol=1e-5)
+
+        transformed = normalizer.transform(self.X)
+        np.testing.assert_allclose(np.zeros(4), transformed.mean(axis=0), atol=1e-4)
+        np.testing.assert_allclose(np.ones(4), transformed.std(axis=0, ddof=1), atol=1e-3)
+
+    def test_constant_column_does_not_divide_by_zero(self):
+        X = self.X.copy()
+        X[:, 3] = 50.0
+        transformed = OnlineNormalizer.fit(X).transform(X)
+
+        self.assertTrue(np.isfinite(transformed).all())
+        np.testing.assert_allclose(0.0, transformed[:, 3], atol=1e-3)
+
+    def test_onnx_graph_matches_transform(self):
+        normalizer = OnlineNormalizer.fit(self.X)
+        model = normalizer.to_onnx("x", "y")
+        onnx.checker.check_model(model)
+
+        sess = ort.InferenceSession(model.SerializeToString(), providers=["CPUExecutionProvider"])
+        (out,) = sess.run(None, {"x": self.X})
+        np.testing.assert_allclose(normalizer.transform(self.X), out, atol=1e-5)
+
+    def test_prepend_keeps_raw_input_and_predictions(self):
+        normalizer = OnlineNormalizer.fit(self.X)
+        normalized = normalizer.transform(self.X)
+        y = (normalized[:, 1] + normalized[:, 2] > 0).astype(np.int64)
+        clf = LogisticRegression().fit(normalized, y)
+        model = to_onnx(clf, normalized[:1], options={id(clf): {"zipmap": False}})
+
+        merged = normalizer.prepend_to(model)
+        onnx.checker.check_model(merged)
+
+        sess = ort.InferenceSession(merged.SerializeToString(), providers=["CPUExecutionProvider"])
+        self.assertEqual(model.graph.input[0].name, sess.get_inputs()[0].name)
+        labels, _ = sess.run(None, {sess.get_inputs()[0].name: self.X})
+        np.testing.assert_array_equal(clf.predict(normalized), labels)
+
+    def test_save_and_load_round_trip(self):
+        normalizer = OnlineNormalizer.fit(self.X)
+        path = os.path.join(self.test_dir, "normalizer.json")
+        normalizer.save(path)
+
+        restored = OnlineNormalizer.load(path)
+
+        self.assertEqual(normalizer.count, restored.count)
+        np.testing.assert_array_equal(normalizer.transform(self.X), restored.transform(self.X))
+        self.assertIsNone(OnlineNormalizer.load(os.path.join(self.test_dir, "missing.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
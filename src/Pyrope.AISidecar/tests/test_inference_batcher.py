@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from inference_batcher import MicroBatcher
+
+
+class _CountingModel:
+    """Labels a row by its first column and records the size of every predict() call."""
+
+    def __init__(self, delay_s=0.0):
+        self.delay_s = delay_s
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def predict(self, features):
+        with self._lock:
+            self.calls.append(len(features))
+        time.sleep(self.delay_s)
+        return features[:, 0].astype(np.int64)
+
+
+class _FailingModel:
+    def predict(self, features):
+        raise RuntimeError("boom")
+
+
+def _submit_concurrently(batcher, model, n):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = batcher.submit(model, np.array([i, 0.0, 0.0, 0.0]), timeout=5.0)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batcher = MicroBatcher(max_batch_size=16, max_wait_ms=20.0)
+
+    def tearDown(self):
+        self.batcher.stop()
+
+    def test_concurrent_rows_share_model_calls_and_get_their_own_labels(self):
+        model = _CountingModel()
+
+        results = _submit_concurrently(self.batcher, model, 32)
+
+        self.assertEqual(list(range(32)), results)
+        self.assertEqual(32, sum(model.calls))
+        self.assertLess(len(model.calls), 32)
+        self.assertLessEqual(max(model.calls), 16)
+
+    def test_rows_for_different_models_are_scored_separately(self):
+        first, second = _CountingModel(), _CountingModel()
+        futures = [self.batcher.submit_async(first if i % 2 else second, np.array([i, 0, 0, 0])) for i in range(6)]
+
+        self.assertEqual(list(range(6)), [f.result(timeout=5.0) for f in futures])
+        self.assertEqual(3, sum(first.calls))
+        self.assertEqual(3, sum(second.calls))
+
+    def test_model_errors_propagate_to_every_caller(self):
+        futures = [self.batcher.submit_async(_FailingModel(), np.zeros(4)) for _ in range(3)]
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5.0)
+
+    def test_lone_request_is_scored_without_waiting_for_the_window(self):
+        batcher = MicroBatcher(max_batch_size=16, max_wait_ms=2000.0)
+        model = _CountingModel()
+        try:
+            for i in range(3):
+                started = time.perf_counter()
+                self.assertEqual(i, batcher.submit(model, np.array([i, 0, 0, 0]), timeout=5.0))
+                self.assertLess(time.perf_counter() - started, 0.5)
+        finally:
+            batcher.stop()
+        self.assertEqual([1, 1, 1], model.calls)
+
+    def test_rows_arriving_while_a_batch_is_scored_are_coalesced(self):
+        model = _CountingModel(delay_s=0.1)
+        first = self.batcher.submit_async(model, np.array([0, 0, 0, 0]))
+        time.sleep(0.02)  # the lone first row is already being scored
+        rest = [self.batcher.submit_async(model, np.array([i, 0, 0, 0])) for i in range(1, 6)]
+
+        self.assertEqual(list(range(6)), [f.result(timeout=5.0) for f in [first] + rest])
+        self.assertEqual([1, 5], model.calls)
+
+    def test_stats_report_batch_size_and_queue_wait(self):
+        _submit_concurrently(self.batcher, _CountingModel(), 8)
+        stats = self.batcher.stats()
+
+        self.assertEqual(8.0, stats["requests"])
+        self.assertGreaterEqual(stats["batch_size_max"], stats["batch_size_mean"])
+        self.assertGreater(stats["queue_wait_p99_ms"], 0.0)
+        # The wait window bounds queueing delay (with generous slack for a loaded test host).
+        self.assertLess(stats["queue_wait_p99_ms"], 1000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
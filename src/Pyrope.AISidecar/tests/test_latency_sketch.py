@@ -0,0 +1,61 @@
+import math
+import unittest
+
+import numpy as np
+
+from latency_sketch import BernoulliSPRT, LatencySketch, P2Quantile
+
+
+class TestP2Quantile(unittest.TestCase):
+    def test_tracks_heavy_tailed_quantiles(self):
+        samples = np.random.default_rng(0).lognormal(3.0, 1.0, 20_000)
+        for q in (0.5, 0.9, 0.99):
+            with self.subTest(q=q):
+                estimator = P2Quantile(q)
+                for x in samples:
+                    estimator.update(x)
+                exact = np.percentile(samples, q * 100)
+                self.assertAlmostEqual(exact, estimator.value(), delta=0.05 * exact)
+
+    def test_small_counts_are_exact(self):
+        estimator = P2Quantile(0.5)
+        self.assertTrue(math.isnan(estimator.value()))
+        for x in (30.0, 10.0, 20.0):
+            estimator.update(x)
+        self.assertEqual(20.0, estimator.value())
+
+    def test_rejects_invalid_quantile(self):
+        with self.assertRaises(ValueError):
+            P2Quantile(1.0)
+
+
+class TestLatencySketch(unittest.TestCase):
+    def test_summary_fields(self):
+        sketch = LatencySketch()
+        for x in range(1, 101):
+            sketch.update(float(x))
+        summary = sketch.to_dict()
+
+        self.assertEqual(100.0, summary["count"])
+        self.assertAlmostEqual(50.5, summary["mean"])
+        self.assertEqual(100.0, summary["max"])
+        self.assertAlmostEqual(50.5, summary["p50"], delta=2.0)
+        self.assertAlmostEqual(90.0, summary["p90"], delta=2.0)
+
+
+class TestBernoulliSPRT(unittest.TestCase):
+    def test_sustained_exceedances_accept_degradation(self):
+        sprt = BernoulliSPRT(p0=0.1, p1=0.4, alpha=0.01, beta=0.1)
+        decisions = [sprt.update(True) for _ in range(4)]
+        self.assertEqual([False, False, False, True], decisions)
+
+    def test_healthy_stream_restarts_instead_of_drifting(self):
+        sprt = BernoulliSPRT(p0=0.1, p1=0.4)
+        for _ in range(1000):
+            self.assertFalse(sprt.update(False))
+        self.assertGreater(sprt.llr, sprt.lower)
+        self.assertLessEqual(sprt.llr, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
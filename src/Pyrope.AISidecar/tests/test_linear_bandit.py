@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bandit_engine import ContextualBanditEngine, create_bandit_engine
+from linear_bandit import LinearBanditEngine, context_vector
+
+
+def _expected_rewards(features):
+    # Aggressive (arm 1) pays off when the miss rate is high.
+    miss_rate = features[0, 1]
+    return np.array([0.3 - 0.5 * miss_rate, miss_rate - 0.25])
+
+
+class TestLinearBanditEngine(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _engine(self, algorithm):
+        return LinearBanditEngine(algorithm, model_path=os.path.join(self.test_dir, f"{algorithm}.npz"), seed=1)
+
+    def _context(self):
+        return np.array(
+            [[self.rng.lognormal(5, 1), self.rng.beta(2, 3), self.rng.lognormal(3, 0.5), self.rng.uniform(0, 100)]]
+        )
+
+    def test_sherman_morrison_matches_direct_inverse(self):
+        engine = self._engine("linucb")
+        contexts = [self._context() for _ in range(20)]
+        for features in contexts:
+            engine.update(features, 1, 0.5, tenant_id="t")
+
+        x = context_vector(np.vstack(contexts))
+        expected = np.linalg.inv(np.eye(5) + x.T @ x)
+        np.testing.assert_allclose(expected, engine.state.get("t", "a_inv")[1], rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(np.eye(5), engine.state.get("t", "a_inv")[0])
+
+    def test_both_algorithms_learn_the_contextual_best_arm(self):
+        for algorithm in ("linucb", "thompson"):
+            with self.subTest(algorithm=algorithm):
+                engine = self._engine(algorithm)
+                for _ in range(1500):
+                    features = self._context()
+                    action = engine.select_action(features, tenant_id="t")
+                    reward = _expected_rewards(features)[action] + self.rng.normal(0, 0.1)
+                    engine.update(features, action, reward, tenant_id="t")
+
+                high, low = np.array([[100.0, 0.9, 20.0, 50.0]]), np.array([[100.0, 0.05, 20.0, 50.0]])
+                self.assertEqual(1, int(np.argmax(engine.arm_estimates(high, "t"))))
+                self.assertEqual(0, int(np.argmax(engine.arm_estimates(low, "t"))))
+
+    def test_linucb_regret_beats_epsilon_greedy(self):
+        def regret(engine):
+            total = 0.0
+            for _ in range(1500):
+                features = self._context()
+                action = engine.select_action(features, tenant_id="t")
+                expected = _expected_rewards(features)
+                total += expected.max() - expected[action]
+                engine.update(features, action, expected[action] + self.rng.normal(0, 0.1), tenant_id="t")
+            return total
+
+        np.random.seed(0)
+        greedy = ContextualBanditEngine(model_path=os.path.join(self.test_dir, "greedy.npz"))
+        self.assertLess(regret(self._engine("linucb")), 0.5 * regret(greedy))
+
+    def test_batched_select_scores_each_tenant_separately(self):
+        engine = self._engine("linucb")
+        features = np.array([[100.0, 0.5, 20.0, 50.0]])
+        for _ in range(100):
+            engine.update(features, 0, 1.0, tenant_id="a")
+            engine.update(features, 1, 0.0, tenant_id="a")
+            engine.update(features, 0, 0.0, tenant_id="b")
+            engine.update(features, 1, 1.0, tenant_id="b")
+
+        actions = engine.select_batch(np.vstack([features, features]), ["a", "b"])
+
+        self.assertEqual([0, 1], actions.tolist())
+
+    def test_propensities(self):
+        features = np.array([[100.0, 0.5, 20.0, 50.0]])
+        linucb = self._engine("linucb")
+        self.assertEqual(1.0, linucb.select_with_propensity(features, tenant_id="t")[1])
+
+        thompson = self._engine("thompson")
+        for _ in range(200):
+            thompson.update(features, 1, 1.0, tenant_id="t")
+            thompson.update(features, 0, 0.0, tenant_id="t")
+        action, propensity = thompson.select_with_propensity(features, tenant_id="t")
+        self.assertEqual(1, action)
+        self.assertGreater(propensity, 0.95)
+
+        fresh = self._engine("thompson")
+        _, propensities = fresh.select_batch(np.vstack([features] * 20), ["u"] * 20, return_propensity=True)
+        self.assertTrue(np.all((propensities > 0.3) & (propensities < 0.7)))
+
+    def test_state_persists(self):
+        engine = self._engine("thompson")
+        engine.update(np.array([[100.0, 0.5, 20.0, 50.0]]), 1, 1.0, tenant_id="a")
+        engine.save()
+
+        restored = self._engine("thompson")
+
+        self.assertTrue(restored.initialized)
+        np.testing.assert_allclose(engine.state.get("a", "b"), restored.state.get("a", "b"))
+
+    def test_factory_selects_engine(self):
+        path = os.path.join(self.test_dir, "x.npz")
+        self.assertIsInstance(create_bandit_engine("thompson", model_path=path), LinearBanditEngine)
+        self.assertIsInstance(create_bandit_engine("epsilon_greedy", model_path=path), ContextualBanditEngine)
+        with self.assertRaises(ValueError):
+            create_bandit_engine("softmax")
+
+    def test_exploration_is_reported_per_engine_kind(self):
+        path = os.path.join(self.test_dir, "x.npz")
+        self.assertEqual(
+            {"linucb_alpha": 2.0}, create_bandit_engine("linucb", model_path=path, alpha=2.0).exploration()
+        )
+        self.assertEqual(
+            {"thompson_posterior_scale": 0.5}, create_bandit_engine("thompson", model_path=path).exploration()
+        )
+        self.assertEqual(
+            {"epsilon_greedy_epsilon": 0.2},
+            create_bandit_engine("epsilon_greedy", model_path=path, epsilon=0.2).exploration(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
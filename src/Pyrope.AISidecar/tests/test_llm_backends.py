@@ -0,0 +1,112 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import requests
+
+from benchmark_llm import main as benchmark_main
+from llm_backends import GeminiBackend, OpenAICompatibleBackend, create_backend
+from llm_policy_engine import LLMPolicyEngine, SystemMetrics
+from llm_standin import LatencyModel, StandInLLMServer
+from llm_worker import LLMWorker
+from policy_engine import HeuristicPolicyEngine
+
+
+class TestStandInServer(unittest.TestCase):
+    def test_canned_responses_over_openai_protocol(self):
+        with StandInLLMServer(responses=["first", "second"]) as server:
+            backend = OpenAICompatibleBackend(server.url, "stand-in", api_key="secret")
+
+            responses = [asyncio.run(backend.generate("Hello")) for _ in range(3)]
+
+        self.assertEqual(["first", "second", "first"], [r.text for r in responses])
+        # The stand-in reports usage like a real provider.
+        self.assertEqual((1, 1), (responses[0].input_tokens, responses[0].output_tokens))
+        self.assertEqual(3, server.stats["requests"])
+
+    def test_injected_errors_raise(self):
+        with StandInLLMServer(error_rate=1.0, error_status=429) as server:
+            backend = OpenAICompatibleBackend(server.url, "stand-in")
+            with self.assertRaises(requests.HTTPError):
+                asyncio.run(backend.generate("Hello"))
+        self.assertEqual(1, server.stats["errors"])
+
+    def test_default_answers_fit_policy_prompts(self):
+        engine = LLMPolicyEngine(llm_worker=MagicMock(), fallback=HeuristicPolicyEngine())
+        metrics = [SystemMetrics(qps=100.0 * i) for i in range(1, 4)]
+        with StandInLLMServer() as server:
+            backend = OpenAICompatibleBackend(server.url, "stand-in")
+            single = asyncio.run(backend.generate(engine._build_prompt(metrics[0])))
+            batch = asyncio.run(backend.generate(engine._build_batch_prompt(metrics)))
+
+        self.assertIsNotNone(engine._parse_response(single.text))
+        self.assertTrue(all(engine._parse_batch_response(batch.text, 3)))
+
+    def test_latency_models(self):
+        rng = np.random.default_rng(0)
+        self.assertEqual(0.05, LatencyModel("fixed:50").sample_seconds(rng))
+        samples = [LatencyModel("uniform:20,40").sample_seconds(rng) for _ in range(100)]
+        self.assertTrue(all(0.02 <= s <= 0.04 for s in samples))
+        lognormal = [LatencyModel("lognormal:100,0.5").sample_seconds(rng) for _ in range(2000)]
+        self.assertAlmostEqual(0.1, float(np.median(lognormal)), delta=0.01)
+        for spec in ("gamma:1", "fixed", "uniform:1"):
+            with self.assertRaises(ValueError):
+                LatencyModel(spec)
+
+
+class TestBackendSelection(unittest.TestCase):
+    def test_openai_backend_from_env(self):
+        env = {"PYROPE_LLM_BACKEND": "openai", "PYROPE_LLM_BASE_URL": "http://llm:8000/v1/", "PYROPE_LLM_MODEL": "m"}
+        with patch.dict(os.environ, env, clear=True):
+            backend = create_backend()
+        self.assertIsInstance(backend, OpenAICompatibleBackend)
+        self.assertEqual("http://llm:8000/v1/chat/completions", backend.url)
+        self.assertEqual("m", backend.model_name)
+
+    def test_gemini_backend_needs_a_key(self):
+        with patch.dict(os.environ, {}, clear=True), patch("llm_backends.genai"):
+            self.assertIsNone(create_backend())
+            self.assertIsInstance(create_backend(api_key="k"), GeminiBackend)
+        with self.assertRaises(ValueError):
+            create_backend("unknown")
+
+
+class TestWorkerThroughStandIn(unittest.TestCase):
+    def test_worker_serves_tasks_through_http_backend(self):
+        async def run_test(url):
+            worker = LLMWorker(backend=OpenAICompatibleBackend(url, "stand-in"), concurrency=2)
+            await worker.start()
+            results = []
+
+            async def callback(text):
+                results.append(text)
+
+            for i in range(4):
+                await worker.submit_task(f"prompt {i}", callback)
+            await worker.queue.join()
+            await worker.stop()
+            return results, worker.get_stats()
+
+        with StandInLLMServer(latency="fixed:20", responses=["ok"]) as server:
+            results, stats = asyncio.run(run_test(server.url))
+
+        self.assertEqual(["ok"] * 4, results)
+        self.assertEqual(4, stats["requests_succeeded"])
+        self.assertEqual(2, stats["max_in_flight"])
+
+    def test_benchmark_runs_all_scenarios(self):
+        argv = ["--tenants", "3", "--steps", "4", "--interval-ms", "0", "--latency", "fixed:1"]
+        with patch("builtins.print"):
+            results = benchmark_main(argv)
+
+        self.assertEqual(3, len(results))
+        for result in results.values():
+            self.assertEqual(12, result["reports"])
+            self.assertEqual(0, result["llm_failed"])
+            self.assertGreater(result["llm_requests"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
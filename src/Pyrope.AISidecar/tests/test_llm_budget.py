@@ -0,0 +1,125 @@
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from llm_budget import BudgetAllocator, estimate_tokens
+
+DAY = 86400.0
+JUNE = datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp()  # a 30-day month
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestEstimateTokens(unittest.TestCase):
+    def test_counts_words_numbers_and_punctuation(self):
+        self.assertEqual(0, estimate_tokens(""))
+        self.assertEqual(0, estimate_tokens(None))
+        self.assertEqual(2, estimate_tokens("Hello world"))
+        # Long words and digit runs split; every JSON mark is a token.
+        self.assertEqual(2, estimate_tokens("tokenization"))
+        self.assertEqual(2, estimate_tokens("123456"))
+        self.assertEqual(10, estimate_tokens('{"ttl_seconds": 60}'))
+
+
+class TestBudgetAllocator(unittest.TestCase):
+    def _spend(self, allocator, cost=100.0, value=1.0, limit=10000):
+        spent = 0
+        for _ in range(limit):
+            if not allocator.admit(cost, value):
+                break
+            allocator.charge(cost, cost)
+            spent += cost
+        return spent
+
+    def test_burst_is_capped_at_a_day_of_pace(self):
+        clock = FakeClock(JUNE)
+        allocator = BudgetAllocator(30_000, clock=clock, reserve_fraction=0.0)
+
+        self.assertAlmostEqual(1000, self._spend(allocator), delta=100)
+        clock.now += DAY / 2
+        self.assertAlmostEqual(500, self._spend(allocator), delta=100)
+
+    def test_underspend_rolls_forward(self):
+        clock = FakeClock(JUNE + 15 * DAY)
+        allocator = BudgetAllocator(30_000, clock=clock, reserve_fraction=0.0)
+        # Nothing spent in the first half: the rest of the month paces 30k over 15 days.
+        self.assertAlmostEqual(2000, self._spend(allocator), delta=100)
+
+    def test_low_value_requests_keep_a_reserve_for_high_value_ones(self):
+        clock = FakeClock(JUNE)
+        allocator = BudgetAllocator(30_000, clock=clock)
+        for value in np.linspace(0.0, 10.0, 100):
+            if allocator.admit(100.0, value):
+                allocator.charge(0, 100.0)
+
+        allocator.charge(500)  # bucket at half of its day of pace
+        self.assertFalse(allocator.admit(100.0, 1.0))
+        self.assertTrue(allocator.admit(100.0, 9.5))
+        self.assertGreater(allocator.stats["throttled"], 0)
+
+    def test_admissions_reserve_before_any_charge(self):
+        clock = FakeClock(JUNE)
+        allocator = BudgetAllocator(30_000, clock=clock, reserve_fraction=0.0)
+
+        # A burst admitted before the first call completes cannot share one day's bucket.
+        admitted = sum(allocator.admit(100.0, 1.0) for _ in range(50))
+        self.assertEqual(10, admitted)
+        self.assertEqual(1000, allocator.reserved)
+
+        # Settling below the estimate refunds the difference; releasing frees the rest.
+        allocator.charge(40.0, 100.0)
+        allocator.charge(0, 100.0)
+        self.assertEqual(40.0, allocator.spent)
+        self.assertEqual(800, allocator.reserved)
+        self.assertEqual(1, sum(allocator.admit(100.0, 1.0) for _ in range(5)))
+
+    def test_reservations_count_against_the_monthly_cap(self):
+        clock = FakeClock(JUNE + 29 * DAY)  # last day: the bucket holds the whole remainder
+        allocator = BudgetAllocator(1000, clock=clock, reserve_fraction=0.0)
+
+        self.assertEqual(10, sum(allocator.admit(100.0, 1.0) for _ in range(20)))
+        self.assertEqual(0, allocator.remaining())
+        self.assertGreater(allocator.stats["exhausted"], 0)
+
+    def test_month_rollover_resets_spend(self):
+        clock = FakeClock(JUNE + 29 * DAY)
+        allocator = BudgetAllocator(1000, clock=clock)
+        allocator.charge(1000)
+        self.assertEqual(0, allocator.remaining())
+        self.assertFalse(allocator.admit(10.0, 100.0))
+        self.assertEqual(1, allocator.stats["exhausted"])
+
+        clock.now = JUNE + 30 * DAY  # July 1st
+        self.assertEqual(1000, allocator.remaining())
+        self.assertTrue(allocator.admit(10.0, 100.0))
+
+    def test_budget_lasts_the_month_and_goes_to_valuable_requests(self):
+        # Demand for ten days' worth of budget a day, arriving every 10 minutes all month.
+        clock = FakeClock(JUNE)
+        allocator = BudgetAllocator(30 * 144 * 100 / 3, clock=clock)
+        rng = np.random.default_rng(0)
+        admitted_values, all_values, last_day_admits = [], [], 0
+        for step in range(30 * 144):
+            clock.now = JUNE + step * 600.0
+            value = float(rng.lognormal(0.0, 1.0))
+            all_values.append(value)
+            if allocator.admit(100.0, value):
+                allocator.charge(100.0, 100.0)
+                admitted_values.append(value)
+                last_day_admits += step >= 29 * 144
+
+        self.assertLessEqual(allocator.spent, allocator.monthly_budget)
+        self.assertGreater(allocator.spent, 0.9 * allocator.monthly_budget)
+        self.assertGreater(last_day_admits, 0)
+        self.assertGreater(np.mean(admitted_values), 1.5 * np.mean(all_values))
+
+
+if __name__ == "__main__":
+    unittest.main()
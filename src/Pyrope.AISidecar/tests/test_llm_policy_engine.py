@@ -5,6 +5,8 @@ Red Phase: These tests define the expected behavior before implementation.
 """
 
 import asyncio
+import os
+import tempfile
 import unittest
 from unittest.mock import AsyncMock, MagicMock
 from dataclasses import dataclass
@@ -25,7 +27,7 @@ except ImportError:
         gpu_utilization: float = 0.0
 
 
-from policy_engine import HeuristicPolicyEngine
+from policy_engine import HeuristicPolicyEngine, PolicyConfig
 
 
 class TestLLMPolicyEnginePromptGeneration(unittest.TestCase):
@@ -144,7 +146,7 @@ class TestLLMPolicyEngineFallback(unittest.TestCase):
         async def run_test():
             callback_holder = {}
 
-            async def mock_submit(prompt, callback=None, priority=0):
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
                 callback_holder["cb"] = callback
                 return True
 
@@ -175,7 +177,7 @@ class TestLLMPolicyEngineFallback(unittest.TestCase):
         """Should fallback when LLM times out."""
 
         async def run_test():
-            async def slow_submit(prompt, callback=None, priority=0):
+            async def slow_submit(prompt, callback=None, priority=0, value=1.0):
                 await asyncio.sleep(10)  # Very slow
                 return True
 
@@ -207,7 +209,7 @@ class TestLLMPolicyEngineDecisionCaching(unittest.TestCase):
         async def run_test():
             call_count = 0
 
-            async def mock_submit(prompt, callback=None, priority=0):
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
                 nonlocal call_count
                 call_count += 1
                 if callback:
@@ -249,7 +251,7 @@ class TestLLMPolicyEngineDecisionCaching(unittest.TestCase):
         async def run_test():
             call_count = 0
 
-            async def mock_submit(prompt, callback=None, priority=0):
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
                 nonlocal call_count
                 call_count += 1
                 if callback:
@@ -275,6 +277,266 @@ class TestLLMPolicyEngineDecisionCaching(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_stale_decision_served_while_refreshing(self):
+        """An expired LLM decision is returned, not the heuristic, while its refresh is in flight."""
+
+        async def run_test():
+            callbacks = []
+
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
+                callbacks.append(callback)
+                return True
+
+            mock_worker = MagicMock()
+            mock_worker.submit_task = mock_submit
+            engine = LLMPolicyEngine(llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), cache_ttl_seconds=0.05)
+            metrics = SystemMetrics(miss_rate=0.3)
+
+            await engine.compute_policy(metrics)
+            await callbacks[0]('{"ttl_seconds": 120, "admission_threshold": 0.2, "eviction_priority": 1}')
+            await asyncio.sleep(0.1)
+
+            self.assertEqual(120, (await engine.compute_policy(metrics)).ttl_seconds)
+            self.assertEqual(120, (await engine.compute_policy(metrics)).ttl_seconds)
+            self.assertEqual(2, len(callbacks))  # one refresh, deduplicated
+            await callbacks[1]('{"ttl_seconds": 240, "admission_threshold": 0.2, "eviction_priority": 1}')
+            self.assertEqual(240, (await engine.compute_policy(metrics)).ttl_seconds)
+
+            stats = engine.cache_stats()
+            self.assertEqual((1.0, 2.0, 1.0), (stats["hits"], stats["stale_hits"], stats["misses"]))
+
+        asyncio.run(run_test())
+
+    def test_decisions_persist_across_restarts(self):
+        async def run_test(cache_path):
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
+                await callback('{"ttl_seconds": 120, "admission_threshold": 0.2, "eviction_priority": 1}')
+                return True
+
+            mock_worker = MagicMock()
+            mock_worker.submit_task = mock_submit
+            metrics = SystemMetrics(miss_rate=0.3)
+            engine = LLMPolicyEngine(llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), cache_path=cache_path)
+            await engine.compute_policy(metrics)
+            engine.save_cache()
+
+            mock_worker.submit_task = AsyncMock(return_value=False)
+            restarted = LLMPolicyEngine(llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), cache_path=cache_path)
+            self.assertEqual(120, (await restarted.compute_policy(metrics)).ttl_seconds)
+            mock_worker.submit_task.assert_not_called()
+
+        with tempfile.TemporaryDirectory() as test_dir:
+            asyncio.run(run_test(os.path.join(test_dir, "decisions.json")))
+
+
+class TestLLMPolicyEngineNeighborReuse(unittest.TestCase):
+    """Test reuse of decisions for nearby metric states."""
+
+    def setUp(self):
+        if LLMPolicyEngine is None:
+            self.skipTest("LLMPolicyEngine not implemented yet")
+
+    def _engine(self, prompts, **kwargs):
+        responses = iter(
+            [
+                '{"ttl_seconds": 100, "admission_threshold": 0.1, "eviction_priority": 0}',
+                '{"ttl_seconds": 300, "admission_threshold": 0.3, "eviction_priority": 2}',
+            ]
+        )
+
+        async def mock_submit(prompt, callback=None, priority=0, value=1.0):
+            prompts.append(prompt)
+            await callback(next(responses))
+            return True
+
+        mock_worker = MagicMock()
+        mock_worker.submit_task = mock_submit
+        return LLMPolicyEngine(llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), **kwargs)
+
+    def test_jitter_across_bucket_boundary_reuses_decision(self):
+        async def run_test():
+            prompts = []
+            engine = self._engine(prompts, neighbor_radius=1.0)
+            await engine.compute_policy(SystemMetrics(qps=99.0, miss_rate=0.249, latency_p99_ms=20.0))
+            jittered = SystemMetrics(qps=101.0, miss_rate=0.251, latency_p99_ms=20.0)
+            self.assertNotEqual(
+                engine._get_cache_key(SystemMetrics(qps=99.0, miss_rate=0.249, latency_p99_ms=20.0)),
+                engine._get_cache_key(jittered),
+            )
+
+            config = await engine.compute_policy(jittered)
+
+            self.assertEqual(1, len(prompts))
+            self.assertEqual(100, config.ttl_seconds)
+            # A genuinely different state still asks the LLM.
+            await engine.compute_policy(SystemMetrics(qps=1000.0, miss_rate=0.6, latency_p99_ms=80.0))
+            self.assertEqual(2, len(prompts))
+
+        asyncio.run(run_test())
+
+    def test_neighbors_are_interpolated_by_distance(self):
+        async def run_test():
+            prompts = []
+            engine = self._engine(prompts, neighbor_radius=4.0)
+            engine._set_cache(SystemMetrics(qps=100.0, miss_rate=0.24), PolicyConfig(0.1, 100, 0))
+            engine._set_cache(SystemMetrics(qps=100.0, miss_rate=0.44), PolicyConfig(0.3, 300, 2))
+
+            # Miss rate 0.29 is in neither seeded bucket, 1 and 3 units from the two decisions.
+            config = await engine.compute_policy(SystemMetrics(qps=100.0, miss_rate=0.29))
+
+            self.assertEqual([], prompts)
+            # A quarter of the way from the first decision to the second: weights 3/4 and 1/4.
+            self.assertEqual(150, config.ttl_seconds)
+            self.assertAlmostEqual(0.15, config.admission_threshold)
+            self.assertEqual(0, config.eviction_priority)
+
+        asyncio.run(run_test())
+
+    def test_zero_radius_requires_exact_key(self):
+        async def run_test():
+            prompts = []
+            engine = self._engine(prompts)
+            await engine.compute_policy(SystemMetrics(qps=99.0))
+            await engine.compute_policy(SystemMetrics(qps=101.0))
+            self.assertEqual(2, len(prompts))
+
+        asyncio.run(run_test())
+
+
+class TestLLMPolicyEngineCoalescing(unittest.TestCase):
+    """Test that concurrent cache misses share one batched prompt."""
+
+    def setUp(self):
+        if LLMPolicyEngine is None:
+            self.skipTest("LLMPolicyEngine not implemented yet")
+
+    def _engine(self, submitted, **kwargs):
+        async def mock_submit(prompt, callback=None, priority=0, value=1.0):
+            submitted.append((prompt, callback))
+            return True
+
+        mock_worker = MagicMock()
+        mock_worker.submit_task = mock_submit
+        return LLMPolicyEngine(llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), **kwargs)
+
+    def test_cache_misses_in_window_share_one_prompt(self):
+        async def run_test():
+            submitted = []
+            engine = self._engine(submitted, coalesce_window_ms=20)
+            metrics = [SystemMetrics(qps=100.0 * (i + 1), miss_rate=0.1 * (i + 1)) for i in range(3)]
+
+            for m in metrics:
+                await engine.compute_policy(m)
+            await engine.compute_policy(metrics[0])  # already pending: not sent twice
+            self.assertEqual([], submitted)
+            await asyncio.sleep(0.05)
+
+            self.assertEqual(1, len(submitted))
+            prompt, callback = submitted[0]
+            self.assertEqual(1, prompt.count("Your goal is to optimize"))
+            self.assertIn("3. QPS: 300.0", prompt)
+            self.assertIn("JSON array", prompt)
+
+            # Out of order, one value out of range, one entry missing.
+            await callback(
+                'Here you go: [{"id": 2, "ttl_seconds": 99999, "admission_threshold": 0.3, "eviction_priority": 1},'
+                ' {"id": 1, "ttl_seconds": 120, "admission_threshold": 0.2, "eviction_priority": 0}]'
+            )
+
+            self.assertEqual(120, (await engine.compute_policy(metrics[0])).ttl_seconds)
+            self.assertEqual(3600, (await engine.compute_policy(metrics[1])).ttl_seconds)
+            self.assertEqual(set(), engine._inflight_keys)
+            # The unanswered context is retried in the next batch.
+            await engine.compute_policy(metrics[2])
+            await engine.flush()
+            self.assertEqual(2, len(submitted))
+
+        asyncio.run(run_test())
+
+    def test_full_batch_is_sent_without_waiting(self):
+        async def run_test():
+            submitted = []
+            engine = self._engine(submitted, coalesce_window_ms=10_000, max_batch=2)
+
+            await engine.compute_policy(SystemMetrics(qps=100.0))
+            await engine.compute_policy(SystemMetrics(qps=200.0))
+            await asyncio.sleep(0.01)
+
+            self.assertEqual(1, len(submitted))
+            self.assertIn("2. QPS: 200.0", submitted[0][0])
+
+        asyncio.run(run_test())
+
+    def test_single_request_uses_single_prompt(self):
+        async def run_test():
+            submitted = []
+            engine = self._engine(submitted, coalesce_window_ms=10_000)
+            metrics = SystemMetrics(qps=100.0, miss_rate=0.3)
+
+            await engine.compute_policy(metrics)
+            await engine.flush()
+            prompt, callback = submitted[0]
+            self.assertEqual(engine._build_prompt(metrics), prompt)
+            await callback('{"ttl_seconds": 240, "admission_threshold": 0.2, "eviction_priority": 1}')
+
+            self.assertEqual(240, (await engine.compute_policy(metrics)).ttl_seconds)
+
+        asyncio.run(run_test())
+
+    def test_parse_batch_response(self):
+        engine = LLMPolicyEngine(llm_worker=MagicMock(), fallback=HeuristicPolicyEngine())
+        valid = '"ttl_seconds": 60, "admission_threshold": 0.1, "eviction_priority": 0'
+
+        configs = engine._parse_batch_response(f'[{{"id": 3, {valid}}}, {{{valid}}}, {{"id": 1}}]', 3)
+        self.assertEqual([60, None, 60], [c.ttl_seconds if c else None for c in configs])
+
+        self.assertEqual([None, None], engine._parse_batch_response("not JSON", 2))
+        self.assertEqual([None], engine._parse_batch_response("[{broken", 1))
+
+
+class TestLLMPolicyEngineRequestValue(unittest.TestCase):
+    """Test the expected value the engine attaches to LLM requests for budget allocation."""
+
+    def setUp(self):
+        if LLMPolicyEngine is None:
+            self.skipTest("LLMPolicyEngine not implemented yet")
+
+    def test_value_is_miss_cost_discounted_by_drift_since_last_decision(self):
+        engine = LLMPolicyEngine(llm_worker=MagicMock(), fallback=HeuristicPolicyEngine())
+        metrics = SystemMetrics(qps=1000.0, miss_rate=0.2, latency_p99_ms=50.0)
+        key = engine._get_cache_key(metrics)
+
+        # No decision yet: 200 misses/s at 50 ms cost 10 backend-seconds per second.
+        self.assertAlmostEqual(10.0, engine._request_value(key, metrics))
+        self.assertEqual(0.0, engine._request_value(key, SystemMetrics(qps=1000.0, miss_rate=0.0)))
+
+        engine._set_cache(metrics, PolicyConfig(0.1, 100, 0))
+        # Refreshing a decision for unchanged metrics is worth little; drifted metrics count fully.
+        self.assertAlmostEqual(1.0, engine._request_value(key, metrics))
+        drifted = SystemMetrics(qps=1000.0, miss_rate=0.26, latency_p99_ms=50.0)
+        self.assertAlmostEqual(13.0, engine._request_value(key, drifted))
+
+    def test_batch_value_is_sum_of_its_requests(self):
+        async def run_test():
+            values = []
+
+            async def mock_submit(prompt, callback=None, priority=0, value=1.0):
+                values.append(value)
+                return True
+
+            mock_worker = MagicMock()
+            mock_worker.submit_task = mock_submit
+            engine = LLMPolicyEngine(
+                llm_worker=mock_worker, fallback=HeuristicPolicyEngine(), coalesce_window_ms=10_000
+            )
+            await engine.compute_policy(SystemMetrics(qps=100.0, miss_rate=0.1, latency_p99_ms=100.0))
+            await engine.compute_policy(SystemMetrics(qps=200.0, miss_rate=0.5, latency_p99_ms=100.0))
+            await engine.flush()
+            self.assertEqual(1, len(values))
+            self.assertAlmostEqual(11.0, values[0])
+
+        asyncio.run(run_test())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,10 @@ import unittest
 from unittest.mock import MagicMock, patch, AsyncMock
 import asyncio
 import os
-from llm_worker import LLMWorker
+from datetime import datetime, timezone
+from llm_worker import PRIORITY_ADVISORY, PRIORITY_BULK, PRIORITY_POLICY, LLMWorker
+from llm_budget import BudgetAllocator
+from token_bucket import TokenBucket
 
 
 class TestLLMWorker(unittest.TestCase):
@@ -13,7 +16,7 @@ class TestLLMWorker(unittest.TestCase):
         self.patcher.start()
 
         # Mock genai.configure and GenerativeModel
-        self.genai_patcher = patch("llm_worker.genai")
+        self.genai_patcher = patch("llm_backends.genai")
         self.mock_genai = self.genai_patcher.start()
 
         self.mock_model = MagicMock()
@@ -61,6 +64,230 @@ class TestLLMWorker(unittest.TestCase):
     def test_process_task(self):
         asyncio.run(self.async_test_process_task())
 
+    async def async_test_failing_callback_is_answered_once(self):
+        worker = LLMWorker(api_key="test_key")
+        await worker.start()
+        answers = []
+
+        async def callback(text):
+            answers.append(text)
+            raise RuntimeError("consumer bug")
+
+        self.assertTrue(await worker.submit_task("Hello", callback))
+        await worker.queue.join()
+        await worker.stop()
+
+        # The call succeeded; the callback's own error neither fails it nor answers it again.
+        self.assertEqual(["Mocked Response"], answers)
+        self.assertEqual(1, worker.stats["requests_total"])
+        self.assertEqual(1, worker.stats["requests_succeeded"])
+        self.assertEqual(0, worker.stats["requests_failed"])
+
+    def test_failing_callback_is_answered_once(self):
+        asyncio.run(self.async_test_failing_callback_is_answered_once())
+
+    def _slow_model(self, delay, calls=None):
+        async def generate(prompt):
+            if calls is not None:
+                calls.append(prompt)
+            await asyncio.sleep(delay)
+            return self.mock_response
+
+        self.mock_model.generate_content_async = generate
+
+    async def async_test_concurrent_calls(self):
+        self._slow_model(0.2)
+        worker = LLMWorker(api_key="test_key", concurrency=4)
+        await worker.start()
+        done = []
+
+        async def callback(text):
+            done.append(text)
+
+        started = asyncio.get_running_loop().time()
+        for i in range(4):
+            self.assertTrue(await worker.submit_task(f"p{i}", callback))
+        await worker.queue.join()
+        elapsed = asyncio.get_running_loop().time() - started
+        await worker.stop()
+
+        self.assertEqual(4, len(done))
+        # Four 200 ms calls overlap instead of taking 800 ms back to back.
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(4, worker.get_stats()["max_in_flight"])
+
+    def test_concurrent_calls(self):
+        asyncio.run(self.async_test_concurrent_calls())
+
+    async def async_test_policy_refresh_overtakes_bulk_work(self):
+        calls = []
+        self._slow_model(0.05, calls)
+        worker = LLMWorker(api_key="test_key", concurrency=1)
+        await worker.start()
+
+        for i in range(3):
+            await worker.submit_task(f"bulk{i}", priority=PRIORITY_BULK)
+            await asyncio.sleep(0)  # let the consumer pick up bulk0
+        await worker.submit_task("advice", priority=PRIORITY_ADVISORY)
+        await worker.submit_task("policy", priority=PRIORITY_POLICY)
+        await worker.queue.join()
+        await worker.stop()
+
+        # bulk0 was already running; everything still queued is served by priority, FIFO within one.
+        self.assertEqual(["bulk0", "policy", "advice", "bulk1", "bulk2"], calls)
+
+    def test_policy_refresh_overtakes_bulk_work(self):
+        asyncio.run(self.async_test_policy_refresh_overtakes_bulk_work())
+
+    async def async_test_queue_limits_are_per_priority(self):
+        self._slow_model(0.05)
+        worker = LLMWorker(api_key="test_key", concurrency=1, queue_limits={PRIORITY_BULK: 2})
+        await worker.start()
+        rejected = []
+
+        async def callback(text):
+            if text is None:
+                rejected.append(text)
+
+        accepted = [await worker.submit_task(f"bulk{i}", priority=PRIORITY_BULK) for i in range(3)]
+        self.assertEqual([True, True, False], accepted)
+        self.assertEqual(2, worker.get_stats()[f"queued_p{PRIORITY_BULK}"])
+        # A full bulk queue does not block policy refreshes.
+        self.assertTrue(await worker.submit_task("policy", callback))
+        # Rejections answer the callback too.
+        self.assertFalse(await worker.submit_task("more", callback, priority=PRIORITY_BULK))
+        self.assertEqual([None], rejected)
+        await worker.stop()
+
+        self.assertEqual(2, worker.stats["requests_rejected_queue_full"])
+        # Stopping answers the still-queued policy refresh with None.
+        self.assertEqual([None, None], rejected)
+
+    def test_queue_limits_are_per_priority(self):
+        asyncio.run(self.async_test_queue_limits_are_per_priority())
+
+    async def async_test_rate_limited_tasks_are_deferred_not_slept_on(self):
+        calls = []
+        self._slow_model(0.0, calls)
+        worker = LLMWorker(api_key="test_key", concurrency=1)
+        worker._request_bucket = TokenBucket(capacity=1, rate=10.0)  # one request per 100 ms
+        await worker.start()
+        loop = asyncio.get_running_loop()
+        done = []
+
+        async def callback(text):
+            done.append(loop.time())
+
+        started = loop.time()
+        for i in range(3):
+            await worker.submit_task(f"p{i}", callback)
+        await worker.queue.join()
+
+        # The consumer is free again right away: two tasks wait on the timer heap, not in a sleep.
+        self.assertLess(loop.time() - started, 0.05)
+        self.assertEqual(2, worker.get_stats()["deferred"])
+        self.assertEqual(2, worker.stats["requests_rate_limited"])
+
+        await asyncio.sleep(0.3)
+        await worker.stop()
+        self.assertEqual(["p0", "p1", "p2"], calls)
+        gaps = [b - a for a, b in zip(done, done[1:])]
+        self.assertTrue(all(0.08 < gap < 0.15 for gap in gaps), gaps)
+
+    def test_rate_limited_tasks_are_deferred_not_slept_on(self):
+        asyncio.run(self.async_test_rate_limited_tasks_are_deferred_not_slept_on())
+
+    async def async_test_long_waits_are_dropped_and_stop_answers_deferred(self):
+        worker = LLMWorker(api_key="test_key", concurrency=1, max_defer_seconds=0.15)
+        worker._request_bucket = TokenBucket(capacity=1, rate=10.0)
+        await worker.start()
+        results = []
+
+        async def callback(text):
+            results.append(text)
+
+        for i in range(3):
+            await worker.submit_task(f"p{i}", callback)
+        await worker.queue.join()
+        self.assertEqual(1, worker.stats["requests_dropped_rate_limited"])
+        await worker.stop()
+
+        # p0 ran, p2 (200 ms away) was dropped and the deferred p1 is answered on shutdown.
+        self.assertEqual(["Mocked Response", None, None], results)
+        self.assertEqual(0, worker.get_stats()["deferred"])
+
+    def test_long_waits_are_dropped_and_stop_answers_deferred(self):
+        asyncio.run(self.async_test_long_waits_are_dropped_and_stop_answers_deferred())
+
+    async def async_test_provider_usage_is_metered(self):
+        self.mock_response.usage_metadata.prompt_token_count = 40
+        self.mock_response.usage_metadata.candidates_token_count = 7
+        worker = LLMWorker(api_key="test_key")
+        await worker.start()
+        await worker.submit_task("Hello")
+        await worker.queue.join()
+        # Without usage metadata (MagicMock attributes are not counts) the local estimate is used.
+        del self.mock_response.usage_metadata
+        await worker.submit_task("Hello")
+        await worker.queue.join()
+        await worker.stop()
+
+        stats = worker.get_stats()
+        self.assertEqual(1, stats["requests_metered"])
+        self.assertEqual((41, 10), (stats["tokens_input"], stats["tokens_output"]))
+        self.assertEqual(51, stats["monthly_tokens_used"])
+        self.assertEqual(51, worker.budget.spent)
+
+    def test_provider_usage_is_metered(self):
+        asyncio.run(self.async_test_provider_usage_is_metered())
+
+    async def async_test_low_value_tasks_are_throttled_when_ahead_of_pace(self):
+        june = datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp()
+        # 30k tokens over a 30-day month: a bucket of 1000, charged down to 200.
+        worker = LLMWorker(api_key="test_key", budget_allocator=BudgetAllocator(30_000, clock=lambda: june))
+        await worker.start()
+        for value in range(20):
+            if worker.budget.admit(100.0, float(value)):
+                worker.budget.charge(0, 100.0)  # seen, but never sent
+        worker.budget.charge(800)
+        results = []
+
+        async def callback(text):
+            results.append(text)
+
+        self.assertFalse(await worker.submit_task("refresh", callback, value=0.0))
+        self.assertTrue(await worker.submit_task("new tenant", callback, value=100.0))
+        await worker.queue.join()
+        await worker.stop()
+
+        self.assertEqual([None, "Mocked Response"], results)
+        self.assertEqual(1, worker.stats["requests_budget_throttled"])
+        self.assertEqual(0, worker.budget.reserved)
+
+    def test_low_value_tasks_are_throttled_when_ahead_of_pace(self):
+        asyncio.run(self.async_test_low_value_tasks_are_throttled_when_ahead_of_pace())
+
+    async def async_test_burst_reserves_budget_before_calls_finish(self):
+        self._slow_model(0.05)
+        june = datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp()
+        allocator = BudgetAllocator(30_000, reserve_fraction=0.0, clock=lambda: june)
+        worker = LLMWorker(api_key="test_key", budget_allocator=allocator, queue_limits={PRIORITY_POLICY: 50})
+        await worker.start()
+
+        # Each task reserves ~102 tokens (prompt + expected output) of a 1000-token bucket.
+        accepted = [await worker.submit_task(f"p{i}") for i in range(20)]
+        self.assertEqual(9, sum(accepted))
+        self.assertEqual(11, worker.stats["requests_budget_throttled"])
+        await worker.queue.join()
+        await worker.stop()
+
+        # Completed calls settled their reservations with the tokens they used.
+        self.assertEqual(0, allocator.reserved)
+        self.assertEqual(worker.stats["tokens_total"], allocator.spent)
+
+    def test_burst_reserves_budget_before_calls_finish(self):
+        asyncio.run(self.async_test_burst_reserves_budget_before_calls_finish())
+
 
 if __name__ == "__main__":
     unittest.main()
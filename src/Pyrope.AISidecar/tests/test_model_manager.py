@@ -1,12 +1,27 @@
 import os
 import shutil
 import tempfile
+import threading
 import unittest
 
+import numpy as np
+
+from benchmark_trainers import synthetic_logs
 from model_manager import ModelManager
+from train_model import extract_features_and_labels, train_and_export
 
 
 class TestModelManagerCanary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture_dir = tempfile.mkdtemp()
+        cls.model_path = os.path.join(cls.fixture_dir, "policy.onnx")
+        train_and_export(extract_features_and_labels(synthetic_logs(200)), cls.model_path, n_jobs=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixture_dir)
+
     def setUp(self):
         self.test_dir = tempfile.mkdtemp()
         self.models_dir = os.path.join(self.test_dir, "models")
@@ -26,16 +41,13 @@ class TestModelManagerCanary(unittest.TestCase):
             canary_model_path=self.canary_model_path,
             canary_p99_degradation_ratio=1.2,
             canary_min_baseline_samples=3,
-            canary_auto_rollback_streak=2,
         )
 
     def tearDown(self):
         shutil.rmtree(self.test_dir)
 
     def _write_model(self, version: str):
-        path = os.path.join(self.staging_dir, f"{version}.onnx")
-        with open(path, "wb") as f:
-            f.write(b"dummy")
+        shutil.copy2(self.model_path, os.path.join(self.staging_dir, f"{version}.onnx"))
 
     def test_deploy_canary_sets_target_tenants(self):
         status = self.manager.deploy_model("v2", canary=True, tenants=["tenant-a", "tenant-b"])
@@ -54,12 +66,119 @@ class TestModelManagerCanary(unittest.TestCase):
 
         self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
 
-        self.assertFalse(self.manager.record_latency_p99("tenant-canary", 31.0))
+        # Each sample above 1.2x the baseline p90 adds log(0.4/0.1) to the SPRT log-likelihood
+        # ratio; the fourth crosses log(0.9/0.01).
+        for latency in (31.0, 32.0, 31.0):
+            self.assertFalse(self.manager.record_latency_p99("tenant-canary", latency))
         self.assertTrue(self.manager.record_latency_p99("tenant-canary", 32.0))
         self.assertIsNone(self.manager.canary_version)
         self.assertSetEqual(set(), self.manager.canary_tenants)
         self.assertFalse(os.path.exists(self.canary_model_path))
 
+    def test_heavy_tailed_healthy_canary_is_not_rolled_back(self):
+        rng = np.random.default_rng(7)
+        self.manager.deploy_model("v1", canary=False)
+        for latency in 20.0 * rng.lognormal(0.0, 1.0, 200):
+            self.manager.record_latency_p99("tenant-control", latency)
+        self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
+
+        # Same distribution on both cohorts: occasional 5-10x spikes must not trigger a rollback.
+        for baseline, canary in 20.0 * rng.lognormal(0.0, 1.0, (300, 2)):
+            self.manager.record_latency_p99("tenant-control", baseline)
+            self.assertFalse(self.manager.record_latency_p99("tenant-canary", canary))
+        self.assertEqual("v2", self.manager.canary_version)
+
+        report = self.manager.latency_report()
+        self.assertEqual(300.0, report["canary_count"])
+        self.assertAlmostEqual(report["baseline_p50"], report["canary_p50"], delta=0.25 * report["baseline_p50"])
+
+    def test_degraded_heavy_tailed_canary_is_rolled_back(self):
+        rng = np.random.default_rng(11)
+        self.manager.deploy_model("v1", canary=False)
+        for latency in 20.0 * rng.lognormal(0.0, 1.0, 200):
+            self.manager.record_latency_p99("tenant-control", latency)
+        self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
+
+        rolled_back = any(self.manager.record_latency_p99("tenant-canary", 60.0 * x) for x in rng.lognormal(0, 1, 300))
+
+        self.assertTrue(rolled_back)
+        self.assertIsNone(self.manager.canary_version)
+
+    def test_deploy_switches_slot_to_staged_artifact_without_copying(self):
+        self.manager.deploy_model("v1")
+        self.assertTrue(os.path.samefile(os.path.join(self.staging_dir, "v1.onnx"), self.active_model_path))
+
+        self.manager.deploy_model("v2")
+        self.assertTrue(os.path.samefile(os.path.join(self.staging_dir, "v2.onnx"), self.active_model_path))
+        self.assertTrue(os.path.islink(self.active_model_path))
+        self.assertFalse(os.path.lexists(self.active_model_path + ".tmp"))
+
+    def test_existing_staged_models_are_imported_once(self):
+        self.assertEqual({"v1", "v2"}, {m["version"] for m in self.manager.list_models()["models"]})
+        self.assertTrue(os.path.exists(os.path.join(self.models_dir, "registry.json")))
+
+        # Listing reads the manifest; files dropped into staging later are not picked up by a scan.
+        self._write_model("v3")
+        self.assertNotIn("v3", {m["version"] for m in self.manager.list_models()["models"]})
+
+    def test_rollback_follows_deploy_history_not_file_times(self):
+        self.manager.deploy_model("v2")
+        self.manager.deploy_model("v1")
+        # Make v1 look newest on disk; rollback must still return to v2.
+        os.utime(os.path.join(self.staging_dir, "v1.onnx"), (2_000_000_000, 2_000_000_000))
+
+        self.assertEqual("Rolled back to v2", self.manager.rollback_model())
+        self.assertEqual("v2", self.manager.active_version)
+        self.assertEqual("No previous version found to rollback to", self.manager.rollback_model())
+
+    def test_list_models_reports_registry_metadata(self):
+        self.manager.deploy_model("v1")
+        models = {m["version"]: m for m in self.manager.list_models()["models"]}
+
+        self.assertEqual("active", models["v1"]["status"])
+        self.assertEqual(os.path.getsize(self.model_path), models["v1"]["size_bytes"])
+        self.assertEqual(64, len(models["v1"]["sha256"]))
+
+    def test_unloadable_artifact_is_not_deployed(self):
+        self.manager.deploy_model("v1")
+        self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
+        with open(os.path.join(self.staging_dir, "broken.onnx"), "wb") as f:
+            f.write(b"dummy")
+
+        for canary in (False, True):
+            with self.assertRaisesRegex(ValueError, "cannot be loaded"):
+                self.manager.deploy_model("broken", canary=canary, tenants=["tenant-canary"])
+
+        # Both slots still serve the models they had.
+        self.assertEqual("v1", self.manager.active_version)
+        self.assertEqual("v2", self.manager.canary_version)
+        self.assertTrue(os.path.samefile(os.path.join(self.staging_dir, "v1.onnx"), self.active_model_path))
+        self.assertEqual("v1", self.manager.get_model("tenant-a").version)
+        self.assertEqual("v2", self.manager.get_model("tenant-canary").version)
+
+    def test_concurrent_deploys_keep_loaded_models_consistent(self):
+        for version in ("v3", "v4"):
+            self._write_model(version)
+        errors = []
+
+        def deploy(version):
+            try:
+                for _ in range(10):
+                    self.manager.deploy_model(version)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=deploy, args=(v,)) for v in ("v1", "v2", "v3", "v4")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual([], errors)
+        active = self.manager.active_version
+        self.assertEqual(active, self.manager.get_model("tenant-a").version)
+        self.assertEqual({active}, set(self.manager._loaded_models))
+
 
 if __name__ == "__main__":
     unittest.main()
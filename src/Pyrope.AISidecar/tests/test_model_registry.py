@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from model_registry import ModelRegistry, file_sha256
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.test_dir, "registry.json")
+        self.registry = ModelRegistry(self.manifest_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _artifact(self, name, payload=b"dummy"):
+        path = os.path.join(self.test_dir, f"{name}.onnx")
+        with open(path, "wb") as f:
+            f.write(payload)
+        return path
+
+    def test_register_records_hash_size_and_fields(self):
+        path = self._artifact("v1", b"abc")
+        record = self.registry.register("v1", path, parent="v0", trainer="hist_gbdt", evaluation={"accuracy": 0.9})
+
+        self.assertEqual(file_sha256(path), record["sha256"])
+        self.assertEqual(3, record["size_bytes"])
+        self.assertEqual("v0", record["parent"])
+        self.assertEqual({"accuracy": 0.9}, record["evaluation"])
+
+    def test_manifest_survives_reload_without_temp_file(self):
+        self.registry.register("v1", self._artifact("v1"))
+        self.registry.register("v2", self._artifact("v2"), parent="v1")
+        self.registry.update("v2", inference_latency={"single_row_p50_ms": 0.05})
+
+        reloaded = ModelRegistry(self.manifest_path)
+
+        self.assertEqual(["v2", "v1"], [r["version"] for r in reloaded.list()])
+        self.assertEqual(0.05, reloaded.get("v2")["inference_latency"]["single_row_p50_ms"])
+        self.assertFalse(os.path.exists(self.manifest_path + ".tmp"))
+        with open(self.manifest_path) as f:
+            self.assertEqual(1, json.load(f)["manifest_version"])
+
+    def test_update_merges_dict_fields(self):
+        self.registry.register("v1", self._artifact("v1"), evaluation={"accuracy": 0.9})
+        record = self.registry.update("v1", evaluation={"hit_rate": 0.4})
+
+        self.assertEqual({"accuracy": 0.9, "hit_rate": 0.4}, record["evaluation"])
+        with self.assertRaises(KeyError):
+            self.registry.update("missing", evaluation={})
+
+    def test_active_history_is_a_stack(self):
+        for version in ("v1", "v2", "v2", "v3"):
+            self.registry.record_active(version)
+
+        self.assertEqual("v2", self.registry.previous_active())
+        self.assertEqual("v2", self.registry.pop_active())
+        self.assertEqual("v1", self.registry.pop_active())
+        self.assertIsNone(self.registry.pop_active())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+import policy_service_pb2
+from benchmark_trainers import synthetic_logs
+from model_manager import ModelManager
+from model_runtime import LoadedModel, load_model
+from server import PolicyService
+from train_model import extract_features_and_labels, train_and_export
+
+# High miss rate is labelled aggressive (1), low miss rate default (0).
+HIGH_MISS = np.array([[100.0, 0.8, 10.0, 20.0]], dtype=np.float32)
+LOW_MISS = np.array([[100.0, 0.05, 10.0, 20.0]], dtype=np.float32)
+
+
+class TestModelRuntime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture_dir = tempfile.mkdtemp()
+        cls.model_path = os.path.join(cls.fixture_dir, "policy.onnx")
+        train_and_export(extract_features_and_labels(synthetic_logs(400)), cls.model_path, n_jobs=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixture_dir)
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.models_dir = os.path.join(self.test_dir, "models")
+        self.staging_dir = os.path.join(self.models_dir, "staging")
+        os.makedirs(self.staging_dir, exist_ok=True)
+        for version in ("v1", "v2"):
+            shutil.copy2(self.model_path, os.path.join(self.staging_dir, f"{version}.onnx"))
+
+        self.manager = ModelManager(
+            models_dir=self.models_dir,
+            staging_dir=self.staging_dir,
+            active_model_path=os.path.join(self.models_dir, "active.onnx"),
+            canary_model_path=os.path.join(self.models_dir, "canary.onnx"),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_loaded_model_predicts_single_rows_and_batches(self):
+        model = LoadedModel("v1", self.model_path)
+
+        self.assertEqual(4, model.n_features)
+        self.assertEqual([1], model.predict(HIGH_MISS[0]).tolist())
+        self.assertEqual([1, 0], model.predict(np.vstack([HIGH_MISS, LOW_MISS])).tolist())
+
+    def test_load_model_returns_none_for_invalid_artifact(self):
+        path = os.path.join(self.test_dir, "broken.onnx")
+        with open(path, "wb") as f:
+            f.write(b"dummy")
+
+        self.assertIsNone(load_model("broken", path))
+
+    def test_get_model_routes_canary_tenants(self):
+        self.assertIsNone(self.manager.get_model("tenant-a"))
+
+        self.manager.deploy_model("v1")
+        self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
+
+        self.assertEqual("v1", self.manager.get_model("tenant-a").version)
+        self.assertEqual("v2", self.manager.get_model("tenant-canary").version)
+
+    def test_swap_keeps_in_flight_reference_and_rollback_falls_back(self):
+        self.manager.deploy_model("v1")
+        self.manager.deploy_model("v2", canary=True, tenants=["tenant-canary"])
+        in_flight = self.manager.get_model("tenant-canary")
+
+        self.manager.rollback_model(canary_only=True)
+
+        # The request that grabbed v2 before the rollback can still finish scoring with it.
+        self.assertEqual([1], in_flight.predict(HIGH_MISS).tolist())
+        self.assertEqual("v1", self.manager.get_model("tenant-canary").version)
+        self.assertNotIn("v2", self.manager._loaded_models)
+
+    def test_persisted_deployment_is_reloaded(self):
+        self.manager.deploy_model("v1")
+
+        restarted = ModelManager(
+            models_dir=self.models_dir,
+            staging_dir=self.staging_dir,
+            active_model_path=os.path.join(self.models_dir, "active.onnx"),
+            canary_model_path=os.path.join(self.models_dir, "canary.onnx"),
+        )
+
+        self.assertEqual("v1", restarted.get_model("tenant-a").version)
+
+    def test_training_registers_lineage_evaluation_and_latency(self):
+        log_path = os.path.join(self.test_dir, "query_log.jsonl")
+        with open(log_path, "w") as f:
+            for entry in synthetic_logs(200):
+                f.write(json.dumps(entry) + "\n")
+        self.manager.deploy_model("v1")
+
+        self.manager._run_training(log_path, os.path.join(self.staging_dir, "v3.onnx"), "v3", trainer="hist_gbdt")
+        record = self.manager.get_model_record("v3")
+
+        self.assertEqual("v1", record["parent"])
+        self.assertEqual("hist_gbdt", record["trainer"])
+        self.assertEqual(200, record["training_data"]["n_samples"])
+        self.assertGreater(record["evaluation"]["accuracy"], 0.8)
+        self.assertGreater(record["inference_latency"]["single_row_p50_ms"], 0.0)
+
+    def test_deployed_model_drives_system_metrics_decision(self):
+        self.manager.deploy_model("v1")
+        service = PolicyService(log_path=os.path.join(self.test_dir, "query_log.jsonl"))
+        service._model_manager = self.manager
+        service._bandit_engine.select_with_propensity = MagicMock(return_value=(0, 1.0))
+        service._logger = MagicMock()
+
+        request = policy_service_pb2.SystemMetricsRequest(
+            qps=100.0, miss_rate=0.8, latency_p99_ms=10.0, cpu_utilization=20.0
+        )
+        response = service.ReportSystemMetrics(request, None)
+
+        aggressive = service._heuristic_engine.policy_for_action(1)
+        self.assertEqual(aggressive.ttl_seconds, response.policy.ttl_seconds)
+        decision = service._logger.log_decision.call_args[0][3]
+        self.assertEqual("model:v1", decision["policy_source"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bandit_engine import ContextualBanditEngine
+from logger import QueryLogger
+from off_policy_eval import (
+    LoggedFeedback,
+    constant_policy,
+    evaluate_policies,
+    evaluate_policy,
+    logged_feedback,
+    model_arms,
+    model_policy,
+)
+from policy_engine import HeuristicPolicyEngine, PolicyConfig
+from policy_grid import BinaryOverrideArms, PolicyGrid
+from train_model import load_logs
+
+
+def _expected_rewards(features):
+    # Arm 1 (aggressive) pays off when the miss rate is high.
+    miss_rate = features[:, 1]
+    return np.column_stack([0.2 - 0.3 * miss_rate, miss_rate - 0.3])
+
+
+def _oracle(features, tenant_ids=None):
+    return np.eye(2)[np.argmax(_expected_rewards(features), axis=1)]
+
+
+def _synthetic_feedback(n=4000, seed=0):
+    """Logs from a stochastic policy that prefers arm 0, with known propensities."""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack(
+        [rng.lognormal(5, 1, n), rng.uniform(0, 1, n), rng.lognormal(3, 0.5, n), rng.uniform(0, 100, n)]
+    )
+    p_arm1 = 0.2 + 0.3 * (features[:, 3] > 50)
+    actions = (rng.uniform(size=n) < p_arm1).astype(np.int64)
+    propensities = np.where(actions == 1, p_arm1, 1.0 - p_arm1)
+    rewards = _expected_rewards(features)[np.arange(n), actions] + rng.normal(0, 0.1, n)
+    return LoggedFeedback(features, actions, propensities, rewards, ["t"] * n, 2)
+
+
+class TestEstimators(unittest.TestCase):
+    def test_estimators_recover_true_policy_values(self):
+        feedback = _synthetic_feedback()
+        truth = {
+            "oracle": _expected_rewards(feedback.features).max(axis=1).mean(),
+            "always 1": _expected_rewards(feedback.features)[:, 1].mean(),
+        }
+
+        results = evaluate_policies(feedback, {"oracle": _oracle, "always 1": constant_policy(1, 2)})
+
+        for name, value in truth.items():
+            for estimator in ("ips", "snips", "dr"):
+                with self.subTest(policy=name, estimator=estimator):
+                    self.assertAlmostEqual(value, results[name][estimator], delta=0.02)
+        # The reward model soaks up most of the variance importance weighting adds.
+        self.assertLess(results["oracle"]["dr_se"], results["oracle"]["ips_se"])
+        self.assertGreater(results["oracle"]["dr"], results["oracle"]["logged_value"])
+
+    def test_logging_policy_has_unit_weights(self):
+        feedback = _synthetic_feedback(n=500)
+        propensities = feedback.propensities
+
+        def logging_policy(features, tenant_ids=None):
+            probabilities = np.zeros((len(features), 2))
+            probabilities[np.arange(len(features)), feedback.actions] = propensities
+            probabilities[np.arange(len(features)), 1 - feedback.actions] = 1.0 - propensities
+            return probabilities
+
+        result = evaluate_policy(feedback, logging_policy)
+
+        self.assertAlmostEqual(result["logged_value"], result["ips"], places=10)
+        self.assertAlmostEqual(500.0, result["ess"])
+
+    def test_weight_clipping_and_empty_logs(self):
+        feedback = _synthetic_feedback(n=500)
+        clipped = evaluate_policy(feedback, constant_policy(1, 2), max_weight=2.0)
+        unclipped = evaluate_policy(feedback, constant_policy(1, 2))
+        self.assertGreater(clipped["ess"], unclipped["ess"])
+
+        empty = LoggedFeedback(np.zeros((0, 4)), np.zeros(0, int), np.zeros(0), np.zeros(0), [], 2)
+        with self.assertRaises(ValueError):
+            evaluate_policy(empty, constant_policy(0, 2))
+
+    def test_model_and_bandit_policies(self):
+        class _ThresholdModel:
+            def predict(self, features):
+                return (features[:, 1] > 0.5 / 1.3).astype(np.int64)
+
+        feedback = _synthetic_feedback(n=200)
+        # Without a base arm, the default and aggressive heuristic policies are arms 0 and 1.
+        arms = PolicyGrid([PolicyConfig(0.1, 60, 0), PolicyConfig(0.05, 300, 1)], keep_base_arm=False)
+        np.testing.assert_array_equal(
+            _oracle(feedback.features), model_policy(_ThresholdModel(), arms)(feedback.features)
+        )
+
+        test_dir = tempfile.mkdtemp()
+        try:
+            engine = ContextualBanditEngine(model_path=os.path.join(test_dir, "b.npz"), epsilon=0.2)
+            engine.update_batch(feedback.features, feedback.actions, feedback.rewards, feedback.tenant_ids)
+            probabilities = engine.action_probabilities(feedback.features, feedback.tenant_ids)
+            np.testing.assert_allclose(np.ones(200), probabilities.sum(axis=1))
+            self.assertAlmostEqual(0.9, probabilities.max(axis=1).min())
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_model_labels_map_to_grid_arms_with_the_same_policy(self):
+        class _ThresholdModel:
+            def predict(self, features):
+                return (features[:, 1] > 0.5).astype(np.int64)
+
+        # Arm 0 is the base; arms 1.. are the grid, which holds both heuristic policies.
+        grid = PolicyGrid.from_spec("ttl=60,300;admission=0.05,0.1;eviction=0,1")
+        default_arm = 1 + grid.policies.index(PolicyConfig(0.1, 60, 0))
+        aggressive_arm = 1 + grid.policies.index(PolicyConfig(0.05, 300, 1))
+        self.assertEqual([default_arm, aggressive_arm], model_arms(grid).tolist())
+
+        features = np.array([[100.0, 0.2, 10.0, 20.0], [100.0, 0.8, 10.0, 20.0]])
+        probabilities = model_policy(_ThresholdModel(), grid)(features)
+        self.assertEqual((2, grid.n_arms), probabilities.shape)
+        self.assertEqual([default_arm, aggressive_arm], probabilities.argmax(axis=1).tolist())
+
+        # Logged on the grid, "model" is scored on the arms that reproduce its decisions.
+        n = 200
+        actions = np.where(features[np.arange(n) % 2, 1] > 0.5, aggressive_arm, default_arm)
+        feedback = LoggedFeedback(
+            features[np.arange(n) % 2], actions, np.full(n, 0.5), np.ones(n), ["t"] * n, grid.n_arms
+        )
+        self.assertAlmostEqual(2.0, evaluate_policy(feedback, model_policy(_ThresholdModel(), grid))["ips"])
+
+        with self.assertRaisesRegex(ValueError, "label 1"):
+            model_arms(PolicyGrid.from_spec("ttl=30,60;admission=0.1"))
+
+    def test_override_arms_cannot_score_policy_models(self):
+        # Override arm 1 halves the served policy's TTL; it is not the aggressive heuristic policy.
+        base = HeuristicPolicyEngine().policy_for_action(0)
+        self.assertNotEqual(
+            HeuristicPolicyEngine().policy_for_action(1), BinaryOverrideArms().policy_for_action(1, base)
+        )
+        with self.assertRaisesRegex(ValueError, "policy grid"):
+            model_arms(BinaryOverrideArms())
+
+
+class TestLoggedFeedback(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.test_dir, "query_log.jsonl")
+        logger = QueryLogger(self.log_path)
+        reports = [("a", 0.5, 1), ("b", 0.9, 0), ("a", 0.4, 0), ("a", 0.45, 1), ("b", 0.7, 1)]
+        for tenant, miss_rate, action in reports:
+            logger.log_decision(
+                tenant,
+                {},
+                {"qps": 10.0, "miss_rate": miss_rate, "latency_p99_ms": 5.0, "cpu_utilization": 50.0},
+                {"bandit_action": action, "bandit_propensity": 0.5, "bandit_arms": 2},
+            )
+        # A decision logged before propensities were recorded.
+        logger.log_decision("c", {}, {"miss_rate": 0.1}, {"bandit_action": 1})
+        logger.log_decision("c", {}, {"miss_rate": 0.2}, {"bandit_action": 1})
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_rewards_come_from_the_tenants_next_report(self):
+        feedback = logged_feedback(load_logs(self.log_path))
+
+        self.assertEqual(["a", "a", "b"], feedback.tenant_ids)
+        self.assertEqual([1, 0, 0], feedback.actions.tolist())
+        np.testing.assert_allclose([0.1, -0.05, 0.2], feedback.rewards)
+        np.testing.assert_allclose([0.5, 0.5, 0.5], feedback.propensities)
+
+    def test_longer_horizon(self):
+        feedback = logged_feedback(load_logs(self.log_path), horizon=2)
+
+        self.assertEqual(["a"], feedback.tenant_ids)
+        np.testing.assert_allclose([0.05], feedback.rewards)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bandit_engine import create_bandit_engine
+from policy_engine import PolicyConfig
+from policy_grid import BinaryOverrideArms, PolicyGrid, policy_arms_from_spec, surviving_arms
+
+BASE = PolicyConfig(admission_threshold=0.1, ttl_seconds=60, eviction_priority=0)
+
+
+class TestPolicyGrid(unittest.TestCase):
+    def test_spec_builds_cartesian_grid_with_base_arm(self):
+        grid = PolicyGrid.from_spec("ttl=30,300;admission=0.05,0.1,0.2;eviction=0,1")
+
+        self.assertEqual(1 + 2 * 3 * 2, grid.n_arms)
+        self.assertIs(BASE, grid.policy_for_action(0, BASE))
+        self.assertEqual(
+            PolicyConfig(admission_threshold=0.05, ttl_seconds=30, eviction_priority=0),
+            grid.policy_for_action(1, BASE),
+        )
+        self.assertEqual("ttl=300,admission=0.2,eviction=1", grid.describe(grid.n_arms - 1))
+
+    def test_spec_without_base_arm(self):
+        grid = PolicyGrid.from_spec("ttl=60;admission=0.1;base=false")
+
+        self.assertEqual(1, grid.n_arms)
+        self.assertEqual(60, grid.policy_for_action(0, BASE).ttl_seconds)
+
+    def test_invalid_spec_raises(self):
+        with self.assertRaises(ValueError):
+            PolicyGrid.from_spec("ttl=30,60")
+
+    def test_unset_spec_keeps_binary_override(self):
+        arms = policy_arms_from_spec("")
+
+        self.assertIsInstance(arms, BinaryOverrideArms)
+        self.assertIs(BASE, arms.policy_for_action(0, BASE))
+        aggressive = arms.policy_for_action(1, BASE)
+        self.assertEqual(30, aggressive.ttl_seconds)
+        self.assertAlmostEqual(0.0, aggressive.admission_threshold)
+
+
+class TestArmElimination(unittest.TestCase):
+    def test_confidently_worse_arms_are_dropped(self):
+        pulls = np.array([[400, 400, 400, 5]])
+        reward_sum = pulls * np.array([[0.8, 0.7, -0.6, -1.0]])
+
+        alive = surviving_arms(pulls, reward_sum)
+
+        # The close runner-up and the barely explored arm stay in play.
+        self.assertEqual([[True, True, False, True]], alive.tolist())
+
+    def test_unexplored_arms_survive(self):
+        self.assertTrue(surviving_arms(np.zeros(4), np.zeros(4)).all())
+
+
+class TestGridBandits(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+        np.random.seed(0)
+        # Reward peaks at a middle TTL and a low admission threshold.
+        self.grid = PolicyGrid.from_levels([30, 120, 600], [0.05, 0.2], keep_base_arm=False)
+        self.rewards = np.array([-0.2, -0.5, 0.6, -0.1, 0.0, -0.4])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _run(self, engine, steps=1500):
+        features = np.array([[200.0, 0.4, 12.0, 50.0]])
+        for _ in range(steps):
+            action = engine.select_action(features, tenant_id="t")
+            reward = float(np.clip(self.rewards[action] + self.rng.normal(0, 0.2), -1.0, 1.0))
+            engine.update(features, action, reward, tenant_id="t")
+        return features
+
+    def test_every_engine_finds_the_middle_arm(self):
+        for kind in ("epsilon_greedy", "linucb", "thompson"):
+            with self.subTest(kind=kind):
+                engine = create_bandit_engine(
+                    kind, model_path=os.path.join(self.test_dir, f"{kind}.npz"), n_arms=self.grid.n_arms
+                )
+                features = self._run(engine)
+
+                if kind == "epsilon_greedy":
+                    engine.epsilon = 0.0
+                self.assertEqual(2, engine.select_action(features, tenant_id="t"))
+                self.assertEqual(120, self.grid.policy_for_action(2, BASE).ttl_seconds)
+
+    def test_elimination_stops_pulling_bad_arms(self):
+        engine = create_bandit_engine(
+            "epsilon_greedy",
+            model_path=os.path.join(self.test_dir, "elim.npz"),
+            n_arms=self.grid.n_arms,
+            epsilon=0.3,
+            eliminate=True,
+        )
+        self._run(engine, steps=3000)
+
+        alive = engine.alive_arms("t")
+        self.assertTrue(alive[2])
+        self.assertFalse(alive[1])
+        pulls_before = engine.state.get("t", "pulls")
+        self._run(engine, steps=200)
+        self.assertEqual(pulls_before[1], engine.state.get("t", "pulls")[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmark_trainers import synthetic_logs
+from cache_simulator import synthetic_trace
+from model_manager import ModelManager
+from model_runtime import LoadedModel
+from promotion_gate import GateThresholds, PromotionGate
+from train_model import extract_features_and_labels, train_and_export
+
+
+class _ConstantModel:
+    version = "always-aggressive"
+
+    def predict(self, features):
+        return np.ones(len(features), dtype=np.int64)
+
+
+class TestPromotionGate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture_dir = tempfile.mkdtemp()
+        cls.model_path = os.path.join(cls.fixture_dir, "policy.onnx")
+        train_and_export(extract_features_and_labels(synthetic_logs(400)), cls.model_path, n_jobs=1)
+        cls.trace = synthetic_trace(n_events=5000, n_keys=500, duration_s=300, seed=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixture_dir)
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.models_dir = os.path.join(self.test_dir, "models")
+        self.staging_dir = os.path.join(self.models_dir, "staging")
+        os.makedirs(self.staging_dir, exist_ok=True)
+        for version in ("v1", "v2"):
+            shutil.copy2(self.model_path, os.path.join(self.staging_dir, f"{version}.onnx"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _manager(self, thresholds=None):
+        return ModelManager(
+            models_dir=self.models_dir,
+            staging_dir=self.staging_dir,
+            active_model_path=os.path.join(self.models_dir, "active.onnx"),
+            canary_model_path=os.path.join(self.models_dir, "canary.onnx"),
+            promotion_gate=PromotionGate(thresholds, trace=self.trace, latency_iterations=20),
+        )
+
+    def test_passing_gate_records_benchmarks_in_registry(self):
+        manager = self._manager(GateThresholds(max_single_row_p99_ms=1000.0, max_batch_p99_ms=1000.0))
+
+        self.assertEqual("OK", manager.deploy_model("v1"))
+        self.assertEqual("OK", manager.deploy_model("v2"))
+        gate = manager.get_model_record("v2")["gate"]
+
+        self.assertTrue(gate["passed"])
+        self.assertEqual("v1", gate["replay"]["active_version"])
+        self.assertAlmostEqual(gate["replay"]["active_hit_rate"], gate["replay"]["hit_rate"])
+        self.assertIn("batch_p99_ms", manager.get_model_record("v2")["inference_latency"])
+
+    def test_violation_refuses_promotion_and_keeps_active(self):
+        manager = self._manager(GateThresholds(max_single_row_p99_ms=1000.0, max_batch_p99_ms=1000.0))
+        manager.deploy_model("v1")
+        manager.promotion_gate.thresholds = GateThresholds(max_size_bytes=100)
+
+        with self.assertRaisesRegex(ValueError, "size"):
+            manager.deploy_model("v2")
+        self.assertEqual("v1", manager.active_version)
+        self.assertFalse(manager.get_model_record("v2")["gate"]["passed"])
+
+        # Canary deploys are not promotions and skip the gate.
+        self.assertEqual("OK", manager.deploy_model("v2", canary=True, tenants=["tenant-a"]))
+
+    def test_unloadable_artifact_is_refused(self):
+        with open(os.path.join(self.staging_dir, "broken.onnx"), "wb") as f:
+            f.write(b"dummy")
+
+        with self.assertRaisesRegex(ValueError, "cannot be loaded"):
+            self._manager().deploy_model("broken")
+
+    def test_replay_regression_against_active_is_a_violation(self):
+        gate = PromotionGate(
+            GateThresholds(max_single_row_p99_ms=1000.0, max_batch_p99_ms=1000.0, max_hit_rate_regression=0.0),
+            trace=self.trace,
+            latency_iterations=20,
+        )
+
+        report = gate.evaluate(LoadedModel("v1", self.model_path), active=_ConstantModel())
+
+        self.assertFalse(report.passed)
+        self.assertLess(report.replay["hit_rate"], report.replay["active_hit_rate"])
+        self.assertTrue(any("replay hit rate" in v for v in report.violations))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from reward_attribution import RewardAttributor
+
+FEATURES = np.array([[100.0, 0.4, 20.0, 50.0]])
+
+
+class TestRewardAttributor(unittest.TestCase):
+    def test_reward_arrives_with_the_next_report(self):
+        attributor = RewardAttributor()
+        self.assertEqual([], attributor.observe("t", 0.4, 20.0, 50.0, now=0.0))
+        attributor.record("t", FEATURES, 1, 0.9, 0.4, 20.0, 50.0, now=0.0)
+
+        matured = attributor.observe("t", 0.3, 20.0, 50.0, now=10.0)
+
+        self.assertEqual(1, len(matured))
+        decision, reward = matured[0]
+        self.assertEqual((1, 0.9), (decision.action, decision.propensity))
+        self.assertAlmostEqual(0.1, reward)
+        self.assertEqual(0, attributor.pending_count("t"))
+
+    def test_horizon_delays_attribution(self):
+        attributor = RewardAttributor(horizon=3)
+        for i, miss_rate in enumerate((0.5, 0.45, 0.4)):
+            self.assertEqual([], attributor.observe("t", miss_rate, 20.0, 50.0, now=float(i)))
+            attributor.record("t", FEATURES, i % 2, 0.5, miss_rate, 20.0, 50.0, now=float(i))
+
+        matured = attributor.observe("t", 0.2, 20.0, 50.0, now=3.0)
+
+        self.assertEqual([0], [d.action for d, _ in matured])
+        self.assertAlmostEqual(0.3, matured[0][1])
+        self.assertEqual(2, attributor.pending_count("t"))
+
+    def test_tenants_are_attributed_separately(self):
+        attributor = RewardAttributor()
+        attributor.record("a", FEATURES, 1, 1.0, 0.4, 20.0, 50.0, now=0.0)
+
+        self.assertEqual([], attributor.observe("b", 0.1, 20.0, 50.0, now=1.0))
+        self.assertEqual(1, len(attributor.observe("a", 0.1, 20.0, 50.0, now=1.0)))
+
+    def test_latency_and_cost_terms_and_clipping(self):
+        attributor = RewardAttributor(latency_weight=0.5, cost_weight=0.5)
+        attributor.record("t", FEATURES, 0, 1.0, 0.4, 20.0, 50.0, now=0.0)
+
+        ((_, reward),) = attributor.observe("t", 0.4, 10.0, 25.0, now=1.0)
+        self.assertAlmostEqual(0.5, reward)
+
+        attributor = RewardAttributor(miss_weight=10.0)
+        attributor.record("t", FEATURES, 0, 1.0, 0.1, 20.0, 50.0, now=0.0)
+        ((_, reward),) = attributor.observe("t", 0.9, 20.0, 50.0, now=1.0)
+        self.assertEqual(-1.0, reward)
+
+    def test_stale_decisions_expire(self):
+        attributor = RewardAttributor(max_age_seconds=60.0)
+        attributor.record("t", FEATURES, 1, 1.0, 0.4, 20.0, 50.0, now=0.0)
+
+        self.assertEqual([], attributor.observe("t", 0.1, 20.0, 50.0, now=120.0))
+        self.assertEqual({"pending": 0.0, "attributed": 0.0, "expired": 1.0}, attributor.stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
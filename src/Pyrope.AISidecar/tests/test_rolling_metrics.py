@@ -0,0 +1,73 @@
+import unittest
+
+from rolling_metrics import RollingMetrics
+
+
+class TestRollingMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RollingMetrics(clock=lambda: 0.0)
+
+    def test_hit_rate_uses_counter_deltas_per_tenant(self):
+        self.metrics.record("a", "heuristic", 100, 100, 10.0, now=1000.0)
+        self.metrics.record("b", "heuristic", 5, 5, 10.0, now=1000.0)
+        self.metrics.record("a", "heuristic", 180, 120, 10.0, now=1001.0)
+
+        summary = self.metrics.summary("global", "1m", now=1001.0)
+        self.assertEqual(80.0, summary["hits"])
+        self.assertEqual(20.0, summary["misses"])
+        self.assertAlmostEqual(0.8, summary["hit_rate"])
+        self.assertEqual(3.0, summary["reports"])
+        self.assertEqual(0.0, self.metrics.summary("tenant:b", "1m", now=1001.0)["hits"])
+
+    def test_counter_reset_counts_from_zero(self):
+        self.metrics.record("a", "heuristic", 1000, 0, 10.0, now=0.0)
+        self.metrics.record("a", "heuristic", 30, 10, 10.0, now=1.0)
+
+        self.assertEqual(30.0, self.metrics.summary("tenant:a", "1m", now=1.0)["hits"])
+
+    def test_windows_expire_old_buckets(self):
+        self.metrics.record("a", "heuristic", 0, 0, 10.0, now=0.0)
+        self.metrics.record("a", "heuristic", 50, 50, 10.0, now=10.0)
+
+        self.assertEqual(50.0, self.metrics.summary("global", "1m", now=30.0)["hits"])
+        self.assertEqual(0.0, self.metrics.summary("global", "1m", now=75.0)["hits"])
+        self.assertEqual(50.0, self.metrics.summary("global", "15m", now=75.0)["hits"])
+        self.assertEqual(50.0, self.metrics.summary("global", "1h", now=3000.0)["hits"])
+        self.assertEqual(0.0, self.metrics.summary("global", "1h", now=3700.0)["hits"])
+
+    def test_deltas_are_credited_to_the_previous_cohort(self):
+        self.metrics.record("a", "heuristic", 0, 0, 20.0, now=0.0)
+        self.metrics.record("a", "model", 10, 0, 20.0, now=1.0)
+        self.metrics.record("a", "model", 20, 10, 10.0, now=2.0)
+
+        heuristic = self.metrics.summary("cohort:heuristic", "1m", now=2.0)
+        model = self.metrics.summary("cohort:model", "1m", now=2.0)
+        self.assertEqual(10.0, heuristic["hits"])
+        self.assertEqual(1.0, model["reports"])
+        self.assertAlmostEqual(0.5, model["hit_rate"])
+
+    def test_p99_improvement_and_trend(self):
+        for second in range(30):
+            self.metrics.record("h", "heuristic", 0, 0, 40.0, now=float(second))
+            self.metrics.record("m", "model", 0, 0, 30.0 - second * 0.5, now=float(second))
+
+        # Model cohort averages 22.75ms against 40ms for the heuristic cohort.
+        self.assertAlmostEqual(1.0 - 22.75 / 40.0, self.metrics.p99_improvement("1m", now=29.0))
+        trend = self.metrics.summary("cohort:model", "1m", now=29.0)["p99_trend_ms_per_min"]
+        self.assertAlmostEqual(-30.0, trend)
+
+    def test_evaluation_metrics_flattens_scopes(self):
+        self.metrics.record("a", "heuristic", 0, 0, 10.0, now=0.0)
+        self.metrics.record("a", "llm", 5, 5, 10.0, now=1.0)
+        self.metrics.record("a", "llm", 5, 5, 10.0, now=1.0)
+
+        flat = self.metrics.evaluation_metrics("a", now=1.0)
+
+        self.assertAlmostEqual(0.5, flat["global_1m_hit_rate"])
+        self.assertAlmostEqual(0.5, flat["tenant_15m_hit_rate"])
+        self.assertIn("cohort_llm_1h_reports", flat)
+        self.assertIn("p99_improvement_15m", flat)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,7 +31,8 @@ class TestPolicyServiceCanary(unittest.TestCase):
 
         self.service._model_manager = MagicMock()
         self.service._model_manager.record_latency_p99.return_value = False
-        self.service._bandit_engine.select_action = MagicMock(return_value=0)
+        self.service._model_manager.get_model.return_value = None
+        self.service._bandit_engine.select_with_propensity = MagicMock(return_value=(0, 1.0))
 
         context = MagicMock()
         context.invocation_metadata.return_value = (("tenant-id", "tenant-canary"),)
@@ -40,6 +41,52 @@ class TestPolicyServiceCanary(unittest.TestCase):
 
         self.service._model_manager.record_latency_p99.assert_called_once_with("tenant-canary", 77.0)
 
+    def test_get_evaluations_reports_latency_sketches(self):
+        self.service._model_manager.record_latency_p99("tenant-control", 12.0)
+
+        metrics = self.service.GetEvaluations(policy_service_pb2.Empty(), None).other_metrics
+
+        self.assertGreaterEqual(metrics["baseline_count"], 1.0)
+        self.assertIn("canary_sprt_llr", metrics)
+        self.assertIn("inference_batches", metrics)
+        self.assertIn("bandit_epsilon_greedy_epsilon", metrics)
+        self.assertNotIn("bandit_epsilon", metrics)
+
+    def test_get_evaluations_reports_live_hit_rate(self):
+        context = MagicMock()
+        context.invocation_metadata.return_value = (("tenant-id", "tenant-a"),)
+        for hits, misses in ((100, 100), (190, 110)):
+            request = policy_service_pb2.SystemMetricsRequest(
+                qps=50.0, miss_rate=0.1, latency_p99_ms=12.0, cache_hit_total=hits, cache_miss_total=misses
+            )
+            self.service.ReportSystemMetrics(request, context)
+
+        evaluation = self.service.GetEvaluations(policy_service_pb2.Empty(), context)
+
+        self.assertAlmostEqual(0.9, evaluation.current_cache_hit_rate)
+        self.assertAlmostEqual(0.9, evaluation.other_metrics["tenant_1m_hit_rate"])
+
+    def test_bandit_is_rewarded_on_the_next_report(self):
+        self.service._bandit_engine.update_batch = MagicMock()
+        self.service._bandit_engine.select_with_propensity = MagicMock(return_value=(1, 0.95))
+        context = MagicMock()
+        context.invocation_metadata.return_value = (("tenant-id", "tenant-a"),)
+
+        first = policy_service_pb2.SystemMetricsRequest(qps=50.0, miss_rate=0.5, latency_p99_ms=12.0)
+        self.service.ReportSystemMetrics(first, context)
+        self.service._bandit_learner.flush()
+        self.service._bandit_engine.update_batch.assert_not_called()
+
+        second = policy_service_pb2.SystemMetricsRequest(qps=55.0, miss_rate=0.3, latency_p99_ms=12.0)
+        self.service.ReportSystemMetrics(second, context)
+        self.service._bandit_learner.flush()
+
+        features, actions, rewards, tenant_ids = self.service._bandit_engine.update_batch.call_args.args
+        self.assertEqual([50.0, 0.5, 12.0, 0.0], features[0].tolist())
+        self.assertEqual([1], actions)
+        self.assertAlmostEqual(0.2, rewards[0])
+        self.assertEqual(["tenant-a"], tenant_ids)
+
 
 if __name__ == "__main__":
     unittest.main()
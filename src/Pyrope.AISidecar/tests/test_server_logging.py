@@ -4,6 +4,8 @@ import json
 import tempfile
 import shutil
 from unittest.mock import MagicMock
+
+import policy_service_pb2
 from server import PolicyService
 
 
@@ -37,6 +39,42 @@ class TestPolicyServiceLogging(unittest.TestCase):
             self.assertEqual(entry["tenant_id"], "tenant-1")
             self.assertEqual(entry["system_metrics"]["qps"], 100.0)
             self.assertIn("decision", entry)
+            self.assertEqual({}, entry["query_features"])
+
+    def test_sampled_query_features_join_decision_log(self):
+        self.service._query_sample_rate = 1.0
+        batch = policy_service_pb2.QueryFeatureBatch(
+            tenant_id="tenant-1",
+            index_name="idx",
+            query_hashes=[11, 12, 11],
+            top_k=[10, 10, 5],
+            filter_types=[0, 1, 0],
+            norms=[1.0, 2.0, 1.0],
+            hits=[False, False, True],
+        )
+        context = MagicMock()
+        context.invocation_metadata.return_value = (("tenant-id", "tenant-1"),)
+
+        response = self.service.ReportQueryFeatures(batch, context)
+        self.assertEqual("OK", response.status)
+        self.assertEqual(3, response.accepted)
+
+        request = policy_service_pb2.SystemMetricsRequest(qps=10.0, miss_rate=0.2)
+        self.service.ReportSystemMetrics(request, context)
+
+        with open(self.log_path, "r") as f:
+            entry = json.loads(f.readlines()[-1])
+        self.assertEqual(3, entry["query_features"]["ingested"])
+        self.assertEqual(3, len(entry["query_features"]["samples"]))
+        self.assertEqual("idx", entry["query_features"]["samples"][0]["index_name"])
+
+    def test_report_query_features_rejects_ragged_columns(self):
+        batch = policy_service_pb2.QueryFeatureBatch(query_hashes=[1, 2], top_k=[10], norms=[1.0, 1.0])
+
+        response = self.service.ReportQueryFeatures(batch, MagicMock())
+
+        self.assertTrue(response.status.startswith("Error"))
+        self.assertEqual(0, len(self.service._feature_engineer._history._entries))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from server import PolicyService
+
+
+class TestPolicyServiceShutdown(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.service = PolicyService(log_path=os.path.join(self.test_dir, "query_log.jsonl"))
+        engine = self.service._bandit_engine
+        engine.model_path = os.path.join(self.test_dir, "bandit_state.npz")
+        engine.normalizer_path = os.path.join(self.test_dir, "bandit_state.normalizer.json")
+
+    def tearDown(self):
+        self.service._stopping.set()
+        shutil.rmtree(self.test_dir)
+
+    def test_shutdown_saves_bandit_state(self):
+        self.service.stop_background_services()
+
+        self.assertTrue(os.path.exists(self.service._bandit_engine.model_path))
+        self.assertTrue(self.service._stopping.is_set())
+
+    def test_shutdown_applies_queued_rewards_before_saving(self):
+        learner = self.service._bandit_learner
+        saved_applied = []
+        save = self.service._bandit_engine.save
+        self.service._bandit_engine.save = lambda: (saved_applied.append(learner.stats()["applied"]), save())
+        learner._stopped.set()  # park the learner thread so the rewards stay queued until shutdown
+        learner._wakeup.set()
+        learner._thread.join(timeout=1.0)
+        for _ in range(5):
+            learner.submit(np.array([100.0, 0.3, 20.0, 50.0]), 1, 1.0, "tenant-a")
+
+        self.service.stop_background_services()
+
+        self.assertEqual([5.0], saved_applied)
+        self.assertFalse(learner._thread.is_alive())
+
+    def test_bandit_state_is_checkpointed_periodically(self):
+        with patch("server.BANDIT_SAVE_INTERVAL_SECONDS", 0.01):
+            checkpoints = threading.Thread(target=self.service._checkpoint_loop)
+            checkpoints.start()
+            try:
+                for _ in range(100):
+                    if os.path.exists(self.service._bandit_engine.model_path):
+                        break
+                    self.service._stopping.wait(0.01)
+            finally:
+                self.service._stopping.set()
+                checkpoints.join(timeout=1.0)
+
+        self.assertTrue(os.path.exists(self.service._bandit_engine.model_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
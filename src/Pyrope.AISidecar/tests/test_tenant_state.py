@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from tenant_state import TenantStateStore
+
+
+class TestTenantStateStore(unittest.TestCase):
+    def setUp(self):
+        self.store = TenantStateStore(
+            {"weights": ((3,), np.float64), "count": ((), np.int64)},
+            initial_capacity=2,
+        )
+
+    def test_new_tenants_start_from_prior(self):
+        self.store.set_prior("weights", [1.0, 2.0, 3.0])
+
+        np.testing.assert_array_equal([1.0, 2.0, 3.0], self.store.get("tenant-a", "weights"))
+        self.store.set("tenant-a", "weights", [0.0, 0.0, 0.0])
+        np.testing.assert_array_equal([1.0, 2.0, 3.0], self.store.get("tenant-b", "weights"))
+
+    def test_capacity_grows_and_rows_are_stable(self):
+        rows = {f"t{i}": self.store.row(f"t{i}") for i in range(100)}
+        for tenant, row in rows.items():
+            self.store.set(tenant, "count", row)
+
+        self.assertEqual(100, len(self.store))
+        self.assertEqual(rows["t42"], self.store.row("t42"))
+        self.assertEqual(rows["t42"], self.store.get("t42", "count"))
+
+    def test_unknown_tenant_reads_prior_without_creating_a_row(self):
+        self.assertEqual(0, self.store.tenant_row("nobody"))
+        self.assertFalse(self.store.has("nobody"))
+
+    def test_save_and_load_round_trip(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, "state.npz")
+            self.store.set_prior("weights", [0.5, 0.5, 0.5])
+            self.store.set("tenant-a", "weights", [1.0, 2.0, 3.0])
+            self.store.save(path)
+
+            restored = TenantStateStore({"weights": ((3,), np.float64), "count": ((), np.int64)})
+            self.assertTrue(restored.load(path))
+
+            np.testing.assert_array_equal([1.0, 2.0, 3.0], restored.get("tenant-a", "weights"))
+            np.testing.assert_array_equal([0.5, 0.5, 0.5], restored.get("tenant-new", "weights"))
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_save_writes_the_rows_as_they_were_when_called(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, "state.npz")
+            self.store.set("tenant-a", "weights", [1.0, 1.0, 1.0])
+            savez = np.savez
+
+            def write_during_save(*args, **kwargs):
+                # A learner batch landing after the snapshot, while the file is being written.
+                self.store.write_rows(np.array([self.store.row("tenant-a")]), {"weights": [[9.0, 9.0, 9.0]]})
+                savez(*args, **kwargs)
+
+            with patch("tenant_state.np.savez", side_effect=write_during_save):
+                self.store.save(path)
+
+            restored = TenantStateStore({"weights": ((3,), np.float64), "count": ((), np.int64)})
+            self.assertTrue(restored.load(path))
+            np.testing.assert_array_equal([1.0, 1.0, 1.0], restored.get("tenant-a", "weights"))
+        finally:
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
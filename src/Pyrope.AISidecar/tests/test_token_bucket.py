@@ -0,0 +1,51 @@
+import unittest
+
+from token_bucket import TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.bucket = TokenBucket.per_minute(60, clock=self.clock)  # one token per second
+
+    def test_bursts_up_to_capacity_then_waits_exactly(self):
+        self.assertTrue(all(self.bucket.try_consume() for _ in range(60)))
+        self.assertFalse(self.bucket.try_consume())
+        self.assertAlmostEqual(1.0, self.bucket.wait_time())
+        self.assertAlmostEqual(5.0, self.bucket.wait_time(5))
+
+        self.clock.now = 2.5
+        self.assertAlmostEqual(2.5, self.bucket.available())
+        self.assertTrue(self.bucket.try_consume(2))
+        self.assertAlmostEqual(0.5, self.bucket.wait_time())
+
+    def test_refill_is_capped_at_capacity(self):
+        self.bucket.consume(10)
+        self.clock.now = 1000.0
+        self.assertEqual(60.0, self.bucket.available())
+
+    def test_reservations_queue_up_behind_each_other(self):
+        self.bucket.consume(60)
+        waits = []
+        for _ in range(3):
+            waits.append(self.bucket.wait_time())
+            self.bucket.consume()
+        self.assertEqual([1.0, 2.0, 3.0], waits)
+
+    def test_oversized_requests_wait_for_a_full_bucket(self):
+        self.bucket.consume(30)
+        self.assertAlmostEqual(30.0, self.bucket.wait_time(500))
+        with self.assertRaises(ValueError):
+            TokenBucket(0, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+from benchmark_trainers import synthetic_logs
+from train_model import (
+    FEATURE_COLUMNS,
+    TRAINERS,
+    build_classifier,
+    check_equivalence,
+    extract_features_and_labels,
+    post_process_export,
+    quantize_onnx,
+    train_and_export,
+)
+
+
+class TestTrainAndExport(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.df = extract_features_and_labels(synthetic_logs(400))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_each_trainer_exports_runnable_onnx(self):
+        for trainer in TRAINERS:
+            with self.subTest(trainer=trainer):
+                output = os.path.join(self.test_dir, f"{trainer}.onnx")
+                result = train_and_export(self.df, output, trainer=trainer, n_jobs=2)
+
+                self.assertEqual(trainer, result["trainer"])
+                self.assertGreater(result["accuracy"], 0.8)
+                self.assertGreater(result["fit_seconds"], 0.0)
+
+                sess = ort.InferenceSession(output, providers=["CPUExecutionProvider"])
+                features = np.array([[100.0, 0.6, 10.0, 20.0], [100.0, 0.1, 10.0, 20.0]], dtype=np.float32)
+                labels, probabilities = sess.run(None, {sess.get_inputs()[0].name: features})
+                self.assertEqual((2,), labels.shape)
+                self.assertEqual((2, 2), probabilities.shape)
+
+    def test_export_is_optimized_and_equivalent(self):
+        output = os.path.join(self.test_dir, "model.onnx")
+        result = train_and_export(self.df, output, trainer="gbdt", n_jobs=1, quantize=True)
+
+        self.assertTrue(result["optimized"])
+        # Tree ensembles have no MatMul/Gemm weights to quantize.
+        self.assertIsNone(result["quantized_path"])
+        self.assertEqual(os.path.getsize(output), result["size_bytes"])
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "model.opt.onnx")))
+
+        plain = os.path.join(self.test_dir, "plain.onnx")
+        train_and_export(self.df, plain, trainer="gbdt", n_jobs=1, optimize=False)
+        X = self.df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        self.assertTrue(check_equivalence(plain, output, X)["equivalent"])
+
+    def test_normalizer_is_embedded_in_export(self):
+        output = os.path.join(self.test_dir, "model.onnx")
+        result = train_and_export(self.df, output, trainer="gbdt", n_jobs=1)
+
+        self.assertEqual(len(FEATURE_COLUMNS), result["normalizer"]["n_features"])
+        op_types = {node.op_type for node in onnx.load(output).graph.node}
+        self.assertTrue({"Log", "Where"} <= op_types)
+
+        raw = train_and_export(
+            self.df, os.path.join(self.test_dir, "raw.onnx"), trainer="gbdt", n_jobs=1, normalize=False
+        )
+        self.assertIsNone(raw["normalizer"])
+
+    def test_equivalence_check_detects_different_models(self):
+        first, second = os.path.join(self.test_dir, "a.onnx"), os.path.join(self.test_dir, "b.onnx")
+        train_and_export(self.df, first, trainer="gbdt", n_jobs=1)
+        train_and_export(self.df.assign(label=1 - self.df["label"]), second, trainer="gbdt", n_jobs=1)
+
+        check = check_equivalence(first, second, self.df[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+        self.assertFalse(check["equivalent"])
+        self.assertLess(check["label_agreement"], 0.5)
+
+    def test_quantize_rewrites_matmul_weights(self):
+        weights = numpy_helper.from_array(np.random.default_rng(0).normal(size=(4, 2)).astype(np.float32), "W")
+        graph = helper.make_graph(
+            [helper.make_node("MatMul", ["x", "W"], ["y"])],
+            "linear",
+            [helper.make_tensor_value_info("x", TensorProto.FLOAT, [None, 4])],
+            [helper.make_tensor_value_info("y", TensorProto.FLOAT, [None, 2])],
+            initializer=[weights],
+        )
+        source = os.path.join(self.test_dir, "linear.onnx")
+        onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)]), source)
+
+        quantized = quantize_onnx(source, os.path.join(self.test_dir, "linear.int8.onnx"))
+        self.assertIn("DynamicQuantizeLinear", {node.op_type for node in onnx.load(quantized).graph.node})
+
+    def test_export_post_processing_quantizes_neural_models(self):
+        # The shipped trainers are tree ensembles with nothing to quantize; an MLP has MatMul weights.
+        from skl2onnx import to_onnx
+        from sklearn.neural_network import MLPClassifier
+
+        X = np.log1p(self.df[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+        X = (X - X.mean(axis=0)) / X.std(axis=0)
+        clf = MLPClassifier(hidden_layer_sizes=(8,), max_iter=2000, random_state=0).fit(X, self.df["label"])
+        output = os.path.join(self.test_dir, "mlp.onnx")
+        onnx.save(to_onnx(clf, X[:1], options={id(clf): {"zipmap": False}}), output)
+        plain = os.path.join(self.test_dir, "mlp.plain.onnx")
+        shutil.copy2(output, plain)
+
+        result = post_process_export(output, X, quantize=True)
+
+        self.assertTrue(result["optimized"])
+        quantized = result["quantized_path"]
+        self.assertEqual(os.path.join(self.test_dir, "mlp.int8.onnx"), quantized)
+        self.assertIn("DynamicQuantizeLinear", {node.op_type for node in onnx.load(quantized).graph.node})
+        self.assertGreaterEqual(check_equivalence(plain, quantized, X)["label_agreement"], 0.99)
+
+    def test_single_class_data_is_skipped(self):
+        df = self.df.assign(label=0)
+        output = os.path.join(self.test_dir, "skipped.onnx")
+
+        self.assertIsNone(train_and_export(df, output))
+        self.assertFalse(os.path.exists(output))
+
+    def test_unknown_trainer_raises(self):
+        with self.assertRaises(ValueError):
+            build_classifier("random_forest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """Continuously refilling token bucket with O(1) checks.
+
+    Holds up to capacity tokens and refills at rate tokens per second. consume may drive the
+    balance negative: a caller that reserves future capacity, or that learns its true cost only
+    afterwards (e.g. LLM output tokens), is charged in full and later callers wait it off.
+    """
+
+    def __init__(self, capacity: float, rate: float, clock: Callable[[], float] = time.monotonic):
+        if capacity <= 0 or rate <= 0:
+            raise ValueError("capacity and rate must be positive")
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    @classmethod
+    def per_minute(cls, limit: float, clock: Callable[[], float] = time.monotonic) -> "TokenBucket":
+        """A bucket allowing limit per minute, in bursts of up to limit."""
+        return cls(limit, limit / 60.0, clock)
+
+    def _refill(self) -> float:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self._tokens
+
+    def available(self) -> float:
+        return self._refill()
+
+    def wait_time(self, amount: float = 1.0) -> float:
+        """Seconds until amount tokens are available (0 if they are now).
+
+        Amounts above capacity are treated as capacity, so one oversized request waits for a
+        full bucket instead of forever.
+        """
+        missing = min(float(amount), self.capacity) - self._refill()
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float = 1.0):
+        self._refill()
+        self._tokens -= float(amount)
+
+    def try_consume(self, amount: float = 1.0) -> bool:
+        if self.wait_time(amount) > 0:
+            return False
+        self._tokens -= float(amount)
+        return True
@@ -2,20 +2,38 @@ import argparse
 import json
 import logging
 import os
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 
 import numpy as np
 import pandas as pd
 import onnx
-from sklearn.ensemble import GradientBoostingClassifier
+import onnxruntime as ort
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-from skl2onnx import to_onnx
+from sklearn.metrics import accuracy_score, classification_report
+from skl2onnx import to_onnx, update_registered_converter
 from skl2onnx.common.data_types import FloatTensorType
+from threadpoolctl import threadpool_limits
+
+from feature_normalizer import OnlineNormalizer
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+FEATURE_COLUMNS = ["qps", "miss_rate", "latency", "cpu"]
+
+# gbdt: single-threaded sklearn GradientBoostingClassifier (original P8-1 model)
+# hist_gbdt: sklearn HistGradientBoostingClassifier (binned, OpenMP multithreaded)
+# xgboost: XGBClassifier with tree_method="hist" and n_jobs threads
+TRAINERS = ("gbdt", "hist_gbdt", "xgboost")
+DEFAULT_TRAINER = "hist_gbdt"
+
+# Operators onnxruntime.quantization.quantize_dynamic can rewrite to int8.
+QUANTIZABLE_OPS = ("MatMul", "Gemm")
+
+_xgboost_converter_registered = False
+
 
 def load_logs(log_path: str) -> List[Dict[str, Any]]:
     """Loads query logs from a JSONL file."""
@@ -63,41 +81,211 @@ def extract_features_and_labels(logs: List[Dict[str, Any]]) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def train_and_export(data: pd.DataFrame, output_onnx: str):
+def _register_xgboost_converter():
+    """Registers the onnxmltools XGBoost converter with skl2onnx (once)."""
+    global _xgboost_converter_registered
+    if _xgboost_converter_registered:
+        return
+
+    from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+    from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+    from xgboost import XGBClassifier
+
+    update_registered_converter(
+        XGBClassifier,
+        "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes,
+        convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]},
+    )
+    _xgboost_converter_registered = True
+
+
+def build_classifier(trainer: str = DEFAULT_TRAINER, n_jobs: int = -1):
+    """Creates an unfitted classifier for the given trainer name."""
+    if trainer == "gbdt":
+        return GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)
+    if trainer == "hist_gbdt":
+        return HistGradientBoostingClassifier(max_iter=100, learning_rate=0.1, max_depth=3, random_state=42)
+    if trainer == "xgboost":
+        from xgboost import XGBClassifier
+
+        _register_xgboost_converter()
+        return XGBClassifier(
+            n_estimators=100,
+            learning_rate=0.1,
+            max_depth=3,
+            tree_method="hist",
+            n_jobs=n_jobs,
+            random_state=42,
+        )
+    raise ValueError(f"Unknown trainer '{trainer}'. Expected one of {TRAINERS}")
+
+
+def fit_classifier(trainer: str, X: np.ndarray, y: np.ndarray, n_jobs: int = -1):
+    """Fits a classifier and returns (clf, fit_seconds).
+
+    n_jobs caps the OpenMP pool used by hist_gbdt; xgboost receives it directly.
+    """
+    clf = build_classifier(trainer, n_jobs=n_jobs)
+    limits = n_jobs if trainer == "hist_gbdt" and n_jobs > 0 else None
+    start = time.perf_counter()
+    with threadpool_limits(limits=limits, user_api="openmp"):
+        clf.fit(X, y)
+    return clf, time.perf_counter() - start
+
+
+def export_onnx(clf, output_onnx: str, sample: np.ndarray, normalizer: Optional[OnlineNormalizer] = None):
+    """Exports a fitted classifier to ONNX with tensor (non-ZipMap) probability output.
+
+    When the classifier was trained on normalized features, the normalizer is embedded in
+    front of it so the exported model still takes raw feature rows.
+    """
+    initial_type = [("float_input", FloatTensorType([None, len(FEATURE_COLUMNS)]))]
+    onx = to_onnx(
+        clf,
+        sample,
+        initial_types=initial_type,
+        target_opset={"": 12, "ai.onnx.ml": 3},
+        options={id(clf): {"zipmap": False}},
+    )
+    if normalizer is not None:
+        onx = normalizer.prepend_to(onx)
+    with open(output_onnx, "wb") as f:
+        f.write(onx.SerializeToString())
+    return onx
+
+
+def optimize_onnx(input_onnx: str, output_onnx: str) -> str:
+    """Runs ONNX Runtime's offline graph optimizations and saves the optimized graph.
+
+    ORT_ENABLE_EXTENDED is the highest level whose output stays portable across CPUs; the
+    layout rewrites of ORT_ENABLE_ALL are applied when the sidecar loads the model instead.
+    """
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = output_onnx
+    ort.InferenceSession(input_onnx, options, providers=["CPUExecutionProvider"])
+    return output_onnx
+
+
+def quantize_onnx(input_onnx: str, output_onnx: str) -> Optional[str]:
+    """Writes an int8 dynamically quantized variant, or returns None when nothing is quantizable.
+
+    Dynamic quantization rewrites MatMul/Gemm weights. Tree ensembles (TreeEnsembleClassifier)
+    and skl2onnx linear models (LinearClassifier) keep their parameters in ai.onnx.ml operator
+    attributes, which have no quantized form, so for the current trainers this returns None.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    graph = onnx.load(input_onnx).graph
+    if not any(node.op_type in QUANTIZABLE_OPS for node in graph.node):
+        logger.info(f"No {'/'.join(QUANTIZABLE_OPS)} nodes in {input_onnx}; skipping quantization.")
+        return None
+    quantize_dynamic(input_onnx, output_onnx, weight_type=QuantType.QInt8)
+    return output_onnx
+
+
+def check_equivalence(
+    reference_onnx: str,
+    candidate_onnx: str,
+    X: np.ndarray,
+    prob_atol: float = 1e-5,
+    min_label_agreement: float = 1.0,
+) -> Dict[str, Any]:
+    """Compares labels and class probabilities of two exported models on X."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    outputs = []
+    for path in (reference_onnx, candidate_onnx):
+        sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        outputs.append(sess.run(None, {sess.get_inputs()[0].name: X}))
+    (ref_labels, ref_probs), (labels, probs) = outputs
+
+    label_agreement = float(np.mean(ref_labels == labels)) if len(X) else 1.0
+    max_prob_diff = float(np.max(np.abs(ref_probs - probs))) if len(X) else 0.0
+    return {
+        "label_agreement": label_agreement,
+        "max_prob_diff": max_prob_diff,
+        "equivalent": label_agreement >= min_label_agreement and max_prob_diff <= prob_atol,
+    }
+
+
+def post_process_export(output_onnx: str, X_check: np.ndarray, quantize: bool = False) -> Dict[str, Any]:
+    """Optionally writes a quantized sibling, then replaces output_onnx with its optimized graph.
+
+    Each variant is kept only if it passes check_equivalence against the plain export on X_check;
+    the quantized variant may flip labels near decision boundaries, so it is held to 99% agreement.
+    """
+    stem, ext = os.path.splitext(output_onnx)
+    result = {"size_bytes_exported": os.path.getsize(output_onnx), "optimized": False, "quantized_path": None}
+
+    if quantize:
+        # Quantize the plain export: optimization fuses MatMul/Gemm into contrib ops that
+        # quantize_dynamic does not rewrite.
+        quantized = quantize_onnx(output_onnx, f"{stem}.int8{ext}")
+        if quantized is not None:
+            check = check_equivalence(output_onnx, quantized, X_check, prob_atol=0.05, min_label_agreement=0.99)
+            if check["equivalent"]:
+                result["quantized_path"] = quantized
+            else:
+                logger.warning(f"Quantized variant diverged ({check}); discarding it.")
+                os.remove(quantized)
+
+    optimized = optimize_onnx(output_onnx, f"{stem}.opt{ext}")
+    check = check_equivalence(output_onnx, optimized, X_check)
+    if check["equivalent"]:
+        os.replace(optimized, output_onnx)
+        result["optimized"] = True
+    else:
+        logger.warning(f"Optimized graph diverged from the export ({check}); keeping the unoptimized model.")
+        os.remove(optimized)
+
+    result["size_bytes"] = os.path.getsize(output_onnx)
+    return result
+
+
+def train_and_export(
+    data: pd.DataFrame,
+    output_onnx: str,
+    trainer: str = DEFAULT_TRAINER,
+    n_jobs: int = -1,
+    optimize: bool = True,
+    quantize: bool = False,
+    normalize: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Trains the selected classifier, exports it to ONNX and returns its training metrics."""
     if data.empty:
         logger.error("No data to train on.")
-        return
+        return None
 
-    X = data[["qps", "miss_rate", "latency", "cpu"]]
-    y = data["label"]
+    X = data[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    y = data["label"].to_numpy()
 
     logger.info(f"Dataset size: {len(X)}")
-    logger.info(f"Label distribution:\n{y.value_counts()}")
+    logger.info(f"Label distribution:\n{data['label'].value_counts()}")
 
-    if y.nunique() < 2:
+    if data["label"].nunique() < 2:
         logger.warning("Data contains only one class. Skipping training to avoid errors.")
-        return
+        return None
 
     # Train/Test Split
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    normalizer = OnlineNormalizer.fit(X_train) if normalize else None
+    fit_X_train = normalizer.transform(X_train) if normalizer else X_train
+    fit_X_test = normalizer.transform(X_test) if normalizer else X_test
 
-    # Train GBDT
-    logger.info("Training GBDT model...")
-    clf = GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)
-    clf.fit(X_train, y_train)
+    logger.info(f"Training {trainer} model (n_jobs={n_jobs})...")
+    clf, fit_seconds = fit_classifier(trainer, fit_X_train, y_train, n_jobs=n_jobs)
+    logger.info(f"Fit completed in {fit_seconds:.3f}s")
 
     # Evaluation
-    y_pred = clf.predict(X_test)
+    y_pred = clf.predict(fit_X_test)
     logger.info("Model Evaluation:")
     logger.info("\n" + classification_report(y_test, y_pred))
 
     # Export to ONNX
     logger.info(f"Exporting to ONNX: {output_onnx}")
-    initial_type = [("float_input", FloatTensorType([None, 4]))]
-    onx = to_onnx(clf, X_train, initial_types=initial_type, target_opset=12)
-
-    with open(output_onnx, "wb") as f:
-        f.write(onx.SerializeToString())
+    onx = export_onnx(clf, output_onnx, fit_X_train[:1], normalizer=normalizer)
 
     # Verify ONNX model
     try:
@@ -111,7 +299,7 @@ def train_and_export(data: pd.DataFrame, output_onnx: str):
             sess = ort.InferenceSession(output_onnx)
             input_name = sess.get_inputs()[0].name
             # Test with a dummy input
-            dummy_input = X_test.iloc[:1].to_numpy().astype(np.float32)
+            dummy_input = X_test[:1]
             res = sess.run(None, {input_name: dummy_input})
             logger.info(f"ONNX runtime inference verification passed. Output shape: {res[0].shape}")
         except ImportError:
@@ -122,13 +310,32 @@ def train_and_export(data: pd.DataFrame, output_onnx: str):
     except Exception as e:
         logger.error(f"ONNX model verification failed: {e}")
 
+    result = {
+        "trainer": trainer,
+        "n_samples": int(len(X)),
+        "fit_seconds": float(fit_seconds),
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "normalizer": normalizer.to_dict() if normalizer else None,
+    }
+    if optimize:
+        result.update(post_process_export(output_onnx, X_test, quantize=quantize))
+        logger.info(
+            f"Post-processed export: optimized={result['optimized']} size={result['size_bytes']}B "
+            f"quantized={result['quantized_path']}"
+        )
+
     logger.info("Export complete.")
+    return result
 
 
 def main():
     parser = argparse.ArgumentParser(description="Train AI Sidecar Policy Model")
     parser.add_argument("--log-path", type=str, default="logs/query_log.jsonl", help="Path to query log JSONL")
     parser.add_argument("--output", type=str, default="policy_model.onnx", help="Output ONNX file path")
+    parser.add_argument("--trainer", type=str, default=DEFAULT_TRAINER, choices=TRAINERS, help="Model trainer")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Training threads (-1 = all cores)")
+    parser.add_argument("--no-optimize", action="store_true", help="Skip ONNX Runtime graph optimization")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8 variant when the graph allows")
     args = parser.parse_args()
 
     logger.info(f"Loading logs from {args.log_path}...")
@@ -137,7 +344,9 @@ def main():
     logger.info("Extracting features...")
     df = extract_features_and_labels(logs)
 
-    train_and_export(df, args.output)
+    train_and_export(
+        df, args.output, trainer=args.trainer, n_jobs=args.n_jobs, optimize=not args.no_optimize, quantize=args.quantize
+    )
 
 
 if __name__ == "__main__":